@@ -0,0 +1,118 @@
+import argparse
+import time
+from utils.logger import get_logger, set_log_format
+from utils.session import AWSSessionManager
+from utils.lazy import lazy
+from utils.metrics import write_metrics_report
+from utils.stack import Stack, load_stack_spec, fan_out, format_stack_report
+from config import *
+
+# Servis modülleri ilk kullanımda yüklenir (bkz. utils/lazy.py)
+bake_worker_ami = lazy("services.bake_service", "bake_worker_ami")
+prune_worker_amis = lazy("services.bake_service", "prune_worker_amis")
+find_worker_ami = lazy("services.ec2_service", "find_worker_ami")
+instance_profile_has_role = lazy("services.iam_service", "instance_profile_has_role")
+
+logger = get_logger("bake")
+
+
+def bake_stack(stack: Stack, force: bool = False, prune: bool = False, keep: int = 1) -> str:
+    """
+    Stack'in region'ı için worker AMI'si. Güncel kurulum script'iyle bake
+    edilmiş bir AMI zaten varsa (force değilse) yeniden bake edilmez.
+    Builder, stack'in instance profile'ını kullanır (ready tag'i için).
+    """
+    region = stack.region
+
+    ami_id = None if force else find_worker_ami(region=region)
+    if ami_id:
+        logger.info("Bake | Worker AMI up to date | %s | %s", region, ami_id)
+    else:
+        if not instance_profile_has_role(stack.profile_name, stack.role_name):
+            raise Exception(f"Instance profile not ready | {stack.profile_name} | run main.py --only iam first")
+        # AMI stack'e değil region'a ait; stack tag'leri yazılmaz, destroy silmez (bkz. --prune)
+        ami_id = bake_worker_ami(stack.profile_name, region=region, parameter=stack.ami_parameter)
+
+    if prune and not prune_worker_amis(region=region, keep=keep):
+        raise Exception(f"Pruning old worker AMIs failed | {region}")
+
+    return ami_id
+
+
+def bake(regions=None, spec: str = None, stack_names=None, force: bool = False, prune: bool = False,
+         keep: int = 1, region_parallel: int = REGION_MAX_PARALLEL) -> dict:
+    start = time.perf_counter()
+
+    if spec:
+        # AMI'ler region'a ait; region başına ilk stack'in profile'ı yeterli
+        first = {}
+        for stack in load_stack_spec(spec, stack_names):
+            first.setdefault(stack.region, stack)
+        results = fan_out(
+            list(first), lambda region_stack: bake_stack(first[region_stack.region], force, prune, keep), region_parallel
+        )
+    else:
+        results = fan_out(regions or [AWS_REGION], lambda s: bake_stack(s, force, prune, keep), region_parallel)
+
+    logger.info("Bake report | %.2fs\n%s", time.perf_counter() - start, format_stack_report(results))
+
+    failed = [region for region, result in results.items() if not result.ok]
+    if failed:
+        raise Exception(f"Bake failed in regions | {', '.join(failed)}")
+
+    return {region: result.value for region, result in results.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bake the Aegis worker AMI with dependencies pre-installed")
+    parser.add_argument(
+        "--regions",
+        type=lambda value: value.split(","),
+        metavar="REGION[,REGION...]",
+        help=f"Bake in every listed region concurrently (default: {AWS_REGION})"
+    )
+    parser.add_argument("--spec", metavar="FILE", help="Bake in every region used by this JSON spec file")
+    parser.add_argument(
+        "--stacks",
+        type=lambda value: value.split(","),
+        metavar="NAME[,NAME...]",
+        help="With --spec: only the regions of these stacks"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Bake a new AMI even if one for the current setup script already exists"
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Deregister older worker AMIs (and delete their snapshots) after baking"
+    )
+    parser.add_argument(
+        "--keep",
+        type=int,
+        default=1,
+        help="With --prune: number of current worker AMIs to keep per region (default: 1)"
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default=LOG_FORMAT,
+        help=f"Console log format; json writes one JSON object per line (default: {LOG_FORMAT})"
+    )
+    args = parser.parse_args(argv)
+    if args.spec and args.regions:
+        parser.error("--spec and --regions cannot be combined; regions come from the spec")
+    if args.stacks and not args.spec:
+        parser.error("--stacks requires --spec")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    set_log_format(args.log_format)
+    try:
+        bake(args.regions, args.spec, args.stacks, args.force, args.prune, args.keep)
+    finally:
+        write_metrics_report()
+        AWSSessionManager.get_instance().shutdown()
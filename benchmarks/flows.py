@@ -0,0 +1,313 @@
+"""
+Uçtan uca apply/destroy benchmark'ı (offline).
+
+main.main() ve cleanup.cleanup() gerçek kodla, ama AWS yerine
+benchmarks/fake_aws.py'deki hafıza içi stand-in'e karşı çalıştırılır.
+Her API çağrısına sabit (veya operasyon bazında) gecikme eklenir;
+eventual consistency ve asenkron durum geçişleri de modellenir. Böylece
+paralellik, batching ve waiter değişikliklerinin etkisi hesapsız ve
+deterministik olarak ölçülür.
+
+Ölçülenler (faz başına: apply, drift, [scale_out], destroy):
+  wall_ms        duvar saati süresi
+  api_calls      servis başına API çağrı sayısı
+Ek olarak:
+  peak_rss_mb    child process'in tepe bellek kullanımı
+
+--interrupt ile apply'dan önce "interrupted" fazı çalışır: iki apply üst
+üste ec2 adımında kesilir. Sonraki apply, ilk çalışmada tamamlanan
+adımları journal'dan almalı (KMS/IAM/S3'e hiç çağrı yapmamalı).
+
+Worker'lar "running" değil, kurulumları bitip ready tag'i yazıldığında
+hazırdır: stok AMI'de --setup-ms (varsayılan 0) sürer, --baked ile (bake edilmiş worker
+AMI'si varmış gibi) kurulum yoktur. --warm-pool N verilirse apply N durdurulmuş
+instance bırakır ve scale_out fazı worker sayısını N artırarak pool'dan başlatır.
+
+Sonuç benchmarks/baseline.json'daki aynı senaryonun kaydıyla karşılaştırılır
+(dosya senaryo başına bir rapor tutar); süre veya bellek
+--max-regression oranından fazla artarsa ya da herhangi bir servisin
+çağrı sayısı artarsa exit code 1 döner.
+
+Kullanım:
+  python -m benchmarks.flows
+  python -m benchmarks.flows --latency-ms 80 --latency ec2.RunInstances=900 --regions us-east-1,eu-west-1
+  python -m benchmarks.flows --setup-ms 3000 --baked --warm-pool 3
+  python -m benchmarks.flows --update-baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    env["AWS_DEFAULT_REGION"] = "us-east-1"
+    env["AWS_ACCESS_KEY_ID"] = "benchmark"
+    env["AWS_SECRET_ACCESS_KEY"] = "benchmark"
+    # Gerçek hesaba yanlışlıkla gidilmesin
+    env.pop("AWS_PROFILE", None)
+    env.pop("AWS_SESSION_TOKEN", None)
+    return env
+
+
+def _latencies(pairs) -> dict:
+    latencies = {}
+    for pair in pairs or ():
+        operation, _, ms = pair.partition("=")
+        latencies[operation] = float(ms) / 1000
+    return latencies
+
+
+def _child(args):
+    """Temiz bir çalışma dizininde apply + drift (+ scale_out) + destroy çalıştırır, ölçümleri JSON olarak basar."""
+    import random
+    import resource
+    from benchmarks.fake_aws import FakeAWS
+    from utils.session import AWSSessionManager
+    from config import AWS_REGION
+
+    random.seed(0)
+    regions = args.regions or [AWS_REGION]
+    fake = FakeAWS(
+        latency=args.latency_ms / 1000,
+        latencies=_latencies(args.latency),
+        consistency=args.consistency_ms / 1000,
+        transition=args.transition_ms / 1000,
+        setup=args.setup_ms / 1000,
+    )
+    manager = AWSSessionManager.get_instance()
+    # IAM global'dir; client'ı varsayılan region'dan alınır
+    for region in set(regions) | {AWS_REGION}:
+        fake.install(manager.get_session(region))
+
+    if args.baked:
+        from config import EC2_WORKER_AMI_TAG_KEY
+        from services.ec2_service import SETUP_FINGERPRINT
+
+        # bake.py daha önce çalışmış gibi; AMI'ler destroy'da silinmez
+        for region in regions:
+            fake.add_image(region, {EC2_WORKER_AMI_TAG_KEY: SETUP_FINGERPRINT})
+
+    import main
+    import cleanup
+    import drift
+    from utils.audit import close_audit_logs
+    from utils.stack import stack_for_region
+
+    def check_drift():
+        found = drift.drift([stack_for_region(region, args.workers) for region in regions])
+        if found:
+            raise Exception(f"Drift right after apply | {found}")
+
+    def apply():
+        return main.main(regions=regions, workers=args.workers, warm_pool=args.warm_pool)
+
+    def interrupted():
+        # İki apply üst üste ec2 adımında kesilir; ikincisi birincinin journal'ından devam eder
+        for _ in range(2):
+            fake.faults["ec2.RunInstances"] += 1
+            try:
+                apply()
+            except Exception:
+                pass
+            else:
+                raise Exception("Injected RunInstances fault did not interrupt apply")
+
+    def resumed_apply():
+        apply()
+        # İlk çalışmada tamamlanan adımlar iki kesintiden sonra da AWS'e hiç gitmeden atlanmalı
+        redone = sorted(name for name in fake.calls if name.split(".")[0] in ("kms", "iam", "s3"))
+        if redone:
+            raise Exception(f"Resumed apply repeated completed steps | {redone}")
+
+    phases = []
+    if args.interrupt:
+        phases.append(("interrupted", interrupted))
+    phases += [
+        ("apply", resumed_apply if args.interrupt else apply),
+        ("drift", check_drift),
+    ]
+    if args.warm_pool:
+        phases.append((
+            "scale_out",
+            lambda: main.main(regions=regions, workers=args.workers + args.warm_pool, warm_pool=args.warm_pool)
+        ))
+    phases.append(("destroy", lambda: cleanup.cleanup(regions=regions)))
+
+    report = {}
+    for phase, flow in phases:
+        fake.calls.clear()
+        start = time.perf_counter()
+        flow()
+        close_audit_logs()
+        report[phase] = {
+            "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+            "api_calls": fake.calls_by_service(),
+        }
+
+    leftovers = {
+        "instances": sum(1 for ins in fake.instances.values() if ins["state"] not in ("shutting-down", "terminated")),
+        "resources": len(fake.keys) - sum(1 for k in fake.keys.values() if k["state"] == "PendingDeletion")
+        + len(fake.buckets) + len(fake.tables) + len(fake.roles) + len(fake.profiles) + len(fake.policies)
+        + len(fake.key_pairs) + len(fake.groups),
+    }
+    if any(leftovers.values()):
+        raise Exception(f"Destroy left resources behind | {leftovers}")
+
+    # Linux'ta KiB
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(report))
+
+
+def run(args) -> dict:
+    argv = [sys.executable, "-m", "benchmarks.flows", "--child"] + _child_argv(args)
+    with tempfile.TemporaryDirectory(prefix="aegis-bench-") as cwd:
+        # State, metrik ve .pem dosyaları geçici dizine yazılır
+        result = subprocess.run(argv, cwd=cwd, env=_env(), capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Benchmark flow failed (exit {result.returncode})")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["scenario"] = _scenario(args)
+    return report
+
+
+def _scenario(args) -> dict:
+    scenario = {
+        "regions": args.regions,
+        "workers": args.workers,
+        "latency_ms": args.latency_ms,
+        "latency": sorted(args.latency or []),
+        "consistency_ms": args.consistency_ms,
+        "transition_ms": args.transition_ms,
+    }
+    # Sonradan eklenen boyutlar varsayılandayken senaryoya yazılmaz; eski baseline'lar geçerli kalır
+    for name, value in (("setup_ms", args.setup_ms), ("baked", args.baked), ("warm_pool", args.warm_pool),
+                        ("interrupt", args.interrupt)):
+        if value:
+            scenario[name] = value
+    return scenario
+
+
+def load_baselines(path: str) -> list:
+    """Baseline dosyası senaryo başına bir rapor tutar (eski tek raporluk biçim de okunur)."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def find_baseline(baselines: list, scenario: dict):
+    return next((b for b in baselines if b.get("scenario") == scenario), None)
+
+
+def _child_argv(args) -> list:
+    argv = [
+        "--workers", str(args.workers),
+        "--latency-ms", str(args.latency_ms),
+        "--consistency-ms", str(args.consistency_ms),
+        "--transition-ms", str(args.transition_ms),
+        "--setup-ms", str(args.setup_ms),
+        "--warm-pool", str(args.warm_pool),
+    ]
+    if args.baked:
+        argv.append("--baked")
+    if args.interrupt:
+        argv.append("--interrupt")
+    if args.regions:
+        argv += ["--regions", ",".join(args.regions)]
+    for pair in args.latency or ():
+        argv += ["--latency", pair]
+    return argv
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list:
+    if report["scenario"] != baseline.get("scenario"):
+        return [f"scenario differs from baseline: {report['scenario']} != {baseline.get('scenario')}"]
+
+    failures = []
+    limit = 1 + max_regression
+    for phase in [name for name, value in report.items() if isinstance(value, dict) and "wall_ms" in value]:
+        if phase not in baseline:
+            failures.append(f"{phase} missing from baseline")
+            continue
+        now, then = report[phase], baseline[phase]
+        if now["wall_ms"] > then["wall_ms"] * limit:
+            failures.append(f"{phase} wall time {now['wall_ms']}ms > {then['wall_ms']}ms x {limit}")
+        for service, count in now["api_calls"].items():
+            if count > then["api_calls"].get(service, 0):
+                failures.append(
+                    f"{phase} {service} API calls {count} > {then['api_calls'].get(service, 0)}"
+                )
+    if report["peak_rss_mb"] > baseline["peak_rss_mb"] * limit:
+        failures.append(f"peak RSS {report['peak_rss_mb']}MB > {baseline['peak_rss_mb']}MB x {limit}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aegis offline apply/destroy benchmark")
+    parser.add_argument("--regions", type=lambda value: value.split(","), metavar="REGION[,REGION...]",
+                        help="Regions to apply and destroy (default: AWS_REGION)")
+    parser.add_argument("--workers", type=int, default=3, help="EC2 workers per region (default: 3)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Injected latency per API call (default: 50)")
+    parser.add_argument("--latency", action="append", metavar="SERVICE.OPERATION=MS",
+                        help="Per-operation latency override, e.g. ec2.RunInstances=900 (repeatable)")
+    parser.add_argument("--consistency-ms", type=float, default=500,
+                        help="Delay before new resources show up in describe/get calls (default: 500)")
+    parser.add_argument("--transition-ms", type=float, default=2000,
+                        help="Duration of async state transitions, e.g. pending -> running (default: 2000)")
+    parser.add_argument("--setup-ms", type=float, default=0,
+                        help="Worker user data setup time on the stock AMI, after running (default: 0)")
+    parser.add_argument("--baked", action="store_true",
+                        help="Start with a baked worker AMI in every region (no setup at boot)")
+    parser.add_argument("--warm-pool", type=int, default=0,
+                        help="Stopped instances kept per region; adds a scale_out phase (default: 0)")
+    parser.add_argument("--interrupt", action="store_true",
+                        help="Fail RunInstances in two applies in a row first; the third must resume from the journal")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed wall time / peak RSS growth over the baseline (default: 0.25)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare against")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write this run as the baseline of its scenario (other scenarios are kept)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.child:
+        _child(args)
+        sys.exit(0)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+
+    baselines = load_baselines(args.baseline)
+    baseline = find_baseline(baselines, report["scenario"])
+
+    if args.update_baseline:
+        baselines = [b for b in baselines if b is not baseline] + [report]
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+        sys.exit(0)
+
+    if baseline is None:
+        print(f"No baseline for this scenario in {args.baseline}; run with --update-baseline", file=sys.stderr)
+        sys.exit(1)
+
+    failures = compare(report, baseline, args.max_regression)
+
+    if failures:
+        print("Benchmark regression:\n  " + "\n  ".join(failures), file=sys.stderr)
+        sys.exit(1)
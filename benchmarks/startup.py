@@ -0,0 +1,141 @@
+"""
+CLI startup benchmark.
+
+Ölçülenler:
+  import_ms       python -X importtime ile entry point'in toplam import süresi
+  help_ms         `python <entry> --help` duvar saati süresi
+  first_call_ms   process başlangıcından ilk AWS API çağrısının cevabına kadar geçen süre
+
+İlk API çağrısı ağa çıkmaz: botocore 'before-send' event'inde sahte bir
+cevap döndürülür, yani ölçülen süre import + session + client + request
+hazırlama maliyetidir.
+
+Kullanım:
+  python -m benchmarks.startup
+  python -m benchmarks.startup --max-help-ms 300 --max-first-call-ms 900
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ("main.py", "cleanup.py", "plan.py")
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    return env
+
+
+def measure_import(entry: str) -> float:
+    """importtime çıktısındaki kümülatif süreleri (top-level import'lar) toplar."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", entry, "--help"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Tek boşlukla başlayan isimler top-level import'lardır; iç içe olanlar kümülatife dahil
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(cumulative)
+
+    return total_us / 1000
+
+
+def measure_help(entry: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, entry, "--help"], cwd=ROOT, env=_env(), capture_output=True, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure_first_call(repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child"],
+            cwd=ROOT, env=_env(), capture_output=True, check=True
+        )
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _child():
+    """plan.py'nin kullandığı ilk read-only çağrıyı sahte bir HTTP cevabıyla yapar."""
+    from botocore.awsrequest import AWSResponse
+    from utils.session import AWSSessionManager
+    from config import AWS_REGION, KMS_ALIAS_NAME
+
+    class _Raw:
+        def __init__(self, body):
+            self._body = body
+
+        def stream(self, **kwargs):
+            yield self._body
+
+    def fake_send(request, **kwargs):
+        body = b'{"__type": "NotFoundException", "message": "benchmark"}'
+        return AWSResponse(request.url, 400, {"Content-Type": "application/x-amz-json-1.1"}, _Raw(body))
+
+    AWSSessionManager.get_instance().get_session(AWS_REGION).events.register("before-send", fake_send)
+
+    from services.kms_service import describe_alias_key
+    describe_alias_key(KMS_ALIAS_NAME)
+
+
+def run(repeat: int) -> dict:
+    report = {}
+    for entry in ENTRY_POINTS:
+        report[entry] = {
+            "import_ms": round(measure_import(entry), 1),
+            "help_ms": round(measure_help(entry, repeat), 1),
+        }
+    report["first_call_ms"] = round(measure_first_call(repeat), 1)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aegis CLI startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per measurement (median is reported)")
+    parser.add_argument("--max-help-ms", type=float, help="Fail if any entry point's --help is slower")
+    parser.add_argument("--max-first-call-ms", type=float, help="Fail if time-to-first-API-call is slower")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.child:
+        _child()
+        sys.exit(0)
+
+    report = run(args.repeat)
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if args.max_help_ms is not None:
+        failures += [
+            f"{entry} --help {report[entry]['help_ms']}ms > {args.max_help_ms}ms"
+            for entry in ENTRY_POINTS if report[entry]["help_ms"] > args.max_help_ms
+        ]
+    if args.max_first_call_ms is not None and report["first_call_ms"] > args.max_first_call_ms:
+        failures.append(f"first API call {report['first_call_ms']}ms > {args.max_first_call_ms}ms")
+
+    if failures:
+        print("Startup budget exceeded:\n  " + "\n  ".join(failures), file=sys.stderr)
+        sys.exit(1)
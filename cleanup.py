@@ -1,36 +1,284 @@
-from utils.logger import get_logger
+import argparse
+from functools import partial
+from utils.logger import get_logger, set_log_format
+from utils.session import AWSSessionManager
+from utils.dag import ResourceGraph, format_summary, failed_nodes, run_graphs, SUCCEEDED
+from utils.state import StateStore
+from utils.journal import Journal, journaled
+from utils.stack import Stack, stack_for_region, load_stack_spec, fan_out, stack_outcomes, format_stack_report
+from utils.lazy import lazy
+from utils.metrics import write_metrics_report
+from utils.audit import audit_log, close_audit_logs
 from config import *
 
-from services.ec2_service import delete_ec2_resources
-from services.iam_service import delete_iam_resources
-from services.dynamodb_service import delete_dynamodb_table
-from services.s3_service import delete_bucket
-from services.kms_service import delete_kms_key_by_alias
+terminate_tagged_instances = lazy("services.ec2_service", "terminate_tagged_instances")
+delete_security_group = lazy("services.ec2_service", "delete_security_group")
+delete_key_pair = lazy("services.ec2_service", "delete_key_pair")
+delete_instance_profile = lazy("services.iam_service", "delete_instance_profile")
+delete_role = lazy("services.iam_service", "delete_role")
+delete_dynamodb_table = lazy("services.dynamodb_service", "delete_dynamodb_table")
+delete_bucket = lazy("services.s3_service", "delete_bucket")
+delete_kms_key_by_alias = lazy("services.kms_service", "delete_kms_key_by_alias")
+schedule_key_deletion = lazy("services.kms_service", "schedule_key_deletion")
 
 logger = get_logger("cleanup", 'INFO')
 
-def cleanup():
-    logger.info("Aegis Infrastructure Cleanup Started")
+# destroy node -> silindiğinde geçersiz olan apply state kayıtları
+STATE_KEYS = {
+    "instances": ("ec2",),
+    "security_group": ("security_group", "ec2"),
+    "key_pair": ("key_pair", "ec2"),
+    "instance_profile": ("iam", "ec2"),
+    "role": ("iam",),
+    "dynamodb": ("dynamodb", "iam"),
+    "s3": ("s3", "iam"),
+    "kms": ("kms", "iam"),
+}
+
+
+def _require(ok: bool, resource: str) -> str:
+    if not ok:
+        raise Exception(f"{resource} deletion failed")
+    return "deleted"
+
+
+def build_destroy_graph(stack: Stack, release_security_group: bool = True, journal: Journal = None) -> ResourceGraph:
+    """
+    Apply grafiğinin tersi. Gerçek sıralama kısıtları sadece:
+    instance -> security group ve instance profile -> role.
+    Geri kalan her şey paralel silinir.
+
+    release_security_group: SG, onu kullanan son instance terminate olduğu
+    anda instances adımı içinde silinir; security_group adımı o durumda
+    sadece kalan bir SG varsa onu siler.
 
-    delete_ec2_resources(
-        EC2_KEY_PAIR_NAME,
-        EC2_SECURITY_GROUP_NAME
+    journal: yarıda kalan destroy'da silinmiş node'lar tekrar çalışmaz;
+    yarıda kalan apply'ın alias'sız bıraktığı KMS key'ler de kms adımında silinir.
+    """
+    graph = ResourceGraph(f"destroy[{stack.label}]")
+    region = stack.region
+    group_name = stack.security_group_name if release_security_group else None
+
+    def add(name, func, deps=(), service=None):
+        graph.add(name, journaled(journal, name, func), deps=deps, service=service)
+
+    def terminate_instances():
+        ids = terminate_tagged_instances(region=region, security_group_name=group_name, tag_name=stack.instance_tag)
+        return f"terminated={len(ids)}"
+
+    add("instances", terminate_instances, service="ec2")
+    add(
+        "security_group",
+        lambda instances: _require(delete_security_group(stack.security_group_name, region=region), "Security group"),
+        deps=("instances",),
+        service="ec2"
+    )
+    add(
+        "key_pair",
+        lambda: _require(delete_key_pair(stack.key_pair_name, region=region), "Key pair"),
+        service="ec2"
+    )
+    add(
+        "instance_profile",
+        lambda: _require(delete_instance_profile(stack.profile_name, stack.role_name), "Instance profile"),
+        service="iam"
+    )
+    add(
+        "role",
+        lambda instance_profile: _require(delete_role(stack.role_name, stack.policy_name), "IAM role"),
+        deps=("instance_profile",),
+        service="iam"
     )
+    add(
+        "dynamodb",
+        lambda: _require(delete_dynamodb_table(stack.table_name, region=region), "DynamoDB table"),
+        service="dynamodb"
+    )
+    add("s3", lambda: _require(delete_bucket(stack.bucket_name, region=region), "S3 bucket"), service="s3")
+
+    def delete_kms():
+        ok = delete_kms_key_by_alias(stack.kms_alias, region=region)
+        for orphan in journal.orphans("kms_key") if journal else []:
+            if schedule_key_deletion(orphan, region=region):
+                journal.settle("kms_key", orphan)
+            else:
+                ok = False
+        return _require(ok, "KMS key")
+
+    add("kms", delete_kms, service="kms")
+
+    return graph
+
+
+def _destroy_graph(stack: Stack, only, resume: bool = True):
+    journal = Journal(stack.journal_file).begin("destroy", resume)
+    # --only instances: SG'ye dokunma
+    graph = build_destroy_graph(stack, not only or "security_group" in only, journal)
+    return (graph.subgraph(only) if only else graph), journal
+
+
+def _destroy_outcome(stack: Stack, results: dict, journal: Journal = None):
+    logger.info("Destroy summary | %s\n%s", stack.label, format_summary(results))
+
+    state = StateStore(stack.state_file)
+    for name, result in results.items():
+        if result.status == SUCCEEDED:
+            state.remove(*STATE_KEYS.get(name, ()))
+
+    failed = failed_nodes(results)
+    if journal is not None:
+        journal.end(not failed)
+    if failed:
+        raise Exception(f"Cleanup incomplete | {stack.label} | {', '.join(failed)}")
+
+    return "clean"
 
-    delete_iam_resources(
-        IAM_ROLE_NAME,
-        IAM_INSTANCE_PROFILE_NAME,
-        "AegisInlinePolicy"
+
+def destroy_stack(stack: Stack, max_parallel: int = DESTROY_MAX_PARALLEL, only=None, audit: bool = AUDIT_ENABLED,
+                  resume: bool = True):
+    graph, journal = _destroy_graph(stack, only, resume)
+
+    # Tablo bu destroy'da silinebilir; o durumda kayıtlar close'ta düşer ve loglanır
+    on_result = partial(audit_log(stack.table_name, stack.region).record_node, "destroy") if audit else None
+    results = graph.run(max_parallel=max_parallel, on_result=on_result)
+    return _destroy_outcome(stack, results, journal)
+
+
+def destroy_stacks(stacks, max_parallel: int = STACK_MAX_PARALLEL, service_limits: dict = STACK_SERVICE_LIMITS,
+                   only=None, audit: bool = AUDIT_ENABLED, resume: bool = True) -> dict:
+    """Spec'teki bütün stack'ler tek scheduler'da silinir (bkz. main.apply_stacks)."""
+    built = {stack.label: _destroy_graph(stack, only, resume) for stack in stacks}
+    graphs = {label: graph for label, (graph, _) in built.items()}
+    sinks = {stack.label: audit_log(stack.table_name, stack.region) for stack in stacks} if audit else {}
+
+    def on_result(label, result):
+        if label in sinks:
+            sinks[label].record_node("destroy", result)
+
+    runs = run_graphs(graphs, max_parallel, service_limits, on_result)
+    results = stack_outcomes(
+        stacks, runs, lambda stack, results: _destroy_outcome(stack, results, built[stack.label][1])
     )
+    logger.info("Stack destroy report\n" + format_stack_report(results, title="STACK"))
+    return results
 
-    delete_dynamodb_table(DYNAMODB_TABLE_NAME)
 
-    delete_bucket(S3_BUCKET_NAME)
+def cleanup(max_parallel: int = DESTROY_MAX_PARALLEL, only=None, regions=None,
+            region_parallel: int = REGION_MAX_PARALLEL, audit: bool = AUDIT_ENABLED,
+            spec: str = None, stack_names=None, stack_parallel: int = STACK_MAX_PARALLEL, resume: bool = True):
+    logger.info("Aegis Infrastructure Cleanup Started")
+
+    if spec:
+        results = destroy_stacks(
+            load_stack_spec(spec, stack_names), stack_parallel, STACK_SERVICE_LIMITS, only, audit, resume
+        )
+        failed = [name for name, result in results.items() if not result.ok]
+        if failed:
+            raise Exception(f"Cleanup incomplete in stacks | {', '.join(failed)}")
+
+        logger.info("All resources cleaned successfully")
+        return
 
-    delete_kms_key_by_alias(KMS_ALIAS_NAME)
+    if not regions or regions == [AWS_REGION]:
+        destroy_stack(stack_for_region(AWS_REGION), max_parallel, only, audit, resume)
+        logger.info("All resources cleaned successfully")
+        return
+
+    results = fan_out(regions, lambda stack: destroy_stack(stack, max_parallel, only, audit, resume), region_parallel)
+    logger.info("Multi-region destroy report\n" + format_stack_report(results))
+
+    failed = [region for region, result in results.items() if not result.ok]
+    if failed:
+        raise Exception(f"Cleanup incomplete in regions | {', '.join(failed)}")
 
     logger.info("All resources cleaned successfully")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aegis infrastructure cleanup")
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=DESTROY_MAX_PARALLEL,
+        help=f"Maximum number of resources deleted concurrently (default: {DESTROY_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--only",
+        type=lambda value: value.split(","),
+        metavar="NODE[,NODE...]",
+        help="Delete only these resources (and what must go before them): "
+             "instances, security_group, key_pair, instance_profile, role, dynamodb, s3, kms"
+    )
+    parser.add_argument(
+        "--regions",
+        type=lambda value: value.split(","),
+        metavar="REGION[,REGION...]",
+        help=f"Destroy the stack in every listed region concurrently (default: {AWS_REGION})"
+    )
+    parser.add_argument(
+        "--region-parallel",
+        type=int,
+        default=REGION_MAX_PARALLEL,
+        help=f"Maximum number of regions destroyed concurrently (default: {REGION_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--spec",
+        metavar="FILE",
+        help="Destroy every stack declared in this JSON spec file (see README, Stack Specs)"
+    )
+    parser.add_argument(
+        "--stacks",
+        type=lambda value: value.split(","),
+        metavar="NAME[,NAME...]",
+        help="With --spec: destroy only these stacks"
+    )
+    parser.add_argument(
+        "--stack-parallel",
+        type=int,
+        default=STACK_MAX_PARALLEL,
+        help=f"With --spec: maximum number of resources deleted concurrently across all stacks "
+             f"(default: {STACK_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--no-audit",
+        action="store_true",
+        help=f"Do not record deleted resources in the audit table ({DYNAMODB_TABLE_NAME})"
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Do not resume an interrupted destroy from its journal; retry every deletion"
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default=LOG_FORMAT,
+        help=f"Console log format; json writes one JSON object per line (default: {LOG_FORMAT})"
+    )
+    args = parser.parse_args(argv)
+    if args.spec and args.regions:
+        parser.error("--spec and --regions cannot be combined; set the region per stack in the spec")
+    if args.stacks and not args.spec:
+        parser.error("--stacks requires --spec")
+    return args
+
+
 if __name__ == "__main__":
-    cleanup()
+    args = parse_args()
+    set_log_format(args.log_format)
+    try:
+        cleanup(
+            max_parallel=args.max_parallel,
+            only=args.only,
+            regions=args.regions,
+            region_parallel=args.region_parallel,
+            audit=AUDIT_ENABLED and not args.no_audit,
+            spec=args.spec,
+            stack_names=args.stacks,
+            stack_parallel=args.stack_parallel,
+            resume=not args.no_resume
+        )
+    finally:
+        close_audit_logs()
+        write_metrics_report()
+        AWSSessionManager.get_instance().shutdown()
@@ -1,5 +1,31 @@
 AWS_REGION = "us-east-1"
 
+# Paylaşılan boto3 client'larının HTTP connection pool boyutu (thread sayısından büyük olmalı)
+AWS_MAX_POOL_CONNECTIONS = 50
+
+# botocore "standard" retry modu: throttle'larda exponential backoff + client başına retry kotası
+AWS_RETRY_MODE = "standard"
+AWS_MAX_ATTEMPTS = 8
+
+# Client-side rate limit (utils/ratelimit.py): service -> (istek/sn, burst).
+# Limiter'lar process genelinde (service, region) başına paylaşılır; IAM hesap genelinde tektir.
+RATE_LIMITS = {
+    "iam": (10, 20),
+    "ec2": (50, 100),
+    "ssm": (20, 40),
+    "kms": (100, 200),
+    "dynamodb": (50, 100),
+    "s3": (500, 1000),
+}
+RATE_LIMIT_DEFAULT = (50, 100)
+RATE_LIMIT_MIN_RATE = 1.0
+RATE_LIMIT_MAX_CONCURRENCY = AWS_MAX_POOL_CONNECTIONS
+# Bu süre içinde gelen throttle'lar tek bir yavaşlama sayılır
+RATE_LIMIT_DECREASE_INTERVAL = 1.0
+
+# Yeni role/instance profile'ın IAM ve EC2 tarafında görünür olması için üst sınır (saniye)
+IAM_PROPAGATION_TIMEOUT = 120
+
 S3_BUCKET_NAME = "boto3-bucket6478324"
 DYNAMODB_TABLE_NAME = "Aegis_Audit_Log"
 
@@ -8,8 +34,29 @@ IAM_INSTANCE_PROFILE_NAME = "Aegis_Worker_Profile"
 
 EC2_KEY_PAIR_NAME = "Aegis_Key"
 EC2_SECURITY_GROUP_NAME = "Aegis_SG"
+EC2_INSTANCE_TAG_NAME = "Aegis-Worker"
+EC2_INSTANCE_TYPE = "t2.micro"
+EC2_WORKER_COUNT = 1
+EC2_TERMINATE_CHUNK_SIZE = 200
 
 SSM_AMI_PARAMETER = "/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-x86_64"
+# Mimari -> SSM parametresi; hepsi tek get_parameters batch'iyle çözülür
+SSM_AMI_PARAMETERS = {
+    "x86_64": SSM_AMI_PARAMETER,
+    "arm64": "/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-arm64",
+}
+AMI_CACHE_FILE = ".aegis/ami-cache.json"
+AMI_CACHE_TTL = 3600
+
+# Bağımlılıkları kurulu worker AMI'si (bake.py). Varsa apply stok AL2023 yerine onu kullanır;
+# kurulum script'i değişince eski AMI'ler eşleşmez. Worker kurulumu bitince kendini
+# EC2_READY_TAG_KEY ile tag'ler; launch "running" yerine bu tag'i bekler.
+EC2_USE_BAKED_AMI = True
+EC2_WORKER_AMI_TAG_KEY = "aegis:worker-ami"
+EC2_READY_TAG_KEY = "aegis:ready"
+EC2_READY_TIMEOUT = 900
+# Çalışan worker'lara ek olarak durdurulmuş (hazır) bekletilen instance sayısı; spec'te stack başına warm_pool
+EC2_WARM_POOL_SIZE = 0
 
 SSH_ALLOWED_CIDR = "192.168.1.107/32"
 
@@ -18,4 +65,61 @@ DYNAMODB_BILLING_MODE = 'PAY_PER_REQUEST'
 AWS_ACCOUNT_ID = "107282186532"
 KMS_ALIAS_NAME = "alias/aegis-master-key"
 
+IAM_INLINE_POLICY_NAME = "AegisInlinePolicy"
+
+APPLY_MAX_PARALLEL = 6
+DESTROY_MAX_PARALLEL = 6
+PLAN_MAX_PARALLEL = 10
+REGION_MAX_PARALLEL = 6
+
+S3_EMPTY_MAX_WORKERS = 8
+
+STATE_FILE = ".aegis/state.json"
+
+# Spec dosyasıyla yönetilen stack'ler (main.py/cleanup.py --spec): stack başına state dosyası,
+# bütün stack'lerin node'larını paylaşan scheduler'ın toplam ve servis başına eşzamanlılık limitleri
+STACK_STATE_DIR = ".aegis/stacks"
+STACK_MAX_PARALLEL = 32
+STACK_SERVICE_LIMITS = {
+    "iam": 4,
+    "ec2": 16,
+    "ssm": 8,
+    "kms": 8,
+    "dynamodb": 8,
+    "s3": 8,
+}
+
+# Aegis'in oluşturduğu her kaynak bu iki tag'i taşır; drift.py kaynakları tag:GetResources ile bulur
+STACK_TAG_KEY = "aegis:stack"
+RESOURCE_TAG_KEY = "aegis:resource"
+# drift.py --daemon: tarama aralığı; sorunsuz doğrulanmış bir kaynak bu süre dolmadan tekrar describe edilmez
+DRIFT_INTERVAL = 300
+DRIFT_RECHECK_AGE = 900
+
+# S3 transfer (services/transfer_service.py)
+S3_TRANSFER_MAX_WORKERS = 10
+S3_MULTIPART_THRESHOLD = 16 * 1024 * 1024
+S3_MIN_PART_SIZE = 8 * 1024 * 1024
+S3_TRANSFER_STATE_FILE = ".aegis/transfers.json"
+
+# KMS data key cache (services/envelope_service.py)
+DATA_KEY_CACHE_MAX_AGE = 300
+DATA_KEY_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DATA_KEY_CACHE_MAX_MESSAGES = 100000
+DATA_KEY_CACHE_CAPACITY = 100
+
+# Run sonunda yazılan AWS çağrı metrikleri (utils/metrics.py)
+METRICS_JSON_FILE = ".aegis/metrics.json"
+METRICS_PROM_FILE = ".aegis/metrics.prom"
+
+# Audit log (DYNAMODB_TABLE_NAME): bounded kuyruk, arka planda 25'lik BatchWriteItem
+AUDIT_ENABLED = True
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_FLUSH_INTERVAL = 2.0
+AUDIT_CLOSE_TIMEOUT = 15
+AUDIT_MAX_RETRIES = 5
 
+# Logging (utils/logger.py): "text" veya "json" (JSON Lines); tekrarlayan waiter log'ları için rate limit
+LOG_FORMAT = "text"
+LOG_RATE_LIMIT_BURST = 5
+LOG_RATE_LIMIT_INTERVAL = 10.0
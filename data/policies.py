@@ -1,7 +1,15 @@
+import hashlib
+import json
 from utils.logger import get_logger
+from config import EC2_READY_TAG_KEY
 
 logger = get_logger("policies")
 
+# IAM doküman limitleri (whitespace hariç karakter sayısı)
+INLINE_POLICY_AGGREGATE_LIMIT = 10240   # bir role'ün bütün inline policy'lerinin toplamı
+MANAGED_POLICY_SIZE_LIMIT = 6144
+MANAGED_POLICIES_PER_ROLE = 10
+
 EC2_TRUST_POLICY = {
     "Version": "2012-10-17",
     "Statement": [
@@ -14,34 +22,206 @@ EC2_TRUST_POLICY = {
 }
 
 
-def build_permission_policy(bucket_arn: str, table_arn: str, kms_key_arn: str) -> dict:
-    policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Sid": "AllowPutObjectToVaultBucket",
-                "Effect": "Allow",
-                "Action": "s3:PutObject",
-                "Resource": f"{bucket_arn}/*"
-            },
-            {
-                "Sid": "AllowPutItemToMetadataTable",
-                "Effect": "Allow",
-                "Action": "dynamodb:PutItem",
-                "Resource": table_arn
-            },
-            {
-                "Sid": "AllowGenerateDataKeyWithVaultKmsKey",
-                "Effect": "Allow",
-                "Action": "kms:GenerateDataKey",
-                "Resource": kms_key_arn
-            }
-        ]
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def permission_statements(bucket_arns, table_arns, kms_key_arns) -> list:
+    """Her kaynak türü için bir statement; ARN'ler tek string ya da liste olabilir."""
+    statements = []
+
+    buckets = _as_list(bucket_arns)
+    if buckets:
+        statements.append({
+            "Sid": "AllowVaultBucketObjectAccess",
+            "Effect": "Allow",
+            "Action": [
+                "s3:PutObject",
+                "s3:GetObject",
+                "s3:AbortMultipartUpload",
+                "s3:ListMultipartUploadParts"
+            ],
+            "Resource": [f"{arn}/*" for arn in buckets]
+        })
+
+    tables = _as_list(table_arns)
+    if tables:
+        statements.append({
+            "Sid": "AllowPutItemToMetadataTable",
+            "Effect": "Allow",
+            "Action": "dynamodb:PutItem",
+            "Resource": tables
+        })
+
+    keys = _as_list(kms_key_arns)
+    if keys:
+        statements.append({
+            "Sid": "AllowGenerateDataKeyWithVaultKmsKey",
+            "Effect": "Allow",
+            "Action": ["kms:GenerateDataKey", "kms:Decrypt"],
+            "Resource": keys
+        })
+
+    # Worker kurulumu bitince sadece kendi hazır tag'ini yazabilir (bkz. services/ec2_service.py);
+    # SourceInstanceARN koşulu olmadan role'ü taşıyan her instance başka instance'ları da hazır gösterebilir
+    statements.append({
+        "Sid": "AllowWorkerReadySignal",
+        "Effect": "Allow",
+        "Action": "ec2:CreateTags",
+        "Resource": "arn:aws:ec2:*:*:instance/*",
+        "Condition": {
+            "ForAllValues:StringEquals": {"aws:TagKeys": [EC2_READY_TAG_KEY]},
+            "StringEquals": {"aws:ARN": "${ec2:SourceInstanceARN}"}
+        }
+    })
+
+    return statements
+
+
+def _compact(statement: dict) -> dict:
+    """Tek elemanlı listeler string'e indirilir (IAM'in ve eski dokümanların biçimi)."""
+    return {
+        key: value[0] if isinstance(value, list) and len(value) == 1 else value
+        for key, value in statement.items()
     }
 
+
+def merge_statements(statements: list) -> list:
+    """Aynı Effect + Action (+ Condition) kümesine sahip statement'ların Resource'larını birleştirir."""
+    merged = {}
+    for statement in statements:
+        key = (
+            statement["Effect"],
+            tuple(sorted(_as_list(statement["Action"]))),
+            json.dumps(statement.get("Condition"), sort_keys=True)
+        )
+        if key in merged:
+            resources = merged[key]["Resource"]
+            resources += [r for r in _as_list(statement["Resource"]) if r not in resources]
+        else:
+            merged[key] = {**statement, "Resource": _as_list(statement["Resource"])}
+
+    return [_compact(statement) for statement in merged.values()]
+
+
+def _document(statements: list) -> dict:
+    return {"Version": "2012-10-17", "Statement": statements}
+
+
+def canonicalize(document: dict) -> dict:
+    """
+    Karşılaştırma için normal form: Action/Resource her zaman sıralı liste,
+    statement'lar sıralı. Anlamı aynı olan iki doküman aynı forma iner.
+    """
+    raw = document.get("Statement", [])
+    statements = []
+    for statement in [raw] if isinstance(raw, dict) else raw:
+        normalized = {}
+        for key, value in statement.items():
+            if key in ("Action", "NotAction", "Resource", "NotResource"):
+                value = sorted(_as_list(value))
+            normalized[key] = value
+        statements.append(normalized)
+
+    statements.sort(key=lambda s: json.dumps(s, sort_keys=True))
+    return {"Version": document.get("Version"), "Statement": statements}
+
+
+def policy_hash(document: dict) -> str:
+    canonical = json.dumps(canonicalize(document), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def permissions_hash(documents: list) -> str:
+    """
+    Birden fazla dokümana (inline + paketlenmiş managed policy'ler) dağılmış
+    izinlerin tek hash'i. Sid'ler ve paketleme sırasındaki bölünmeler yok
+    sayılır; aynı izinler hangi dokümanlara dağıtılmış olursa olsun aynı hash.
+    """
+    statements = []
+    for document in documents:
+        raw = document.get("Statement", [])
+        for statement in [raw] if isinstance(raw, dict) else raw:
+            statements.append({key: value for key, value in statement.items() if key != "Sid"})
+    return policy_hash(_document(merge_statements(statements)))
+
+
+def policy_size(document: dict) -> int:
+    """IAM'in saydığı boyut: whitespace'siz JSON."""
+    return len(json.dumps(document, separators=(",", ":")))
+
+
+def _split(statement: dict, limit: int) -> list:
+    """Tek başına limite sığmayan statement'ı Resource listesini bölerek parçalar."""
+    if policy_size(_document([statement])) <= limit:
+        return [statement]
+
+    resources = _as_list(statement["Resource"])
+    if len(resources) < 2:
+        raise ValueError(f"Policy statement {statement.get('Sid')} exceeds {limit} characters")
+
+    half = len(resources) // 2
+    parts = _split({**statement, "Resource": resources[:half]}, limit) \
+        + _split({**statement, "Resource": resources[half:]}, limit)
+    # Sid doküman içinde tekil olmalı
+    sid = statement.get("Sid", "Statement")
+    return [_compact({**part, "Sid": f"{sid}{i}"}) for i, part in enumerate(parts, start=1)]
+
+
+def pack_statements(statements: list, limit: int) -> list:
+    """
+    Statement'ları her biri limit altında kalan en az sayıda dokümana
+    yerleştirir (first-fit decreasing bin packing).
+    """
+    pieces = [piece for statement in statements for piece in _split(statement, limit)]
+    pieces.sort(key=lambda s: policy_size(_document([s])), reverse=True)
+
+    bins = []
+    for piece in pieces:
+        for statements_in_bin in bins:
+            if policy_size(_document(statements_in_bin + [piece])) <= limit:
+                statements_in_bin.append(piece)
+                break
+        else:
+            bins.append([piece])
+
+    return [_document(statements_in_bin) for statements_in_bin in bins]
+
+
+def _describe(arns) -> str:
+    arns = _as_list(arns)
+    return arns[0] if len(arns) == 1 else f"{len(arns)} ARNs"
+
+
+def build_permission_policy(bucket_arn, table_arn, kms_key_arn) -> dict:
+    """Tek inline doküman (boyut kontrolü yok); ARN'ler tek string ya da liste olabilir."""
+    policy = _document(merge_statements(permission_statements(bucket_arn, table_arn, kms_key_arn)))
+
     logger.info(
-        f"Permission policy built | "
-        f"S3={bucket_arn} | DynamoDB={table_arn} | KMS={kms_key_arn}"
+        "Permission policy built | S3=%s | DynamoDB=%s | KMS=%s",
+        _describe(bucket_arn), _describe(table_arn), _describe(kms_key_arn)
     )
 
     return policy
+
+
+def build_permission_policies(bucket_arns, table_arns, kms_key_arns) -> tuple:
+    """
+    ("inline", [doküman]) veya ("managed", [doküman, ...]) döner.
+    Doküman role'ün inline limitine sığıyorsa tek inline policy kullanılır;
+    sığmıyorsa statement'lar 6.144 karakterlik managed policy'lere paketlenir.
+    """
+    policy = build_permission_policy(bucket_arns, table_arns, kms_key_arns)
+    if policy_size(policy) <= INLINE_POLICY_AGGREGATE_LIMIT:
+        return "inline", [policy]
+
+    documents = pack_statements(policy["Statement"], MANAGED_POLICY_SIZE_LIMIT)
+    if len(documents) > MANAGED_POLICIES_PER_ROLE:
+        raise ValueError(
+            f"Permission policy needs {len(documents)} managed policies (limit {MANAGED_POLICIES_PER_ROLE})"
+        )
+
+    logger.info("Permission policy packed | managed policies=%s | size=%s", len(documents), policy_size(policy))
+    return "managed", documents
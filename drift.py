@@ -0,0 +1,388 @@
+import argparse
+import sys
+import time
+from collections import defaultdict
+from utils.logger import get_logger, set_log_format
+from utils.session import AWSSessionManager
+from utils.lazy import lazy
+from utils.metrics import write_metrics_report
+from utils.stack import Stack, stack_for_region, load_stack_spec
+from config import *
+
+# Servis modülleri ilk kullanımda yüklenir (bkz. utils/lazy.py)
+get_tagged_resources = lazy("services.tagging_service", "get_tagged_resources")
+tag_resources = lazy("services.tagging_service", "tag_resources")
+list_roles = lazy("services.iam_service", "list_roles")
+list_instance_profiles = lazy("services.iam_service", "list_instance_profiles")
+describe_alias_key = lazy("services.kms_service", "describe_alias_key")
+describe_bucket = lazy("services.s3_service", "describe_bucket")
+describe_audit_table = lazy("services.dynamodb_service", "describe_audit_table")
+describe_key_pair = lazy("services.ec2_service", "describe_key_pair")
+describe_security_group = lazy("services.ec2_service", "describe_security_group")
+describe_security_groups_by_id = lazy("services.ec2_service", "describe_security_groups_by_id")
+list_tagged_instances = lazy("services.ec2_service", "list_tagged_instances")
+describe_ec2_instances = lazy("utils.waiters", "describe_ec2_instances")
+
+logger = get_logger("drift")
+
+OK = "ok"
+MISSING = "missing"
+DRIFTED = "drifted"
+UNTAGGED = "untagged"
+ORPHANED = "orphaned"
+
+LIVE_STATES = ("pending", "running")
+
+
+def _arn_id(arn: str) -> str:
+    return arn.rsplit("/", 1)[-1]
+
+
+class DriftScanner:
+    """
+    Stack'lerin kaynaklarını describe'larla tek tek aramak yerine:
+      1. region başına tek paginated tag:GetResources (STACK_TAG_KEY) ile
+         bütün stack'lerin tagli kaynakları; IAM için hesap genelinde
+         list_roles + list_instance_profiles
+      2. sadece durumu tag'den anlaşılamayanlar describe edilir: KMS key
+         durumu, SG kuralları ve worker'lar (SG ve instance'lar region
+         başına tek batched çağrı), bir de index'te bulunamayanlar
+         (gerçekten yok mu, tag'siz mi)
+    Sorunsuz doğrulanan kaynaklar recheck_age dolana kadar tekrar describe
+    edilmez; daemon modunda her tur sadece yeni/değişen/sorunlu olanlara bakar.
+    """
+
+    def __init__(self, stacks, recheck_age: float = DRIFT_RECHECK_AGE, orphans: bool = False):
+        self.stacks = list(stacks)
+        self.recheck_age = recheck_age
+        self.orphans = orphans
+        self.untagged = []
+        self._checked = {}
+
+    def _cached(self, key, now):
+        entry = self._checked.get(key)
+        if entry is not None and entry[0][0] == OK and now - entry[1] < self.recheck_age:
+            return entry[0]
+        return None
+
+    def _remember(self, key, row, now):
+        self._checked[key] = (row, now)
+        return row
+
+    def scan(self) -> list:
+        """[(status, stack, resource, detail)]"""
+        now = time.monotonic()
+        self.untagged = []
+
+        index = defaultdict(list)
+        for region in sorted({stack.region for stack in self.stacks}):
+            for arn, tags in get_tagged_resources(STACK_TAG_KEY, region=region):
+                index[(tags[STACK_TAG_KEY], tags.get(RESOURCE_TAG_KEY))].append((region, arn))
+
+        roles = list_roles()
+        profiles = list_instance_profiles()
+
+        rows = []
+        groups = defaultdict(dict)
+        fleets = defaultdict(dict)
+        for stack in self.stacks:
+            rows += self._check_stack(stack, index, roles, profiles, now, groups, fleets)
+
+        rows += self._check_groups(groups, now)
+        rows += self._check_fleets(fleets, now)
+
+        if self.orphans:
+            known = {stack.label for stack in self.stacks}
+            for (label, resource), resources in sorted(index.items()):
+                if label in known:
+                    continue
+                for region, arn in resources:
+                    rows.append((ORPHANED, label, resource or "-", f"{arn} | stack not in scan"))
+
+        return rows
+
+    def _index(self, index, stack, resource) -> list:
+        return [arn for region, arn in index.get((stack.label, resource), []) if region == stack.region]
+
+    def _untagged(self, stack, resource, arn, detail):
+        self.untagged.append((stack, resource, arn))
+        return UNTAGGED, stack.label, resource, detail
+
+    def _check_stack(self, stack: Stack, index, roles, profiles, now, groups, fleets) -> list:
+        rows = []
+        region = stack.region
+        account = stack.account_id
+
+        # KMS: alias başka bir key'e taşınmış ya da key disable/silinmek üzere olabilir; tag bunu göstermez
+        keys = self._index(index, stack, "kms")
+        cache_key = (stack.label, "kms", tuple(keys))
+        row = self._cached(cache_key, now)
+        if row is None:
+            key = describe_alias_key(stack.kms_alias, region=region)
+            if key is None:
+                row = (MISSING, stack.label, "kms", stack.kms_alias)
+            elif key["arn"] not in keys:
+                row = self._untagged(stack, "kms", key["arn"], f"{stack.kms_alias} | {key['arn']}")
+            elif key["state"] != "Enabled":
+                row = (DRIFTED, stack.label, "kms", f"{stack.kms_alias} | key state {key['state']}")
+            else:
+                row = (OK, stack.label, "kms", stack.kms_alias)
+            self._remember(cache_key, row, now)
+        rows.append(row)
+
+        # S3 / DynamoDB: tag index'te isimle birlikte görünmeleri yeterli
+        if stack.bucket_arn in self._index(index, stack, "s3"):
+            rows.append((OK, stack.label, "s3", stack.bucket_name))
+        elif describe_bucket(stack.bucket_name, region=region) is not None:
+            rows.append(self._untagged(stack, "s3", stack.bucket_arn, stack.bucket_name))
+        else:
+            rows.append((MISSING, stack.label, "s3", stack.bucket_name))
+
+        if any(arn.endswith(f":table/{stack.table_name}") for arn in self._index(index, stack, "dynamodb")):
+            rows.append((OK, stack.label, "dynamodb", stack.table_name))
+        else:
+            table = describe_audit_table(stack.table_name, region=region)
+            if table is not None:
+                rows.append(self._untagged(stack, "dynamodb", table["arn"], stack.table_name))
+            else:
+                rows.append((MISSING, stack.label, "dynamodb", stack.table_name))
+
+        # IAM global; tag index yerine hesap genelindeki listelerle
+        rows.append((OK if stack.role_name in roles else MISSING, stack.label, "iam.role", stack.role_name))
+        if stack.profile_name not in profiles:
+            rows.append((MISSING, stack.label, "iam.instance_profile", stack.profile_name))
+        elif stack.role_name not in profiles[stack.profile_name]:
+            rows.append((DRIFTED, stack.label, "iam.instance_profile", f"{stack.profile_name} | {stack.role_name} detached"))
+        else:
+            rows.append((OK, stack.label, "iam.instance_profile", stack.profile_name))
+
+        # Key pair ARN'i isim değil id taşır; stack'in tek key pair'i olduğu için varlığı yeterli
+        if self._index(index, stack, "ec2.key_pair"):
+            rows.append((OK, stack.label, "ec2.key_pair", stack.key_pair_name))
+        else:
+            pair = describe_key_pair(stack.key_pair_name, region=region)
+            if pair is not None:
+                arn = f"arn:aws:ec2:{region}:{account}:key-pair/{pair['key_pair_id']}"
+                rows.append(self._untagged(stack, "ec2.key_pair", arn, stack.key_pair_name))
+            else:
+                rows.append((MISSING, stack.label, "ec2.key_pair", stack.key_pair_name))
+
+        # SG kuralları ve worker durumu sonradan region başına tek çağrıda doğrulanır
+        group_ids = [_arn_id(arn) for arn in self._index(index, stack, "ec2.security_group")]
+        if group_ids:
+            for group_id in group_ids:
+                cache_key = (stack.label, "ec2.security_group", group_id)
+                row = self._cached(cache_key, now)
+                if row is not None:
+                    rows.append(row)
+                else:
+                    groups[region][group_id] = stack
+        else:
+            group = describe_security_group(stack.security_group_name, region=region)
+            if group is not None:
+                arn = f"arn:aws:ec2:{region}:{account}:security-group/{group['group_id']}"
+                rows.append(self._untagged(stack, "ec2.security_group", arn, stack.security_group_name))
+            else:
+                rows.append((MISSING, stack.label, "ec2.security_group", stack.security_group_name))
+
+        instance_ids = tuple(sorted(_arn_id(arn) for arn in self._index(index, stack, "ec2.instance")))
+        row = self._cached((stack.label, "ec2.instance", instance_ids), now)
+        if row is not None:
+            rows.append(row)
+        elif instance_ids:
+            fleets[region][stack] = instance_ids
+        elif stack.worker_count == 0:
+            rows.append((OK, stack.label, "ec2.instance", "x0"))
+        else:
+            live = [i for i in list_tagged_instances(region=region, tag_name=stack.instance_tag) if i["state"] in LIVE_STATES]
+            for instance in live:
+                arn = f"arn:aws:ec2:{region}:{account}:instance/{instance['instance_id']}"
+                rows.append(self._untagged(stack, "ec2.instance", arn, instance["instance_id"]))
+            if len(live) != stack.worker_count:
+                rows.append((DRIFTED if live else MISSING, stack.label, "ec2.instance",
+                             f"{stack.instance_tag} | running {len(live)}/{stack.worker_count}"))
+
+        return rows
+
+    def _check_groups(self, groups, now) -> list:
+        rows = []
+        for region, members in groups.items():
+            found = describe_security_groups_by_id(list(members), region=region)
+            for group_id, stack in members.items():
+                group = found.get(group_id)
+                if group is None:
+                    row = (MISSING, stack.label, "ec2.security_group", f"{stack.security_group_name} | {group_id}")
+                elif stack.ssh_cidr not in group["ssh_cidrs"]:
+                    row = (DRIFTED, stack.label, "ec2.security_group",
+                           f"{group['name']} | SSH not allowed from {stack.ssh_cidr}")
+                elif len(set(group["ssh_cidrs"])) > 1:
+                    extra = sorted(set(group["ssh_cidrs"]) - {stack.ssh_cidr})
+                    row = (DRIFTED, stack.label, "ec2.security_group", f"{group['name']} | SSH also open to {extra}")
+                else:
+                    row = (OK, stack.label, "ec2.security_group", group["name"])
+                rows.append(self._remember((stack.label, "ec2.security_group", group_id), row, now))
+        return rows
+
+    def _check_fleets(self, fleets, now) -> list:
+        rows = []
+        for region, members in fleets.items():
+            # Bütün stack'lerin worker'ları region başına tek (sayfalanmış) describe_instances
+            described = describe_ec2_instances(sorted({i for ids in members.values() for i in ids}), region=region)
+            for stack, instance_ids in members.items():
+                live = sum(
+                    1 for i in instance_ids if i in described and described[i]["State"]["Name"] in LIVE_STATES
+                )
+                if live == stack.worker_count:
+                    row = (OK, stack.label, "ec2.instance", f"{stack.instance_tag} x{live}")
+                else:
+                    row = (DRIFTED if live else MISSING, stack.label, "ec2.instance",
+                           f"{stack.instance_tag} | running {live}/{stack.worker_count}")
+                rows.append(self._remember((stack.label, "ec2.instance", instance_ids), row, now))
+        return rows
+
+    def retag(self) -> int:
+        """Son taramada tag'siz bulunan kaynaklara stack tag'lerini ekler; tag'lenen kaynak sayısı."""
+        batches = defaultdict(list)
+        for stack, resource, arn in self.untagged:
+            batches[(stack.region, stack.label, resource)].append(arn)
+
+        tagged = 0
+        for (region, label, resource), arns in batches.items():
+            if tag_resources(arns, {STACK_TAG_KEY: label, RESOURCE_TAG_KEY: resource}, region=region):
+                tagged += len(arns)
+                logger.info("Drift | Retagged | %s | %s | %d", label, resource, len(arns))
+        return tagged
+
+
+def format_drift(rows: list) -> str:
+    stack_width = max([len(r[1]) for r in rows] + [5])
+    width = max([len(r[2]) for r in rows] + [8])
+
+    lines = [f"  {r[0]:<8}  {r[1].ljust(stack_width)}  {r[2].ljust(width)}  {r[3]}" for r in rows]
+    counts = {status: sum(1 for r in rows if r[0] == status) for status in (DRIFTED, MISSING, UNTAGGED, ORPHANED)}
+    lines.append(
+        f"Drift: {counts[DRIFTED]} drifted, {counts[MISSING]} missing, "
+        f"{counts[UNTAGGED]} untagged, {counts[ORPHANED]} orphaned."
+    )
+    return "\n".join(lines)
+
+
+def drift(stacks, orphans: bool = False, retag: bool = False) -> list:
+    start = time.perf_counter()
+    scanner = DriftScanner(stacks, orphans=orphans)
+
+    rows = scanner.scan()
+    logger.info("Drift | stacks=%s | %.2fs\n%s", len(scanner.stacks), time.perf_counter() - start, format_drift(rows))
+    if retag and scanner.untagged:
+        scanner.retag()
+
+    return [r for r in rows if r[0] != OK]
+
+
+def run_daemon(stacks, interval: float = DRIFT_INTERVAL, orphans: bool = False, retag: bool = False):
+    """
+    Her interval saniyede bir tarar; sadece yeni ortaya çıkan ve düzelen
+    drift'leri loglar. Sorunsuz kaynaklar DRIFT_RECHECK_AGE dolana kadar
+    tekrar describe edilmez, tur başına maliyet tag:GetResources + IAM listeleri.
+    """
+    scanner = DriftScanner(stacks, orphans=orphans)
+    previous = {}
+
+    while True:
+        start = time.perf_counter()
+        # Throttling, süresi dolmuş credential ya da ağ hatası daemon'ı öldürmez; previous korunur,
+        # bir sonraki tur aynı karşılaştırmayı yapar
+        try:
+            rows = scanner.scan()
+            current = {(r[1], r[2], r[3]): r for r in rows if r[0] != OK}
+
+            for key in current.keys() - previous.keys():
+                logger.warning("Drift | Detected | %s | %s | %s | %s", current[key][0], *key)
+            for key in previous.keys() - current.keys():
+                logger.info("Drift | Resolved | %s | %s | %s", *key)
+            if retag and scanner.untagged:
+                scanner.retag()
+
+            previous = current
+            logger.info("Drift | Scan completed | open=%d | %.2fs", len(current), time.perf_counter() - start)
+        except Exception:
+            logger.exception("Drift | Scan failed, retrying next interval | %.2fs", time.perf_counter() - start)
+        time.sleep(interval)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Report drift between Aegis stacks and what exists in AWS")
+    parser.add_argument(
+        "--regions",
+        type=lambda value: value.split(","),
+        metavar="REGION[,REGION...]",
+        help=f"Check the region stacks of these regions (default: {AWS_REGION})"
+    )
+    parser.add_argument("--spec", metavar="FILE", help="Check every stack declared in this JSON spec file")
+    parser.add_argument(
+        "--stacks",
+        type=lambda value: value.split(","),
+        metavar="NAME[,NAME...]",
+        help="With --spec: check only these stacks"
+    )
+    parser.add_argument(
+        "--orphans",
+        action="store_true",
+        help=f"Also report resources tagged {STACK_TAG_KEY} for stacks that are not being checked"
+    )
+    parser.add_argument(
+        "--retag",
+        action="store_true",
+        help="Add the stack tags to resources that exist but were found untagged"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep scanning every --interval seconds and log drift as it appears and clears"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DRIFT_INTERVAL,
+        help=f"Seconds between scans in --daemon mode (default: {DRIFT_INTERVAL})"
+    )
+    parser.add_argument(
+        "--detailed-exitcode",
+        action="store_true",
+        help="Exit with 2 when drift was found, 0 when there is none"
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default=LOG_FORMAT,
+        help=f"Console log format; json writes one JSON object per line (default: {LOG_FORMAT})"
+    )
+    args = parser.parse_args(argv)
+    if args.spec and args.regions:
+        parser.error("--spec and --regions cannot be combined; set the region per stack in the spec")
+    if args.stacks and not args.spec:
+        parser.error("--stacks requires --spec")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    set_log_format(args.log_format)
+    if args.spec:
+        stacks = load_stack_spec(args.spec, args.stacks)
+    else:
+        stacks = [stack_for_region(region) for region in dict.fromkeys(args.regions or [AWS_REGION])]
+
+    found = []
+    try:
+        if args.daemon:
+            run_daemon(stacks, args.interval, args.orphans, args.retag)
+        else:
+            found = drift(stacks, args.orphans, args.retag)
+    except KeyboardInterrupt:
+        logger.info("Drift | Stopped")
+    finally:
+        write_metrics_report()
+        AWSSessionManager.get_instance().shutdown()
+    if args.detailed_exitcode and found:
+        sys.exit(2)
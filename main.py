@@ -1,63 +1,370 @@
-from utils.logger import get_logger
+import argparse
+from functools import partial
+from utils.logger import get_logger, set_log_format
+from utils.session import AWSSessionManager
+from utils.dag import ResourceGraph, format_summary, failed_nodes, run_graphs
+from utils.state import StateStore
+from utils.journal import Journal, journaled
+from utils.stack import Stack, stack_for_region, load_stack_spec, fan_out, stack_outcomes, format_stack_report
+from utils.lazy import lazy
+from utils.metrics import write_metrics_report
+from utils.audit import audit_log, close_audit_logs
 from config import *
-from services.kms_service import create_master_key
-from services.s3_service import create_bucket
-from services.dynamodb_service import create_audit_table
-from services.iam_service import setup_iam_infrastructure
-from services.ec2_service import provision_ec2_instance
+
+# Servis modülleri ilk kullanımda yüklenir (bkz. utils/lazy.py)
+create_master_key = lazy("services.kms_service", "create_master_key")
+key_is_enabled = lazy("services.kms_service", "key_is_enabled")
+schedule_key_deletion = lazy("services.kms_service", "schedule_key_deletion")
+create_bucket = lazy("services.s3_service", "create_bucket")
+bucket_exists = lazy("services.s3_service", "bucket_exists")
+create_audit_table = lazy("services.dynamodb_service", "create_audit_table")
+table_is_active = lazy("services.dynamodb_service", "table_is_active")
+setup_iam_infrastructure = lazy("services.iam_service", "setup_iam_infrastructure")
+instance_profile_has_role = lazy("services.iam_service", "instance_profile_has_role")
+create_key_pair = lazy("services.ec2_service", "create_key_pair")
+key_pair_exists = lazy("services.ec2_service", "key_pair_exists")
+get_worker_ami = lazy("services.ec2_service", "get_worker_ami")
+prewarm_ami_cache = lazy("services.ami_service", "prewarm_ami_cache")
+ensure_security_group = lazy("services.ec2_service", "ensure_security_group")
+security_group_exists = lazy("services.ec2_service", "security_group_exists")
+launch_workers = lazy("services.ec2_service", "launch_workers")
+running_worker_ips = lazy("services.ec2_service", "running_worker_ips")
 
 logger = get_logger("main")
 
-def main():
-    logger.info("Aegis Infrastructure Provisioning Started")
 
-    # 1. KMS
-    logger.info("Step 1: Creating KMS Master Key")
-    key_id, key_arn = create_master_key()
+def kms_step(stack: Stack, journal: Journal = None):
+    # Önceki çalışma CreateKey ile CreateAlias arasında kesildiyse o key sahiplenilir
+    pending = journal.orphans("kms_key") if journal else []
+    key_id, key_arn = create_master_key(
+        stack.kms_alias, region=stack.region, tags=stack.tags("kms"),
+        pending_key_id=pending[0] if pending else None,
+        on_key_created=partial(journal.resource, "kms_key") if journal else None
+    )
     if not key_arn:
         raise Exception("KMS Key creation failed")
-    logger.info(f"KMS Key Ready | KeyId={key_id}")
 
-    # 2. S3
-    logger.info("Step 2: Creating S3 Bucket")
-    if not create_bucket(S3_BUCKET_NAME):
+    if journal:
+        for orphan in pending:
+            if orphan != key_id and not schedule_key_deletion(orphan, region=stack.region):
+                continue
+            journal.settle("kms_key", orphan)
+        journal.settle("kms_key", key_id)
+    logger.info("KMS Key Ready | %s | KeyId=%s", stack.region, key_id)
+    return key_arn
+
+
+def s3_step(stack: Stack):
+    if not create_bucket(stack.bucket_name, region=stack.region, tags=stack.tags("s3")):
         raise Exception("S3 bucket creation failed")
-    bucket_arn = f"arn:aws:s3:::{S3_BUCKET_NAME}"
-    logger.info(f"S3 Bucket Ready | {bucket_arn}")
+    logger.info("S3 Bucket Ready | %s", stack.bucket_arn)
+    return stack.bucket_arn
+
 
-    # 3. DynamoDB
-    logger.info("Step 3: Creating DynamoDB Table")
-    if not create_audit_table(DYNAMODB_TABLE_NAME):
+def dynamodb_step(stack: Stack):
+    if not create_audit_table(stack.table_name, region=stack.region, tags=stack.tags("dynamodb")):
         raise Exception("DynamoDB table creation failed")
-    table_arn = f"arn:aws:dynamodb:{AWS_REGION}:{AWS_ACCOUNT_ID}:table/{DYNAMODB_TABLE_NAME}"
-    logger.info(f"DynamoDB Table Ready | {table_arn}")
+    logger.info("DynamoDB Table Ready | %s", stack.table_arn)
+    return stack.table_arn
 
-    # 4. IAM
-    logger.info("Step 4: Setting up IAM Infrastructure")
+
+def iam_step(stack: Stack, kms, s3, dynamodb):
     if not setup_iam_infrastructure(
-        IAM_ROLE_NAME,
-        IAM_INSTANCE_PROFILE_NAME,
-        "AegisInlinePolicy",
-        bucket_arn,
-        table_arn,
-        key_arn
+        stack.role_name,
+        stack.profile_name,
+        stack.policy_name,
+        s3,
+        dynamodb,
+        kms,
+        role_tags=stack.tags("iam.role"),
+        profile_tags=stack.tags("iam.instance_profile")
     ):
         raise Exception("IAM setup failed")
-    logger.info("IAM Infrastructure Ready")
+    logger.info("IAM Infrastructure Ready | %s", stack.profile_name)
+    return stack.profile_name
+
 
-    # 5. EC2
-    logger.info("Step 5: Provisioning EC2 Instance")
-    public_ip = provision_ec2_instance(
-        EC2_KEY_PAIR_NAME,
-        EC2_SECURITY_GROUP_NAME,
-        SSH_ALLOWED_CIDR,
-        IAM_INSTANCE_PROFILE_NAME
+def ec2_step(stack: Stack, iam, key_pair, ami, security_group):
+    public_ips = launch_workers(
+        stack.worker_count, ami, key_pair, security_group, iam, region=stack.region, tag_name=stack.instance_tag,
+        tags=stack.tags("ec2.instance"), warm_pool=stack.warm_pool
     )
+    if len(public_ips) != stack.worker_count:
+        raise Exception(f"EC2 fleet incomplete | {len(public_ips)}/{stack.worker_count} workers running")
+    logger.info("EC2 Workers Ready | %s | count=%s | Public IPs = %s", stack.region, len(public_ips), public_ips)
+    return public_ips
+
+
+def stateful(state, name, inputs, step, verify=None, trust=False):
+    """
+    Node fonksiyonunu state cache ile sarar. Bağımlılık değerleri de
+    fingerprint'e girer; upstream değişirse node yeniden reconcile edilir.
+    """
+    if state is None:
+        return step
+
+    def run(**deps):
+        return state.resolve(name, {**inputs, **deps}, lambda: step(**deps), verify, trust)
+
+    return run
+
+
+def build_apply_graph(stack: Stack, state: StateStore = None, trust_state: bool = False,
+                      journal: Journal = None) -> ResourceGraph:
+    """
+    KMS, S3, DynamoDB, KeyPair, AMI ve SG birbirinden bağımsızdır.
+    IAM sadece ARN'lere, EC2 launch sadece instance profile'a ihtiyaç duyar.
+    """
+    graph = ResourceGraph(f"apply[{stack.label}]")
+    region = stack.region
+
+    def node(name, step, inputs, verify=None, deps=(), service=None):
+        func = journaled(journal, name, stateful(state, name, inputs, step, verify, trust_state), inputs)
+        graph.add(name, func, deps=deps, service=service)
 
-    logger.info(f"EC2 Instance Ready | Public IP = {public_ip}")
+    node("kms", partial(kms_step, stack, journal), {"alias": stack.kms_alias, "region": region},
+         lambda arn: key_is_enabled(arn, region=region), service="kms")
+    node("s3", partial(s3_step, stack), {"bucket": stack.bucket_name, "region": region},
+         lambda arn: bucket_exists(stack.bucket_name, region=region), service="s3")
+    node("dynamodb", partial(dynamodb_step, stack),
+         {"table": stack.table_name, "billing": stack.billing_mode, "region": region},
+         lambda arn: table_is_active(stack.table_name, region=region), service="dynamodb")
+    node("key_pair", lambda: create_key_pair(stack.key_pair_name, region=region, tags=stack.tags("ec2.key_pair")),
+         {"name": stack.key_pair_name, "region": region},
+         lambda name: key_pair_exists(name, region=region), service="ec2")
+    # Baked worker AMI (bake.py) yoksa "latest" AMI; o da AMI_CACHE_TTL süresince cache'ten gelir.
+    # trust_state ile kayıtlı değer kullanılır.
+    node("ami", lambda: get_worker_ami(region=region, parameter=stack.ami_parameter),
+         {"parameter": stack.ami_parameter, "region": region, "baked": EC2_USE_BAKED_AMI}, service="ec2")
+    node("security_group",
+         lambda: ensure_security_group(
+             stack.security_group_name, stack.ssh_cidr, region=region, tags=stack.tags("ec2.security_group")
+         ),
+         {"name": stack.security_group_name, "cidr": stack.ssh_cidr, "region": region},
+         lambda sg_id: security_group_exists(sg_id, region=region), service="ec2")
+    node("iam", partial(iam_step, stack),
+         {"role": stack.role_name, "profile": stack.profile_name, "policy": stack.policy_name},
+         lambda profile: instance_profile_has_role(profile, stack.role_name),
+         deps=("kms", "s3", "dynamodb"), service="iam")
+    node("ec2", partial(ec2_step, stack), {"region": region, "workers": stack.worker_count, "warm": stack.warm_pool},
+         lambda ips: isinstance(ips, list) and running_worker_ips(region=region, tag_name=stack.instance_tag) == ips,
+         deps=("iam", "key_pair", "ami", "security_group"), service="ec2")
+
+    return graph
+
+
+def _apply_graph(stack: Stack, trust_state: bool, use_state: bool, only, resume: bool = True):
+    """(graph, journal); --no-state ile ikisi de kapalı, journal None."""
+    state = StateStore(stack.state_file) if use_state else None
+    journal = Journal(stack.journal_file).begin("apply", resume) if use_state else None
+    graph = build_apply_graph(stack, state, trust_state, journal)
+    return (graph.subgraph(only) if only else graph), journal
+
+
+def _apply_outcome(stack: Stack, results: dict, journal: Journal = None):
+    logger.info("Apply summary | %s\n%s", stack.label, format_summary(results))
+
+    failed = failed_nodes(results)
+    if journal is not None:
+        journal.end(not failed)
+    if failed:
+        raise Exception(f"Provisioning failed | {stack.label} | {', '.join(failed)}")
+
+    return results["ec2"].value if "ec2" in results else None
+
+
+def apply_stack(stack: Stack, max_parallel: int = APPLY_MAX_PARALLEL, trust_state: bool = False,
+                use_state: bool = True, only=None, audit: bool = AUDIT_ENABLED, resume: bool = True):
+    graph, journal = _apply_graph(stack, trust_state, use_state, only, resume)
+
+    on_result = partial(audit_log(stack.table_name, stack.region).record_node, "apply") if audit else None
+    results = graph.run(max_parallel=max_parallel, on_result=on_result)
+    return _apply_outcome(stack, results, journal)
+
+
+def apply_stacks(stacks, max_parallel: int = STACK_MAX_PARALLEL, service_limits: dict = STACK_SERVICE_LIMITS,
+                 trust_state: bool = False, use_state: bool = True, only=None, audit: bool = AUDIT_ENABLED,
+                 resume: bool = True) -> dict:
+    """
+    Spec'teki bütün stack'ler tek bir scheduler'da: bütün stack'lerin node'ları
+    aynı thread pool'u, toplam ve servis başına limitleri paylaşır. Bir
+    stack'in hatası sadece o stack'i etkiler; hepsi bittikten sonra rapor basılır.
+    """
+    if not only or "ami" in only or "ec2" in only:
+        prewarm_ami_cache(sorted({stack.region for stack in stacks}), sorted({stack.ami_parameter for stack in stacks}))
+
+    built = {stack.label: _apply_graph(stack, trust_state, use_state, only, resume) for stack in stacks}
+    graphs = {label: graph for label, (graph, _) in built.items()}
+    sinks = {stack.label: audit_log(stack.table_name, stack.region) for stack in stacks} if audit else {}
+
+    def on_result(label, result):
+        if label in sinks:
+            sinks[label].record_node("apply", result)
+
+    runs = run_graphs(graphs, max_parallel, service_limits, on_result)
+    results = stack_outcomes(
+        stacks, runs, lambda stack, results: _apply_outcome(stack, results, built[stack.label][1])
+    )
+    logger.info("Stack apply report\n" + format_stack_report(results, title="STACK"))
+    return results
+
+
+def main(max_parallel: int = APPLY_MAX_PARALLEL, trust_state: bool = False, use_state: bool = True, only=None,
+         regions=None, region_parallel: int = REGION_MAX_PARALLEL, workers: int = EC2_WORKER_COUNT,
+         audit: bool = AUDIT_ENABLED, spec: str = None, stack_names=None, stack_parallel: int = STACK_MAX_PARALLEL,
+         resume: bool = True, warm_pool: int = EC2_WARM_POOL_SIZE):
+    logger.info("Aegis Infrastructure Provisioning Started")
+
+    if spec:
+        results = apply_stacks(load_stack_spec(spec, stack_names), stack_parallel, STACK_SERVICE_LIMITS,
+                               trust_state, use_state, only, audit, resume)
+        failed = [name for name, result in results.items() if not result.ok]
+        if failed:
+            raise Exception(f"Provisioning failed in stacks | {', '.join(failed)}")
+
+        logger.info("Aegis Infrastructure Provisioning Completed")
+        return {name: result.value for name, result in results.items()}
+
+    if not regions or regions == [AWS_REGION]:
+        public_ips = apply_stack(
+            stack_for_region(AWS_REGION, workers, warm_pool), max_parallel, trust_state, use_state, only, audit, resume
+        )
+        logger.info("Aegis Infrastructure Provisioning Completed")
+        return public_ips
+
+    if not only or "ami" in only or "ec2" in only:
+        # Bütün region'ların AMI'leri region başına tek SSM çağrısıyla önceden çözülür
+        prewarm_ami_cache(regions, [SSM_AMI_PARAMETER])
+
+    results = fan_out(
+        regions,
+        lambda stack: apply_stack(stack, max_parallel, trust_state, use_state, only, audit, resume),
+        region_parallel,
+        worker_count=workers,
+        warm_pool=warm_pool
+    )
+    logger.info("Multi-region apply report\n" + format_stack_report(results))
+
+    failed = [region for region, result in results.items() if not result.ok]
+    if failed:
+        raise Exception(f"Provisioning failed in regions | {', '.join(failed)}")
 
     logger.info("Aegis Infrastructure Provisioning Completed")
+    return {region: result.value for region, result in results.items()}
 
-if __name__ == "__main__":
-    main()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aegis infrastructure provisioning")
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=APPLY_MAX_PARALLEL,
+        help=f"Maximum number of resources provisioned concurrently (default: {APPLY_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--only",
+        type=lambda value: value.split(","),
+        metavar="NODE[,NODE...]",
+        help="Apply only these resources (and what they depend on): "
+             "kms, s3, dynamodb, key_pair, ami, security_group, iam, ec2"
+    )
+    parser.add_argument(
+        "--regions",
+        type=lambda value: value.split(","),
+        metavar="REGION[,REGION...]",
+        help=f"Provision the stack in every listed region concurrently (default: {AWS_REGION})"
+    )
+    parser.add_argument(
+        "--region-parallel",
+        type=int,
+        default=REGION_MAX_PARALLEL,
+        help=f"Maximum number of regions provisioned concurrently (default: {REGION_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--spec",
+        metavar="FILE",
+        help="Provision every stack declared in this JSON spec file (see README, Stack Specs)"
+    )
+    parser.add_argument(
+        "--stacks",
+        type=lambda value: value.split(","),
+        metavar="NAME[,NAME...]",
+        help="With --spec: provision only these stacks"
+    )
+    parser.add_argument(
+        "--stack-parallel",
+        type=int,
+        default=STACK_MAX_PARALLEL,
+        help=f"With --spec: maximum number of resources provisioned concurrently across all stacks "
+             f"(default: {STACK_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EC2_WORKER_COUNT,
+        help=f"Number of EC2 workers to keep running per region (default: {EC2_WORKER_COUNT})"
+    )
+    parser.add_argument(
+        "--warm-pool",
+        type=int,
+        default=EC2_WARM_POOL_SIZE,
+        help=f"Number of stopped, already set up instances to keep per region for fast scale-out "
+             f"(default: {EC2_WARM_POOL_SIZE})"
+    )
+    parser.add_argument(
+        "--trust-state",
+        action="store_true",
+        help="Skip AWS existence checks for resources whose recorded inputs are unchanged"
+    )
+    parser.add_argument(
+        "--no-audit",
+        action="store_true",
+        help=f"Do not record applied resources in the audit table ({DYNAMODB_TABLE_NAME})"
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help=f"Ignore and do not update the local state file ({STATE_FILE})"
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Do not resume an interrupted apply from its journal; re-check every resource"
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default=LOG_FORMAT,
+        help=f"Console log format; json writes one JSON object per line (default: {LOG_FORMAT})"
+    )
+    args = parser.parse_args(argv)
+    if args.spec and args.regions:
+        parser.error("--spec and --regions cannot be combined; set the region per stack in the spec")
+    if args.stacks and not args.spec:
+        parser.error("--stacks requires --spec")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    set_log_format(args.log_format)
+    try:
+        main(
+            max_parallel=args.max_parallel,
+            trust_state=args.trust_state,
+            use_state=not args.no_state,
+            only=args.only,
+            regions=args.regions,
+            region_parallel=args.region_parallel,
+            workers=args.workers,
+            warm_pool=args.warm_pool,
+            audit=AUDIT_ENABLED and not args.no_audit,
+            spec=args.spec,
+            stack_names=args.stacks,
+            stack_parallel=args.stack_parallel,
+            resume=not args.no_resume
+        )
+    finally:
+        close_audit_logs()
+        write_metrics_report()
+        AWSSessionManager.get_instance().shutdown()
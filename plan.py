@@ -0,0 +1,269 @@
+import argparse
+import sys
+import time
+from utils.logger import get_logger, set_log_format
+from utils.session import AWSSessionManager
+from utils.dag import ResourceGraph, failed_nodes
+from utils.lazy import lazy
+from utils.metrics import write_metrics_report
+from utils.stack import Stack, stack_for_region
+from config import *
+from data.policies import build_permission_policy, permissions_hash
+
+describe_alias_key = lazy("services.kms_service", "describe_alias_key")
+describe_bucket = lazy("services.s3_service", "describe_bucket")
+describe_audit_table = lazy("services.dynamodb_service", "describe_audit_table")
+describe_role = lazy("services.iam_service", "describe_role")
+get_inline_policy = lazy("services.iam_service", "get_inline_policy")
+managed_permission_documents = lazy("services.iam_service", "managed_permission_documents")
+describe_instance_profile = lazy("services.iam_service", "describe_instance_profile")
+key_pair_exists = lazy("services.ec2_service", "key_pair_exists")
+describe_security_group = lazy("services.ec2_service", "describe_security_group")
+list_tagged_instances = lazy("services.ec2_service", "list_tagged_instances")
+
+logger = get_logger("plan")
+
+CREATE = "+"
+UPDATE = "~"
+DELETE = "-"
+NOOP = "="
+
+
+def snapshot_iam(stack: Stack) -> dict:
+    """
+    IAM'de role + policy + profile'ı birlikte dönen dar kapsamlı bir batch
+    okuma yok (GetAccountAuthorizationDetails bütün hesabı döker); okumalar
+    aynı (pool'daki) client ile tek node'da sırayla yapılır. Role yoksa
+    policy'si de yoktur, okunmaz. İnline limitini aşan izinler managed
+    policy'lere paketlenmiş olabilir; onlar da okunur.
+    """
+    role = describe_role(stack.role_name)
+    return {
+        "role": role,
+        "policy": get_inline_policy(stack.role_name, stack.policy_name) if role else None,
+        "managed_policies": managed_permission_documents(stack.role_name, stack.policy_name) if role else [],
+        "instance_profile": describe_instance_profile(stack.profile_name),
+    }
+
+
+def snapshot_ec2(stack: Stack) -> dict:
+    """Key pair, SG ve instance'lar için ortak bir describe yok; tek node'da aynı client ile."""
+    region = stack.region
+    return {
+        "key_pair": key_pair_exists(stack.key_pair_name, region=region) or None,
+        "security_group": describe_security_group(stack.security_group_name, region=region),
+        "instances": list_tagged_instances(region=region, tag_name=stack.instance_tag) or None,
+    }
+
+
+def build_snapshot_graph(stack: Stack) -> ResourceGraph:
+    """Servis başına tek read-only node; node'lar birbirinden bağımsız, hepsi aynı anda çalışır."""
+    graph = ResourceGraph(f"plan[{stack.label}]")
+    region = stack.region
+
+    graph.add("kms", lambda: describe_alias_key(stack.kms_alias, region=region))
+    graph.add("s3", lambda: describe_bucket(stack.bucket_name, region=region))
+    graph.add("dynamodb", lambda: describe_audit_table(stack.table_name, region=region))
+    graph.add("iam", lambda: snapshot_iam(stack))
+    graph.add("ec2", lambda: snapshot_ec2(stack))
+
+    return graph
+
+
+def snapshot(stack: Stack, max_parallel: int = PLAN_MAX_PARALLEL) -> dict:
+    results = build_snapshot_graph(stack).run(max_parallel=max_parallel)
+
+    failed = failed_nodes(results)
+    if failed:
+        errors = " | ".join(f"{name}: {results[name].error}" for name in failed)
+        raise Exception(f"Discovery failed | {errors}")
+
+    current = {}
+    for name, result in results.items():
+        # iam/ec2 node'ları kaynak başına değerleri birlikte döner
+        current.update(result.value if name in ("iam", "ec2") else {name: result.value})
+    return current
+
+
+def diff_apply(current: dict, stack: Stack) -> list:
+    changes = []
+
+    def change(action, resource, detail):
+        changes.append((action, resource, detail))
+
+    kms = current["kms"]
+    if kms is None:
+        change(CREATE, "kms", stack.kms_alias)
+    elif kms["state"] != "Enabled":
+        change(UPDATE, "kms", f"{stack.kms_alias} | key state {kms['state']}")
+    else:
+        change(NOOP, "kms", stack.kms_alias)
+
+    bucket = current["s3"]
+    if bucket is None:
+        change(CREATE, "s3", stack.bucket_name)
+    elif bucket["region"] and bucket["region"] != stack.region:
+        change(UPDATE, "s3", f"{stack.bucket_name} | in {bucket['region']}, expected {stack.region}")
+    else:
+        change(NOOP, "s3", stack.bucket_name)
+
+    table = current["dynamodb"]
+    if table is None:
+        change(CREATE, "dynamodb", stack.table_name)
+    elif table["billing_mode"] != stack.billing_mode:
+        change(UPDATE, "dynamodb", f"{stack.table_name} | billing {table['billing_mode']} -> {stack.billing_mode}")
+    else:
+        change(NOOP, "dynamodb", stack.table_name)
+
+    change(NOOP if current["role"] else CREATE, "iam.role", stack.role_name)
+
+    # Apply izinleri inline limiti aşınca managed policy'lere paketler; karşılaştırma ikisinin toplamıyla
+    documents = ([current["policy"]] if current["policy"] else []) + current["managed_policies"]
+    if not documents:
+        change(CREATE, "iam.policy", stack.policy_name)
+    elif kms is None:
+        change(UPDATE, "iam.policy", f"{stack.policy_name} | KMS key known after apply")
+    else:
+        desired = build_permission_policy(stack.bucket_arn, stack.table_arn, kms["arn"])
+        if permissions_hash(documents) != permissions_hash([desired]):
+            change(UPDATE, "iam.policy", f"{stack.policy_name} | document differs")
+        else:
+            change(NOOP, "iam.policy", stack.policy_name)
+
+    profile = current["instance_profile"]
+    if profile is None:
+        change(CREATE, "iam.instance_profile", stack.profile_name)
+    elif stack.role_name not in profile["roles"]:
+        change(UPDATE, "iam.instance_profile", f"{stack.profile_name} | attach {stack.role_name}")
+    else:
+        change(NOOP, "iam.instance_profile", stack.profile_name)
+
+    change(NOOP if current["key_pair"] else CREATE, "ec2.key_pair", stack.key_pair_name)
+
+    group = current["security_group"]
+    if group is None:
+        change(CREATE, "ec2.security_group", stack.security_group_name)
+    elif stack.ssh_cidr not in group["ssh_cidrs"]:
+        change(UPDATE, "ec2.security_group", f"{stack.security_group_name} | allow SSH from {stack.ssh_cidr}")
+    else:
+        change(NOOP, "ec2.security_group", stack.security_group_name)
+
+    instances = current["instances"] or []
+    kept = sorted(instances, key=lambda i: (i["state"] not in ("pending", "running"), i["instance_id"]))
+    kept = kept[:stack.worker_count]
+    for instance in kept:
+        if instance["state"] in ("pending", "running"):
+            change(NOOP, "ec2.instance", instance["instance_id"])
+        else:
+            change(UPDATE, "ec2.instance", f"start {instance['instance_id']}")
+    # Fazlalıklardan warm_pool kadarı (önce durdurulmuş olanlar) silinmez, durdurulmuş bekletilir
+    surplus = sorted(
+        (i for i in instances if i not in kept), key=lambda i: (i["state"] not in ("stopped", "stopping"), i["instance_id"])
+    )
+    pool = surplus[:stack.warm_pool]
+    for instance in surplus:
+        if instance not in pool:
+            change(DELETE, "ec2.instance", f"{instance['instance_id']} | surplus worker")
+        elif instance["state"] in ("stopped", "stopping"):
+            change(NOOP, "ec2.instance", f"{instance['instance_id']} | warm pool")
+        else:
+            change(UPDATE, "ec2.instance", f"stop {instance['instance_id']} | warm pool")
+    if len(kept) < stack.worker_count:
+        change(CREATE, "ec2.instance", f"{stack.instance_tag} x{stack.worker_count - len(kept)}")
+    if len(pool) < stack.warm_pool:
+        change(CREATE, "ec2.instance", f"{stack.instance_tag} x{stack.warm_pool - len(pool)} | warm pool")
+
+    return changes
+
+
+def diff_destroy(current: dict, stack: Stack) -> list:
+    changes = []
+
+    for instance in current["instances"] or []:
+        changes.append((DELETE, "ec2.instance", instance["instance_id"]))
+
+    present = [
+        ("ec2.security_group", current["security_group"], stack.security_group_name),
+        ("ec2.key_pair", current["key_pair"], stack.key_pair_name),
+        ("iam.instance_profile", current["instance_profile"], stack.profile_name),
+        ("iam.policy", current["policy"] or current["managed_policies"], stack.policy_name),
+        ("iam.role", current["role"], stack.role_name),
+        ("dynamodb", current["dynamodb"], stack.table_name),
+        ("s3", current["s3"], stack.bucket_name),
+        ("kms", current["kms"], stack.kms_alias),
+    ]
+
+    for resource, state, name in present:
+        if state:
+            changes.append((DELETE, resource, name))
+
+    return changes
+
+
+def format_plan(changes: list) -> str:
+    width = max([len(resource) for _, resource, _ in changes] + [8])
+    lines = [f"  {action} {resource.ljust(width)}  {detail}" for action, resource, detail in changes]
+
+    counts = {action: sum(1 for a, _, _ in changes if a == action) for action in (CREATE, UPDATE, DELETE)}
+    lines.append(
+        f"Plan: {counts[CREATE]} to create, {counts[UPDATE]} to update, {counts[DELETE]} to delete."
+    )
+
+    return "\n".join(lines)
+
+
+def plan(destroy: bool = False, max_parallel: int = PLAN_MAX_PARALLEL, region: str = AWS_REGION,
+         workers: int = EC2_WORKER_COUNT) -> list:
+    start = time.perf_counter()
+    stack = stack_for_region(region, workers)
+
+    current = snapshot(stack, max_parallel)
+    changes = diff_destroy(current, stack) if destroy else diff_apply(current, stack)
+
+    logger.info(
+        "Plan (%s) | %s | %.2fs\n%s",
+        'destroy' if destroy else 'apply', region, time.perf_counter() - start, format_plan(changes)
+    )
+    return [c for c in changes if c[0] != NOOP]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show what Aegis apply/destroy would change, without changing anything")
+    parser.add_argument("--destroy", action="store_true", help="Plan a cleanup instead of an apply")
+    parser.add_argument("--region", default=AWS_REGION, help=f"Region to inspect (default: {AWS_REGION})")
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=PLAN_MAX_PARALLEL,
+        help=f"Maximum number of concurrent read-only calls (default: {PLAN_MAX_PARALLEL})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EC2_WORKER_COUNT,
+        help=f"Desired number of EC2 workers to plan for (default: {EC2_WORKER_COUNT})"
+    )
+    parser.add_argument(
+        "--detailed-exitcode",
+        action="store_true",
+        help="Exit with 2 when there are pending changes, 0 when there are none"
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default=LOG_FORMAT,
+        help=f"Console log format; json writes one JSON object per line (default: {LOG_FORMAT})"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    set_log_format(args.log_format)
+    try:
+        pending = plan(destroy=args.destroy, max_parallel=args.max_parallel, region=args.region, workers=args.workers)
+    finally:
+        write_metrics_report()
+        AWSSessionManager.get_instance().shutdown()
+    if args.detailed_exitcode and pending:
+        sys.exit(2)
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.session import AWSSessionManager
+from utils.logger import get_logger
+from config import AWS_REGION, SSM_AMI_PARAMETER, SSM_AMI_PARAMETERS, AMI_CACHE_FILE, AMI_CACHE_TTL
+
+logger = get_logger("ami_service", 'INFO')
+manager = AWSSessionManager.get_instance()
+
+# SSM get_parameters tek çağrıda en fazla 10 isim kabul eder
+SSM_GET_PARAMETERS_BATCH = 10
+
+_lock = threading.Lock()
+# (region, parameter) -> {"ami_id": ..., "fetched_at": ...}; ilk erişimde diskten yüklenir
+_cache = None
+
+
+def _key(region: str, parameter: str) -> str:
+    return f"{region}|{parameter}"
+
+
+def _load() -> dict:
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if os.path.exists(AMI_CACHE_FILE):
+            try:
+                with open(AMI_CACHE_FILE) as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("AMI cache unreadable, ignoring | %s | %s", AMI_CACHE_FILE, e)
+    return _cache
+
+
+def _save():
+    directory = os.path.dirname(AMI_CACHE_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp = f"{AMI_CACHE_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, AMI_CACHE_FILE)
+
+
+def _fetch_region(region: str, parameters: list) -> dict:
+    """Bir region'daki parametreleri 10'arlı get_parameters batch'leriyle çeker."""
+    ssm = manager.get_client('ssm', region=region)
+    values = {}
+
+    for i in range(0, len(parameters), SSM_GET_PARAMETERS_BATCH):
+        batch = parameters[i:i + SSM_GET_PARAMETERS_BATCH]
+        response = ssm.get_parameters(Names=batch, WithDecryption=False)
+
+        for param in response["Parameters"]:
+            values[param["Name"]] = param["Value"]
+
+        if response.get("InvalidParameters"):
+            raise Exception(f"Unknown AMI parameters | {region} | {response['InvalidParameters']}")
+
+    logger.info("AMI resolved | %s | %s parameter(s)", region, len(values))
+    return values
+
+
+def resolve_amis(regions, parameters=None, ttl: float = AMI_CACHE_TTL) -> dict:
+    """
+    {(region, parameter): ami_id}. TTL'i dolmamış kayıtlar process içi/disk
+    cache'ten gelir; eksikler her region için tek get_parameters batch'iyle,
+    region'lar paralel olarak çekilir.
+    """
+    parameters = list(dict.fromkeys(parameters or SSM_AMI_PARAMETERS.values()))
+    regions = list(dict.fromkeys(regions))
+    now = time.time()
+
+    # Kilit sadece cache okuma/yazmayı korur; SSM çağrıları kilit dışında, region'lar paralel
+    with _lock:
+        cache = _load()
+        resolved, missing = {}, {}
+
+        for region in regions:
+            for parameter in parameters:
+                entry = cache.get(_key(region, parameter))
+                if entry and now - entry["fetched_at"] < ttl:
+                    resolved[(region, parameter)] = entry["ami_id"]
+                else:
+                    missing.setdefault(region, []).append(parameter)
+
+    if not missing:
+        return resolved
+
+    with ThreadPoolExecutor(max_workers=len(missing), thread_name_prefix="ami") as pool:
+        fetched = dict(zip(missing, pool.map(lambda r: _fetch_region(r, missing[r]), missing)))
+
+    with _lock:
+        for region, values in fetched.items():
+            for parameter, ami_id in values.items():
+                cache[_key(region, parameter)] = {"ami_id": ami_id, "fetched_at": now}
+                resolved[(region, parameter)] = ami_id
+
+        _save()
+
+    return resolved
+
+
+def resolve_ami(parameter: str = SSM_AMI_PARAMETER, region: str = AWS_REGION, ttl: float = AMI_CACHE_TTL) -> str:
+    return resolve_amis([region], [parameter], ttl)[(region, parameter)]
+
+
+def prewarm_ami_cache(regions, parameters=None, ttl: float = AMI_CACHE_TTL) -> dict:
+    """Launch'tan önce bütün region/mimari kombinasyonlarını tek seferde cache'e alır."""
+    return resolve_amis(regions, parameters, ttl)
@@ -0,0 +1,108 @@
+import time
+from botocore.exceptions import ClientError
+from utils.logger import get_logger
+from utils.session import AWSSessionManager
+from utils.waiters import wait_for_ec2_ready, wait_for_ec2_stopped, wait_for_image_available
+from services.ami_service import resolve_ami
+from services.ec2_service import (
+    _run_instances, _tag_specifications, BAKE_USER_DATA_SCRIPT, SETUP_FINGERPRINT, INSTANCE_TAG_NAME
+)
+from config import AWS_REGION, EC2_INSTANCE_TYPE, EC2_WORKER_AMI_TAG_KEY, SSM_AMI_PARAMETER
+
+logger = get_logger("bake_service", 'INFO')
+manager = AWSSessionManager.get_instance()
+
+
+def bake_worker_ami(profile_name: str, region: str = AWS_REGION, parameter: str = SSM_AMI_PARAMETER,
+                    tags: dict = None) -> str:
+    """
+    Stok AMI'den bir builder instance açar, worker kurulumunu (SETUP_COMMANDS)
+    bitirip ready tag'ini yazmasını bekler, durdurur ve AMI'sini alır.
+    AMI ve snapshot'ları EC2_WORKER_AMI_TAG_KEY=SETUP_FINGERPRINT ile tag'lenir;
+    apply (get_worker_ami) bu tag'le bulur. Builder her durumda terminate edilir.
+    Instance profile'ın var olması gerekir (ready tag'i için).
+    """
+    ec2 = manager.get_client('ec2', region=region)
+    base = resolve_ami(parameter, region=region)
+    image_tags = {EC2_WORKER_AMI_TAG_KEY: SETUP_FINGERPRINT, **(tags or {})}
+
+    response = _run_instances(
+        ec2,
+        ImageId=base,
+        InstanceType=EC2_INSTANCE_TYPE,
+        MinCount=1,
+        MaxCount=1,
+        UserData=BAKE_USER_DATA_SCRIPT,
+        IamInstanceProfile={"Name": profile_name},
+        TagSpecifications=_tag_specifications("instance", {"Name": f"{INSTANCE_TAG_NAME}-bake", **(tags or {})})
+    )
+    builder = response["Instances"][0]["InstanceId"]
+    logger.info("Bake | Builder launched | %s | %s | base=%s", region, builder, base)
+
+    try:
+        wait_for_ec2_ready(builder, region=region)
+
+        # Tutarlı bir dosya sistemi için durdurulmuş instance'ın imajı alınır
+        ec2.stop_instances(InstanceIds=[builder])
+        wait_for_ec2_stopped([builder], region=region)
+
+        image_id = ec2.create_image(
+            InstanceId=builder,
+            Name=f"aegis-worker-{SETUP_FINGERPRINT}-{int(time.time())}",
+            Description=f"Aegis worker ({base} + setup {SETUP_FINGERPRINT})",
+            TagSpecifications=_tag_specifications("image", image_tags) + _tag_specifications("snapshot", image_tags)
+        )["ImageId"]
+        wait_for_image_available(image_id, region=region)
+    finally:
+        ec2.terminate_instances(InstanceIds=[builder])
+
+    logger.info("Bake | Worker AMI ready | %s | %s", region, image_id)
+    return image_id
+
+
+def list_worker_amis(region: str = AWS_REGION) -> list:
+    """Bake edilmiş bütün worker AMI'leri, en yenisi önce: [{image_id, setup, created, snapshots}]."""
+    ec2 = manager.get_client('ec2', region=region)
+
+    images = ec2.describe_images(
+        Owners=["self"],
+        Filters=[{"Name": "tag-key", "Values": [EC2_WORKER_AMI_TAG_KEY]}]
+    )["Images"]
+
+    amis = []
+    for image in sorted(images, key=lambda i: i["CreationDate"], reverse=True):
+        tags = {tag["Key"]: tag["Value"] for tag in image.get("Tags", [])}
+        amis.append({
+            "image_id": image["ImageId"],
+            "setup": tags.get(EC2_WORKER_AMI_TAG_KEY),
+            "created": image["CreationDate"],
+            "snapshots": [
+                m["Ebs"]["SnapshotId"] for m in image.get("BlockDeviceMappings", []) if "SnapshotId" in m.get("Ebs", {})
+            ]
+        })
+    return amis
+
+
+def prune_worker_amis(region: str = AWS_REGION, keep: int = 1) -> bool:
+    """
+    Güncel kurulum script'iyle bake edilmiş en yeni keep AMI dışındakileri
+    (eski script'lerinkiler dahil) deregister eder ve snapshot'larını siler.
+    """
+    ec2 = manager.get_client('ec2', region=region)
+    amis = list_worker_amis(region=region)
+    current = [ami for ami in amis if ami["setup"] == SETUP_FINGERPRINT][:keep]
+    ok = True
+
+    for ami in amis:
+        if ami in current:
+            continue
+        try:
+            ec2.deregister_image(ImageId=ami["image_id"])
+            for snapshot_id in ami["snapshots"]:
+                ec2.delete_snapshot(SnapshotId=snapshot_id)
+            logger.info("Bake | Worker AMI deregistered | %s | %s", region, ami['image_id'])
+        except ClientError as e:
+            logger.error("Bake | Deregister failed | %s | %s", ami['image_id'], e.response['Error']['Code'])
+            ok = False
+
+    return ok
@@ -1,17 +1,16 @@
 from utils.logger import get_logger
 from utils.session import AWSSessionManager
 from botocore.exceptions import ClientError
-from config import DYNAMODB_BILLING_MODE
+from config import AWS_REGION, DYNAMODB_BILLING_MODE
 from utils.waiters import wait_for_dynamodb_active
 
 logger = get_logger("dynamodb_service" , 'INFO')
 manager = AWSSessionManager.get_instance()
-region='us-east-1'
-def create_audit_table(table_name):
+def create_audit_table(table_name, region: str = AWS_REGION, tags: dict = None):
     dynamodb = manager.get_client('dynamodb', region=region)
 
     try:
-        logger.info(f"DynamoDB Table Creating | {table_name}")
+        logger.info("DynamoDB Table Creating | %s", table_name)
 
         dynamodb.create_table(
             TableName=table_name,
@@ -38,31 +37,99 @@ def create_audit_table(table_name):
                     "Key": "environment",
                     "Value": "test"
                 }
-            ],
+            ] + [{"Key": key, "Value": value} for key, value in (tags or {}).items()],
         )
 
-        wait_for_dynamodb_active(table_name)
+        wait_for_dynamodb_active(table_name, region=region)
 
-        logger.info(f"DynamoDB Table ACTIVE | {table_name}")
+        logger.info("DynamoDB Table ACTIVE | %s", table_name)
         return True
 
     except ClientError as e:
         if e.response["Error"]["Code"] == 'ResourceInUseException':
-            logger.warning(f"DynamoDB table already exists | {table_name}")
-            return True
+            logger.warning("DynamoDB table already exists | %s", table_name)
+            # Stack tag'lerinden önce oluşturulmuş tablo; TagResource idempotent
+            return _tag_existing_table(dynamodb, table_name, tags)
         else:
-            logger.error(f'ERROR : {e}')
+            logger.error("ERROR : %s", e)
             return False
         
 
-def delete_dynamodb_table(table_name):
+def _tag_existing_table(dynamodb, table_name, tags: dict) -> bool:
+    if not tags:
+        return True
+
+    try:
+        arn = dynamodb.describe_table(TableName=table_name)["Table"]["TableArn"]
+        dynamodb.tag_resource(ResourceArn=arn, Tags=[{"Key": key, "Value": value} for key, value in tags.items()])
+        return True
+    except ClientError as e:
+        logger.error("DynamoDB TagResource Failed | %s | %s", table_name, e.response["Error"]["Code"])
+        return False
+
+
+def describe_audit_table(table_name, region: str = AWS_REGION):
+    """Read-only: tablo durumu ve billing mode, yoksa None."""
+    dynamodb = manager.get_client('dynamodb', region=region)
+
+    try:
+        table = dynamodb.describe_table(TableName=table_name)["Table"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ResourceNotFoundException":
+            return None
+        raise
+
+    return {
+        "status": table["TableStatus"],
+        "billing_mode": table.get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED"),
+        "arn": table["TableArn"]
+    }
+
+
+def table_is_active(table_name, region: str = AWS_REGION) -> bool:
+    dynamodb = manager.get_client('dynamodb', region=region)
+
+    try:
+        return dynamodb.describe_table(TableName=table_name)["Table"]["TableStatus"] == "ACTIVE"
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ResourceNotFoundException":
+            return False
+        raise
+
+
+def delete_dynamodb_table(table_name, region: str = AWS_REGION):
+    """
+    Tablo DeletionProtectionEnabled=True ile oluşturulur. Önce doğrudan
+    silinir; koruma açık olduğu için reddedilirse koruma kapatılır, tablonun
+    tekrar ACTIVE olması beklenir ve silme tekrar denenir. Korumasız tabloda
+    tek çağrı yeterli. Tablo zaten yoksa başarılı sayılır.
+    """
     dynamodb = manager.get_client('dynamodb',region=region)
 
     try:
-        dynamodb.delete_table(TableName=table_name)
-        logger.info(f"DynamoDB table deleted: {table_name}")
+        try:
+            dynamodb.delete_table(TableName=table_name)
+        except ClientError as e:
+            if not _deletion_protected(e):
+                raise
+            logger.info("DynamoDB deletion protection disabling | %s", table_name)
+            dynamodb.update_table(TableName=table_name, DeletionProtectionEnabled=False)
+            wait_for_dynamodb_active(table_name, region=region)
+            dynamodb.delete_table(TableName=table_name)
+
+        logger.info("DynamoDB table deleted: %s", table_name)
+        return True
     except ClientError as e:
         error = e.response["Error"]["Code"]
+        if error == "ResourceNotFoundException":
+            logger.info("DynamoDB table not found: %s", table_name)
+            return True
         messages = e.response["Error"]["Message"]
-        logger.error(f'AWS ERROR: {error} | {messages}')
+        logger.error("AWS ERROR: %s | %s", error, messages)
+        return False
+
 
+def _deletion_protected(e: ClientError) -> bool:
+    # DynamoDB korumayı ayrı bir kodla değil, ValidationException mesajıyla bildirir
+    error = e.response["Error"]
+    return error["Code"] == "ValidationException" and "protected against deletion" in error.get("Message", "")
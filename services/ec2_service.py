@@ -1,152 +1,529 @@
 from botocore.exceptions import ClientError
 from utils.session import AWSSessionManager
 from utils.logger import get_logger
+import hashlib
 import os
-from utils.waiters import wait_for_ec2_running , wait_for_ec2_terminated
+import time
+from config import (
+    AWS_REGION, EC2_INSTANCE_TAG_NAME, EC2_INSTANCE_TYPE, EC2_TERMINATE_CHUNK_SIZE, SSM_AMI_PARAMETER,
+    IAM_PROPAGATION_TIMEOUT, EC2_READY_TAG_KEY, EC2_USE_BAKED_AMI, EC2_WORKER_AMI_TAG_KEY
+)
+from services.ami_service import resolve_ami
+from utils.metrics import metrics
+from utils.waiters import (
+    wait_for_ec2_ready, wait_for_ec2_stopped, wait_for_ec2_terminated, describe_ec2_instances, backoff_delays,
+    EC2_FILTER_BATCH
+)
+
+
+logger = get_logger("ec2_service", 'INFO', rate_limit=True)
+manager = AWSSessionManager.get_instance()
+INSTANCE_TAG_NAME = EC2_INSTANCE_TAG_NAME
+LIVE_STATES = ["pending", "running", "stopping", "stopped"]
+# Terminate sırasında beklenmesi gereken (henüz "terminated" olmayan) durumlar
+TEARDOWN_STATES = LIVE_STATES + ["shutting-down"]
+
+# Worker bağımlılıkları; bake.py bunları AMI'ye önceden kurar. Değişirse fingerprint'i de
+# değişir ve eski baked AMI'ler artık seçilmez.
+SETUP_COMMANDS = """dnf update -y
+dnf install python3-pip -y
+pip3 install boto3
+"""
+SETUP_FINGERPRINT = hashlib.sha256(SETUP_COMMANDS.encode()).hexdigest()[:16]
 
+BAKED_MARKER = "/etc/aegis/baked"
 
-logger = get_logger("ec2_service", 'INFO')
-manager = AWSSessionManager.get_instance()
-INSTANCE_TAG_NAME = "Aegis-Worker"
-region = 'us-east-1'
+# Kurulum bittiğinde instance kendini tag'ler (IMDSv2); cloud-init bunu her boot'ta tekrar
+# çalıştırır, böylece warm pool'dan başlatılan instance da hazır olduğunu bildirir.
+READY_SCRIPT = f"""#!/bin/bash
+TOKEN=$(curl -sX PUT http://169.254.169.254/latest/api/token -H "X-aws-ec2-metadata-token-ttl-seconds: 300")
+IID=$(curl -sH "X-aws-ec2-metadata-token: $TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+REGION=$(curl -sH "X-aws-ec2-metadata-token: $TOKEN" http://169.254.169.254/latest/meta-data/placement/region)
+aws ec2 create-tags --region "$REGION" --resources "$IID" --tags "Key={EC2_READY_TAG_KEY},Value=$(date +%s)"
+"""
+
+USER_DATA_SCRIPT = f"""#!/bin/bash
+set -e
+if [ ! -f {BAKED_MARKER} ]; then
+{SETUP_COMMANDS}fi
+echo "Aegis Setup Complete" > /home/ec2-user/setup_log.txt
+cat > /var/lib/cloud/scripts/per-boot/aegis-ready.sh <<'EOF'
+{READY_SCRIPT}EOF
+chmod +x /var/lib/cloud/scripts/per-boot/aegis-ready.sh
+/var/lib/cloud/scripts/per-boot/aegis-ready.sh
+"""
+
+# bake.py'nin builder instance'ı: kurulum + AMI'de kalacak işaret dosyası
+BAKE_USER_DATA_SCRIPT = USER_DATA_SCRIPT.replace(
+    'echo "Aegis Setup Complete"', f'mkdir -p /etc/aegis && echo {SETUP_FINGERPRINT} > {BAKED_MARKER}\necho "Aegis Setup Complete"'
+)
 
-def find_existing_instance():
+
+def iter_tagged_instances(states=LIVE_STATES, region: str = AWS_REGION, tag_name: str = INSTANCE_TAG_NAME):
+    """Tagli instance'ları describe_instances paginator'ı ile sayfa sayfa stream eder."""
     ec2 = manager.get_client('ec2' ,region=region)
+    paginator = ec2.get_paginator("describe_instances")
 
-    response = ec2.describe_instances(
-        Filters=[
-            {"Name": "tag:Name", "Values": [INSTANCE_TAG_NAME]},
-            {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]}
-        ]
+    filters = [{"Name": "tag:Name", "Values": [tag_name]}]
+    if states:
+        filters.append({"Name": "instance-state-name", "Values": list(states)})
+
+    for page in paginator.paginate(Filters=filters):
+        for res in page["Reservations"]:
+            for ins in res["Instances"]:
+                yield ins
+
+
+def find_existing_instances(region: str = AWS_REGION, tag_name: str = INSTANCE_TAG_NAME) -> list:
+    return list(iter_tagged_instances(region=region, tag_name=tag_name))
+
+
+def find_existing_instance(region: str = AWS_REGION):
+    return next(iter_tagged_instances(region=region), None)
+
+
+def describe_security_group(group_name: str, region: str = AWS_REGION):
+    """Read-only: SG id'si ve SSH'a izin verilen CIDR'lar, yoksa None."""
+    ec2 = manager.get_client('ec2' ,region=region)
+
+    groups = ec2.describe_security_groups(
+        Filters=[{"Name": "group-name", "Values": [group_name]}]
+    )["SecurityGroups"]
+
+    if not groups:
+        return None
+
+    return {"group_id": groups[0]["GroupId"], "ssh_cidrs": _ssh_cidrs(groups[0])}
+
+
+def _ssh_cidrs(group: dict) -> list:
+    return [
+        ip_range["CidrIp"]
+        for perm in group["IpPermissions"]
+        if perm.get("FromPort") == 22
+        for ip_range in perm.get("IpRanges", [])
+    ]
+
+
+def describe_security_groups_by_id(group_ids: list, region: str = AWS_REGION) -> dict:
+    """Read-only: {group_id: {"name", "ssh_cidrs"}}; olmayan id'ler sonuçta yer almaz (hata vermez)."""
+    ec2 = manager.get_client('ec2' ,region=region)
+    paginator = ec2.get_paginator("describe_security_groups")
+    groups = {}
+
+    for i in range(0, len(group_ids), EC2_FILTER_BATCH):
+        # GroupIds yerine filtre: silinmiş bir id bütün çağrıyı InvalidGroup.NotFound ile düşürmez
+        pages = paginator.paginate(Filters=[{"Name": "group-id", "Values": group_ids[i:i + EC2_FILTER_BATCH]}])
+        for page in pages:
+            for group in page["SecurityGroups"]:
+                groups[group["GroupId"]] = {"name": group["GroupName"], "ssh_cidrs": _ssh_cidrs(group)}
+
+    return groups
+
+
+def list_tagged_instances(region: str = AWS_REGION, tag_name: str = INSTANCE_TAG_NAME) -> list:
+    """Read-only: terminate edilmemiş tagli instance'lar (id, state)."""
+    return [
+        {"instance_id": ins["InstanceId"], "state": ins["State"]["Name"]}
+        for ins in iter_tagged_instances(region=region, tag_name=tag_name)
+    ]
+
+
+def key_pair_exists(key_name: str, region: str = AWS_REGION) -> bool:
+    return describe_key_pair(key_name, region=region) is not None
+
+
+def describe_key_pair(key_name: str, region: str = AWS_REGION):
+    """Read-only: key pair id'si, yoksa None."""
+    ec2 = manager.get_client('ec2' ,region=region)
+
+    pairs = ec2.describe_key_pairs(Filters=[{"Name": "key-name", "Values": [key_name]}])["KeyPairs"]
+    return {"key_pair_id": pairs[0]["KeyPairId"]} if pairs else None
+
+
+def security_group_exists(sg_id: str, region: str = AWS_REGION) -> bool:
+    ec2 = manager.get_client('ec2' ,region=region)
+
+    groups = ec2.describe_security_groups(Filters=[{"Name": "group-id", "Values": [sg_id]}])["SecurityGroups"]
+    return bool(groups)
+
+
+def running_worker_ips(region: str = AWS_REGION, tag_name: str = INSTANCE_TAG_NAME) -> list:
+    """Çalışan tagli instance'ların public IP'leri (instance id sırasıyla)."""
+    running = sorted(
+        iter_tagged_instances(states=["running"], region=region, tag_name=tag_name), key=lambda i: i["InstanceId"]
     )
+    return [ins.get("PublicIpAddress") for ins in running]
+
 
-    for res in response["Reservations"]:
-        for ins in res["Instances"]:
-            return ins
+def _tag_specifications(resource_type: str, tags: dict) -> list:
+    if not tags:
+        return []
+    return [{"ResourceType": resource_type, "Tags": [{"Key": key, "Value": value} for key, value in tags.items()]}]
 
-    return None
 
+def _missing_tags(current: list, tags: dict) -> dict:
+    """tags'ten kaynağın henüz taşımadığı (ya da farklı değerle taşıdığı) key'ler."""
+    have = {tag["Key"]: tag["Value"] for tag in current or []}
+    return {key: value for key, value in (tags or {}).items() if have.get(key) != value}
 
-def create_key_pair(key_name: str) -> str:
+
+def _tag_existing(ec2, resource_ids: list, current: list, tags: dict):
+    """
+    Zaten var olan kaynağa eksik stack tag'lerini ekler (create sırasında
+    tag'lenmemiş eski kaynaklar drift discovery'de görünsün diye).
+    """
+    missing = _missing_tags(current, tags)
+    if missing and resource_ids:
+        ec2.create_tags(Resources=resource_ids, Tags=[{"Key": key, "Value": value} for key, value in missing.items()])
+        logger.info("Stack tags added to existing resource | %s", resource_ids)
+
+
+def create_key_pair(key_name: str, region: str = AWS_REGION, tags: dict = None) -> str:
     ec2 = manager.get_client('ec2' ,region=region)
 
+    # Key pair'ler regional; aynı isim farklı region'larda farklı key material taşır
+    pem_path = f"{key_name}.pem" if region == AWS_REGION else f"{key_name}-{region}.pem"
+
     try:
-        response = ec2.create_key_pair(KeyName=key_name)
+        response = ec2.create_key_pair(KeyName=key_name, TagSpecifications=_tag_specifications("key-pair", tags))
 
-        with open(f"{key_name}.pem", "w") as f:
+        with open(pem_path, "w") as f:
             f.write(response["KeyMaterial"])
 
-        os.chmod(f"{key_name}.pem", 0o400)
+        os.chmod(pem_path, 0o400)
 
-        logger.info(f"KeyPair created: {key_name}")
+        logger.info("KeyPair created: %s", key_name)
         return key_name
 
     except ClientError as e:
         if e.response["Error"]["Code"] == "InvalidKeyPair.Duplicate":
-            logger.warning(f"KeyPair already exists: {key_name}")
+            logger.warning("KeyPair already exists: %s", key_name)
+            if tags:
+                pairs = ec2.describe_key_pairs(Filters=[{"Name": "key-name", "Values": [key_name]}])["KeyPairs"]
+                for pair in pairs:
+                    _tag_existing(ec2, [pair["KeyPairId"]], pair.get("Tags"), tags)
             return key_name
         raise
 
 
-def get_latest_ami() -> str:
-    ssm = manager.get_client('ssm' ,region=region)
-    return ssm.get_parameter(
-        Name="/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-x86_64",
-        WithDecryption=False
-    )["Parameter"]["Value"]
+def get_latest_ami(region: str = AWS_REGION, parameter: str = SSM_AMI_PARAMETER) -> str:
+    """SSM'deki "latest" AMI; TTL cache'li (bkz. services/ami_service.py)."""
+    return resolve_ami(parameter, region=region)
 
 
-def launch_instance(ami_id, key_name, sg_id, profile_name) -> str:
-    ec2 = manager.get_client('ec2' ,region=region)
+def find_worker_ami(region: str = AWS_REGION, setup: str = SETUP_FINGERPRINT):
+    """Bu kurulum script'iyle bake edilmiş en yeni kullanılabilir AMI, yoksa None."""
+    ec2 = manager.get_client('ec2', region=region)
 
-    existing = find_existing_instance()
+    images = ec2.describe_images(
+        Owners=["self"],
+        Filters=[
+            {"Name": f"tag:{EC2_WORKER_AMI_TAG_KEY}", "Values": [setup]},
+            {"Name": "state", "Values": ["available"]}
+        ]
+    )["Images"]
+    if not images:
+        return None
 
-    if existing:
-        instance_id = existing["InstanceId"]
-        state = existing["State"]["Name"]
+    return max(images, key=lambda image: image["CreationDate"])["ImageId"]
 
-        logger.info(f"Existing instance found | {instance_id} | state={state}")
 
-        if state == "stopped":
-            ec2.start_instances(InstanceIds=[instance_id])
-            waiter = ec2.get_waiter("instance_running")
-            waiter.wait(InstanceIds=[instance_id])
+def get_worker_ami(region: str = AWS_REGION, parameter: str = SSM_AMI_PARAMETER, use_baked: bool = EC2_USE_BAKED_AMI) -> str:
+    """Baked worker AMI varsa o (kurulum dakikaları atlanır), yoksa stok "latest" AMI."""
+    if use_baked:
+        ami_id = find_worker_ami(region=region)
+        if ami_id:
+            logger.info("Using baked worker AMI | %s | %s", region, ami_id)
+            return ami_id
+        logger.info("No baked worker AMI, workers will install dependencies at boot | %s", region)
 
-        desc = ec2.describe_instances(InstanceIds=[instance_id])
-        public_ip = desc["Reservations"][0]["Instances"][0].get("PublicIpAddress")
+    return get_latest_ami(region=region, parameter=parameter)
 
-        logger.info(f"Reused EC2 instance | Public IP = {public_ip}")
-        return public_ip
 
-    user_data_script = """#!/bin/bash
-dnf update -y
-dnf install python3-pip -y
-pip3 install boto3
-echo "Aegis Setup Complete" > /home/ec2-user/setup_log.txt
-"""
+def ensure_security_group(group_name: str, ssh_cidr: str, region: str = AWS_REGION, tags: dict = None) -> str:
+    ec2 = manager.get_client('ec2' ,region=region)
 
-    logger.info("Creating new EC2 instance...")
-
-    response = ec2.run_instances(
-        ImageId=ami_id,
-        InstanceType="t2.micro",
-        KeyName=key_name,
-        SecurityGroupIds=[sg_id],
-        MinCount=1,
-        MaxCount=1,
-        UserData=user_data_script,
-        IamInstanceProfile={"Name": profile_name},
-        TagSpecifications=[
+    groups = ec2.describe_security_groups(
+        Filters=[{"Name": "group-name", "Values": [group_name]}]
+    )["SecurityGroups"]
+
+    if groups:
+        sg_id = groups[0]["GroupId"]
+        logger.warning("Security Group already exists | %s | %s", group_name, sg_id)
+        _tag_existing(ec2, [sg_id], groups[0].get("Tags"), tags)
+        return sg_id
+
+    sg_id = ec2.create_security_group(
+        GroupName=group_name,
+        Description="Aegis worker security group",
+        TagSpecifications=_tag_specifications("security-group", tags)
+    )["GroupId"]
+
+    ec2.authorize_security_group_ingress(
+        GroupId=sg_id,
+        IpPermissions=[
             {
-                "ResourceType": "instance",
-                "Tags": [
-                    {"Key": "Name", "Value": INSTANCE_TAG_NAME}
-                ]
+                "IpProtocol": "tcp",
+                "FromPort": 22,
+                "ToPort": 22,
+                "IpRanges": [{"CidrIp": ssh_cidr, "Description": "SSH"}]
             }
         ]
     )
 
-    instance_id = response["Instances"][0]["InstanceId"]
+    logger.info("Security Group created | %s | %s", group_name, sg_id)
+    return sg_id
 
-    wait_for_ec2_running(instance_id)
 
-    desc = ec2.describe_instances(InstanceIds=[instance_id])
-    public_ip = desc["Reservations"][0]["Instances"][0].get("PublicIpAddress")
+def _select_workers(existing: list, count: int):
+    """Çalışanları önce, sonra durdurulmuşları tutar; fazlası terminate edilecek listeye girer."""
+    priority = {"running": 0, "pending": 1, "stopping": 2, "stopped": 3}
+    ordered = sorted(existing, key=lambda i: (priority[i["State"]["Name"]], i["InstanceId"]))
+    return ordered[:count], ordered[count:]
 
-    logger.info(f"New EC2 instance ready | {instance_id} | Public IP = {public_ip}")
-    return public_ip
 
+def _select_pool(surplus: list, size: int):
+    """
+    Warm pool'a sadece durdurulmuş ya da kurulumu bitmiş (ready) instance'lar
+    alınır, önce zaten durdurulmuş olanlar; (pool, terminate edilecekler).
+    """
+    priority = {"stopped": 0, "stopping": 1, "running": 2, "pending": 3}
+    candidates = [i for i in surplus if i["State"]["Name"] in ("stopped", "stopping") or _is_ready(i)]
+    pool = sorted(candidates, key=lambda i: (priority[i["State"]["Name"]], i["InstanceId"]))[:size]
+    return pool, [i for i in surplus if i not in pool]
 
 
-def delete_ec2_resources(key_name, group_name):
-    ec2 = manager.get_client('ec2' ,region=region)
+def _is_ready(instance: dict) -> bool:
+    return any(tag["Key"] == EC2_READY_TAG_KEY for tag in instance.get("Tags", []))
+
 
-    instances = ec2.describe_instances(
-        Filters=[{"Name": "tag:Name", "Values": [INSTANCE_TAG_NAME]}]
+def _profile_not_propagated(e: ClientError) -> bool:
+    """Yeni instance profile EC2 tarafında henüz görünmüyor (IAM eventual consistency)."""
+    error = e.response["Error"]
+    message = error.get("Message", "")
+    return error["Code"] == "InvalidParameterValue" and (
+        "iamInstanceProfile" in message or "IAM Instance Profile" in message
     )
 
-    ids = []
-    for r in instances["Reservations"]:
-        for i in r["Instances"]:
-            ids.append(i["InstanceId"])
 
-    if ids:
-        logger.info(f"Terminating instances: {ids}")
-        ec2.terminate_instances(InstanceIds=ids)
-        wait_for_ec2_terminated(instance_ids=ids)
+def _run_instances(ec2, timeout: float = IAM_PROPAGATION_TIMEOUT, **params) -> dict:
+    """
+    run_instances; instance profile EC2'ye henüz yayılmadıysa backoff ile
+    tekrar dener (hata durumunda instance oluşmaz, tekrar güvenlidir).
+    Başarılı denemeye kadar geçen süre "propagation" metriğine yazılır.
+    """
+    start = time.monotonic()
+    delays = backoff_delays()
+
+    while True:
+        attempt = time.monotonic()
+        try:
+            response = ec2.run_instances(**params)
+            break
+        except ClientError as e:
+            if not _profile_not_propagated(e) or attempt - start >= timeout:
+                raise
+            delay = next(delays)
+            logger.info("Instance profile not yet visible to EC2, retrying in %.1fs", delay)
+            time.sleep(delay)
+
+    metrics.observe("propagation", "ec2.instance_profile", attempt - start)
+    return response
+
+
+def launch_workers(count: int, ami_id, key_name, sg_id, profile_name, region: str = AWS_REGION,
+                   tag_name: str = INSTANCE_TAG_NAME, tags: dict = None, warm_pool: int = 0) -> list:
+    """
+    Tagli worker sayısını count'a eşitler:
+      - mevcut instance'lar yeniden kullanılır, durdurulmuş olanlar tek
+        start_instances çağrısıyla başlatılır (warm pool'dan)
+      - eksik kalan sayı tek run_instances (MinCount=MaxCount=eksik) ile açılır
+      - fazlası warm_pool kadar durdurulmuş olarak bekletilir, kalanı terminate edilir
+    Ardından hepsi tek bir batched waiter ile kurulumlarının bittiği (ready tag)
+    ana kadar beklenir; pool'a girecekler durdurulur, çalışanların public IP'leri döner.
+    """
+    ec2 = manager.get_client('ec2' ,region=region)
+
+    keep, surplus = _select_workers(find_existing_instances(region=region, tag_name=tag_name), count)
+    pool, surplus = _select_pool(surplus, warm_pool)
+    instance_ids = [ins["InstanceId"] for ins in keep]
+
+    if surplus:
+        surplus_ids = [ins["InstanceId"] for ins in surplus]
+        logger.info("Terminating surplus workers | %s", surplus_ids)
+        ec2.terminate_instances(InstanceIds=surplus_ids)
+
+    stopping = [ins["InstanceId"] for ins in keep if ins["State"]["Name"] == "stopping"]
+    if stopping:
+        wait_for_ec2_stopped(stopping, region=region)
+
+    to_start = [ins["InstanceId"] for ins in keep if ins["State"]["Name"] in ("stopping", "stopped")]
+    if to_start:
+        # Önceki boot'un ready tag'i silinir; instance bu boot'ta hazır olunca tekrar yazar
+        ec2.delete_tags(Resources=to_start, Tags=[{"Key": EC2_READY_TAG_KEY}])
+        logger.info("Starting stopped workers | %s", to_start)
+        ec2.start_instances(InstanceIds=to_start)
+
+    if keep:
+        logger.info("Reusing existing workers | %d", len(keep))
+
+    # Yeniden kullanılan instance'lardan stack tag'leri eksik olanlar tek create_tags ile tamamlanır
+    untagged = [ins["InstanceId"] for ins in keep + pool if _missing_tags(ins.get("Tags"), tags)]
+    _tag_existing(ec2, untagged, [], tags)
+
+    # Pool'da çalışır durumda kalanlar (fazlalık worker'lar ya da yarıda kalmış bir dolum) durdurulacak
+    to_stop = [ins["InstanceId"] for ins in pool if ins["State"]["Name"] in ("pending", "running")]
+    shortfall = max(0, count - len(keep))
+    pool_shortfall = max(0, warm_pool - len(pool))
+    created = []
+
+    if shortfall + pool_shortfall > 0:
+        logger.info("Creating new EC2 workers | count=%d | warm pool=%d", shortfall, pool_shortfall)
+
+        response = _run_instances(
+            ec2,
+            ImageId=ami_id,
+            InstanceType=EC2_INSTANCE_TYPE,
+            KeyName=key_name,
+            SecurityGroupIds=[sg_id],
+            MinCount=shortfall + pool_shortfall,
+            MaxCount=shortfall + pool_shortfall,
+            UserData=USER_DATA_SCRIPT,
+            IamInstanceProfile={"Name": profile_name},
+            TagSpecifications=_tag_specifications("instance", {"Name": tag_name, **(tags or {})})
+        )
+        created = sorted(ins["InstanceId"] for ins in response["Instances"])
+        instance_ids += created[:shortfall]
+        to_stop += created[shortfall:]
+
+    # Zaten çalışan worker'lar beklenmez; pool'a girecek yeni instance'lar da ilk boot kurulumunu
+    # bitirmeden durdurulmaz. Hepsi tek poll döngüsünde beklenir.
+    waiting = [ins["InstanceId"] for ins in keep if ins["State"]["Name"] != "running"] + created
+    if waiting:
+        wait_for_ec2_ready(waiting, region=region, started=to_start)
+
+    if to_stop:
+        logger.info("Stopping workers into the warm pool | %s", to_stop)
+        ec2.stop_instances(InstanceIds=to_stop)
+
+    if not instance_ids:
+        return []
+
+    described = describe_ec2_instances(instance_ids, region=region)
+    public_ips = [described[i].get("PublicIpAddress") for i in sorted(instance_ids) if i in described]
+
+    logger.info("EC2 workers ready | count=%d | Public IPs = %s", len(public_ips), public_ips)
+    return public_ips
+
+
+def launch_instance(ami_id, key_name, sg_id, profile_name, region: str = AWS_REGION) -> str:
+    existing = find_existing_instances(region=region)
+    count = max(1, len(existing))
+
+    public_ips = launch_workers(count, ami_id, key_name, sg_id, profile_name, region=region)
+    return public_ips[0] if public_ips else None
+
+
+def find_tagged_instance_ids(region: str = AWS_REGION, tag_name: str = INSTANCE_TAG_NAME) -> list:
+    return [ins["InstanceId"] for ins in iter_tagged_instances(states=TEARDOWN_STATES, region=region, tag_name=tag_name)]
+
+
+def _uses_group(instance: dict, group_name: str) -> bool:
+    return any(g.get("GroupName") == group_name for g in instance.get("SecurityGroups", []))
+
+
+def terminate_tagged_instances(region: str = AWS_REGION, security_group_name: str = None,
+                               chunk_size: int = EC2_TERMINATE_CHUNK_SIZE, tag_name: str = INSTANCE_TAG_NAME) -> list:
+    """
+    Tagli instance'ları paginator ile sayfa sayfa okur ve chunk_size'lık
+    gruplar halinde terminate eder; ilk sayfadaki instance'lar kapanırken
+    sonraki sayfalar okunmaya devam eder. Ardından bütün filo tek bir poll
+    döngüsünde beklenir.
+
+    security_group_name verilirse, o SG'yi kullanan son instance terminate
+    olduğu anda (diğerlerini beklemeden) SG silinir.
+    """
+    ec2 = manager.get_client('ec2' ,region=region)
+
+    ids, chunk, dependents = [], [], set()
+
+    def flush():
+        if chunk:
+            logger.info("Terminating instances | chunk=%d | total=%d", len(chunk), len(ids))
+            ec2.terminate_instances(InstanceIds=list(chunk))
+            chunk.clear()
+
+    for ins in iter_tagged_instances(states=TEARDOWN_STATES, region=region, tag_name=tag_name):
+        instance_id = ins["InstanceId"]
+        ids.append(instance_id)
+        if security_group_name and _uses_group(ins, security_group_name):
+            dependents.add(instance_id)
+        # shutting-down olanlar zaten terminate ediliyor; sadece bekleniyor
+        if ins["State"]["Name"] != "shutting-down":
+            chunk.append(instance_id)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    def release_group():
+        if delete_security_group(security_group_name, region=region):
+            logger.info("Security group released | %s", security_group_name)
+        else:
+            # cleanup.py'deki security_group adımı tekrar dener
+            logger.warning("Security group still in use | %s", security_group_name)
+
+    def on_terminated(instance_id, state):
+        if instance_id in dependents:
+            dependents.discard(instance_id)
+            if not dependents:
+                release_group()
+
+    if not ids:
+        logger.info("No tagged instances to terminate")
+        if security_group_name:
+            release_group()
+        return ids
+
+    if security_group_name and not dependents:
+        release_group()
+
+    wait_for_ec2_terminated(instance_ids=ids, region=region, on_ready=on_terminated)
+    return ids
+
+
+def delete_security_group(group_name, region: str = AWS_REGION) -> bool:
+    ec2 = manager.get_client('ec2' ,region=region)
 
     try:
         groups = ec2.describe_security_groups(Filters=[{"Name":"group-name","Values":[group_name]}])
         for g in groups["SecurityGroups"]:
             ec2.delete_security_group(GroupId=g["GroupId"])
-            logger.info(f"Deleted SG: {group_name}")
-    except ClientError:
-        pass
+            logger.info("Deleted SG: %s", group_name)
+        return True
+    except ClientError as e:
+        error = e.response["Error"]["Code"]
+        messages = e.response["Error"]["Message"]
+        logger.error("AWS ERROR: %s | %s", error, messages)
+        return False
+
+
+def delete_key_pair(key_name, region: str = AWS_REGION) -> bool:
+    ec2 = manager.get_client('ec2' ,region=region)
 
     try:
         ec2.delete_key_pair(KeyName=key_name)
-        logger.info(f"Deleted KeyPair: {key_name}")
+        logger.info("Deleted KeyPair: %s", key_name)
+        return True
     except ClientError as e:
         error = e.response["Error"]["Code"]
         messages = e.response["Error"]["Message"]
-        logger.error(f'AWS ERROR: {error} | {messages}')
+        logger.error("AWS ERROR: %s | %s", error, messages)
+        return False
+
+
+def delete_ec2_resources(key_name, group_name, region: str = AWS_REGION):
+    terminate_tagged_instances(region=region, security_group_name=group_name)
+    # SG erken silinemediyse (ENI'ler geç düşebilir) burada tekrar denenir; yoksa no-op
+    delete_security_group(group_name, region=region)
+    delete_key_pair(key_name, region=region)
@@ -0,0 +1,209 @@
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from utils.logger import get_logger
+from utils.session import AWSSessionManager
+from config import (
+    AWS_REGION, KMS_ALIAS_NAME,
+    DATA_KEY_CACHE_MAX_AGE, DATA_KEY_CACHE_MAX_BYTES, DATA_KEY_CACHE_MAX_MESSAGES, DATA_KEY_CACHE_CAPACITY
+)
+
+logger = get_logger("envelope_service", 'INFO')
+manager = AWSSessionManager.get_instance()
+
+# Mesaj formatı: version(1) | len(edk)(2) | encrypted data key | nonce(12) | ciphertext+tag
+# version + edk, AES-GCM'in AAD'si olarak da kullanılır.
+FORMAT_VERSION = 1
+NONCE_SIZE = 12
+
+
+def _aesgcm(key: bytearray):
+    # cryptography sadece şifreleme yapılırken gerekir (requirements.txt)
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(bytes(key))
+
+
+class _DataKey:
+    def __init__(self, plaintext: bytes, lookup: tuple):
+        self.plaintext = bytearray(plaintext)
+        # (encrypted data key, encryption context): decrypt cache anahtarı
+        self.lookup = lookup
+        self.created = time.monotonic()
+        self.messages = 0
+        self.bytes = 0
+
+    def wipe(self):
+        """Plaintext key'i bellekte sıfırlar (Python'da best-effort)."""
+        for i in range(len(self.plaintext)):
+            self.plaintext[i] = 0
+
+
+class DataKeyCache:
+    """
+    KMS data key cache'i.
+      - Şifreleme: (key_id, region, context) başına tek aktif data key; yaşı
+        max_age'i, şifrelediği byte max_bytes'ı veya mesaj sayısı
+        max_messages'ı aşınca atılır ve yenisi üretilir.
+      - Çözme: (encrypted data key, context) -> plaintext key, en fazla
+        capacity kayıt (LRU) ve max_age süresince.
+    Atılan her key'in plaintext'i sıfırlanır. KMS çağrısı kilit altında
+    yapılır; aynı anda gelen istekler tek bir data key'i paylaşır.
+    """
+
+    def __init__(self, max_age: float = DATA_KEY_CACHE_MAX_AGE, max_bytes: int = DATA_KEY_CACHE_MAX_BYTES,
+                 max_messages: int = DATA_KEY_CACHE_MAX_MESSAGES, capacity: int = DATA_KEY_CACHE_CAPACITY):
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+        self._encrypt = {}
+        self._decrypt = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: _DataKey) -> bool:
+        return time.monotonic() - entry.created >= self.max_age
+
+    def _evict(self, entry: _DataKey):
+        # Aynı key decrypt cache'inde de olabilir; orada da silinir
+        if self._decrypt.get(entry.lookup) is entry:
+            del self._decrypt[entry.lookup]
+        entry.wipe()
+
+    def for_encrypt(self, cache_key: tuple, context: tuple, size: int, generate) -> tuple:
+        """
+        size byte'lık bir mesaj için (plaintext key kopyası, encrypted key)
+        döner; gerekirse generate() -> (plaintext, encrypted) çağırır.
+        """
+        with self._lock:
+            entry = self._encrypt.get(cache_key)
+            if entry is not None and self._expired(entry):
+                del self._encrypt[cache_key]
+                self._evict(entry)
+                entry = None
+            elif entry is not None and (
+                entry.messages + 1 > self.max_messages
+                or entry.bytes + size > self.max_bytes
+            ):
+                # Şifreleme limiti doldu; key yaşı dolana kadar decrypt için cache'te kalabilir
+                del self._encrypt[cache_key]
+                if self._decrypt.get(entry.lookup) is not entry:
+                    entry.wipe()
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                plaintext, encrypted = generate()
+                entry = _DataKey(plaintext, (encrypted, context))
+                self._encrypt[cache_key] = entry
+                self._remember(entry)
+            else:
+                self.hits += 1
+
+            entry.messages += 1
+            entry.bytes += size
+            # Kilit dışında kullanılabilmesi için kopya
+            return bytearray(entry.plaintext), entry.lookup[0]
+
+    def for_decrypt(self, encrypted: bytes, context: tuple, resolve) -> bytearray:
+        lookup = (encrypted, context)
+
+        with self._lock:
+            entry = self._decrypt.get(lookup)
+            if entry is not None and self._expired(entry):
+                self._evict(entry)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                entry = _DataKey(resolve(), lookup)
+                self._remember(entry)
+            else:
+                self.hits += 1
+                self._decrypt.move_to_end(lookup)
+
+            return bytearray(entry.plaintext)
+
+    def _remember(self, entry: _DataKey):
+        self._decrypt[entry.lookup] = entry
+        while len(self._decrypt) > self.capacity:
+            _, oldest = self._decrypt.popitem(last=False)
+            # Hâlâ şifrelemede kullanılan key silinmez, sadece decrypt cache'inden çıkar
+            if not any(oldest is active for active in self._encrypt.values()):
+                oldest.wipe()
+
+    def clear(self):
+        with self._lock:
+            for entry in list(self._encrypt.values()) + list(self._decrypt.values()):
+                entry.wipe()
+            self._encrypt.clear()
+            self._decrypt.clear()
+
+
+_cache = DataKeyCache()
+
+
+def _context(encryption_context) -> tuple:
+    return tuple(sorted((encryption_context or {}).items()))
+
+
+def encrypt(plaintext: bytes, key_id: str = KMS_ALIAS_NAME, encryption_context: dict = None,
+            region: str = AWS_REGION, cache: DataKeyCache = _cache) -> bytes:
+    """
+    Envelope encryption: payload yerelde AES-256-GCM ile, data key ise KMS
+    master key ile şifrelenir. Data key cache'ten gelir; KMS'e sadece cache
+    limitleri dolduğunda gidilir.
+    """
+    def generate():
+        kms = manager.get_client('kms', region=region)
+        response = kms.generate_data_key(
+            KeyId=key_id,
+            KeySpec="AES_256",
+            EncryptionContext=encryption_context or {}
+        )
+        logger.info("KMS | Data key generated | %s", key_id)
+        return response["Plaintext"], response["CiphertextBlob"]
+
+    context = _context(encryption_context)
+    key, encrypted_key = cache.for_encrypt((key_id, region, context), context, len(plaintext), generate)
+
+    header = struct.pack(">BH", FORMAT_VERSION, len(encrypted_key)) + encrypted_key
+    nonce = os.urandom(NONCE_SIZE)
+    try:
+        ciphertext = _aesgcm(key).encrypt(nonce, plaintext, header)
+    finally:
+        key[:] = bytes(len(key))
+
+    return header + nonce + ciphertext
+
+
+def decrypt(blob: bytes, encryption_context: dict = None, region: str = AWS_REGION,
+            cache: DataKeyCache = _cache) -> bytes:
+    version, key_length = struct.unpack_from(">BH", blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported envelope version: {version}")
+
+    header_length = 3 + key_length
+    header = blob[:header_length]
+    encrypted_key = bytes(blob[3:header_length])
+    nonce = blob[header_length:header_length + NONCE_SIZE]
+
+    def resolve():
+        kms = manager.get_client('kms', region=region)
+        response = kms.decrypt(CiphertextBlob=encrypted_key, EncryptionContext=encryption_context or {})
+        logger.info("KMS | Data key decrypted")
+        return response["Plaintext"]
+
+    key = cache.for_decrypt(encrypted_key, _context(encryption_context), resolve)
+    try:
+        return _aesgcm(key).decrypt(nonce, blob[header_length + NONCE_SIZE:], header)
+    finally:
+        key[:] = bytes(len(key))
+
+
+def clear_data_key_cache():
+    _cache.clear()
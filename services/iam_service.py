@@ -1,75 +1,231 @@
-import time
 import json
 from botocore.exceptions import ClientError
 from utils.logger import get_logger
 from utils.session import AWSSessionManager
-from data.policies import EC2_TRUST_POLICY, build_permission_policy
+from utils.waiters import wait_for_instance_profile, WaiterError
+from data.policies import EC2_TRUST_POLICY, build_permission_policies, policy_hash
 
 logger = get_logger("iam_service" , 'INFO')
+# IAM global bir servis; client her zaman us-east-1 endpoint'ini kullanır
 region = 'us-east-1'
 manager = AWSSessionManager.get_instance()
-iam_client = manager.get_client('iam' , region=region)
+# IAM her managed policy için en fazla 5 versiyon tutar
+MAX_POLICY_VERSIONS = 5
 
 
-def create_role(role_name: str) -> bool:
-    iam = iam_client
+def _tag_list(tags: dict) -> list:
+    return [{"Key": key, "Value": value} for key, value in (tags or {}).items()]
+
+
+def _tag_existing(tag_call, kind: str, **params) -> bool:
+    try:
+        tag_call(**params)
+        return True
+    except ClientError as e:
+        logger.error("IAM Tagging Failed | %s | %s", kind, e.response["Error"]["Code"])
+        return False
+
+
+def create_role(role_name: str, tags: dict = None) -> bool:
+    iam = manager.get_client('iam', region=region)
 
     try:
         iam.create_role(
             RoleName=role_name,
-            AssumeRolePolicyDocument=json.dumps(EC2_TRUST_POLICY)
+            AssumeRolePolicyDocument=json.dumps(EC2_TRUST_POLICY),
+            Tags=_tag_list(tags)
         )
 
-        logger.info(f"IAM Role Created | {role_name}")
-        time.sleep(2)
+        logger.info("IAM Role Created | %s", role_name)
         return True
 
     except ClientError as e:
         if e.response["Error"]["Code"] == "EntityAlreadyExists":
-            logger.warning(f"IAM Role Already Exists | {role_name}")
-            return True
+            logger.warning("IAM Role Already Exists | %s", role_name)
+            # Stack tag'lerinden önce oluşturulmuş role; TagRole idempotent
+            return _tag_existing(iam.tag_role, "role", RoleName=role_name, Tags=_tag_list(tags)) if tags else True
 
-        logger.error(f"IAM CreateRole Failed | {e}")
+        logger.error("IAM CreateRole Failed | %s", e)
         return False
 
 
 def put_inline_policy(role_name: str, policy_name: str, policy_doc: dict) -> bool:
-    iam = iam_client
+    """Mevcut doküman normalize edilmiş haliyle aynıysa yazmaz (IAM write + propagation yok)."""
+    iam = manager.get_client('iam', region=region)
 
     try:
+        current = get_inline_policy(role_name, policy_name)
+        if current is not None and policy_hash(current) == policy_hash(policy_doc):
+            logger.info("Inline Policy Unchanged | %s", policy_name)
+            return True
+
         iam.put_role_policy(
             RoleName=role_name,
             PolicyName=policy_name,
             PolicyDocument=json.dumps(policy_doc)
         )
 
-        logger.info(f"Inline Policy Attached | {policy_name}")
+        logger.info("Inline Policy Attached | %s", policy_name)
         return True
 
     except ClientError as e:
-        logger.error(f"PutRolePolicy Creation Failed | {e}")
+        logger.error("PutRolePolicy Creation Failed | %s", e)
+        return False
+
+
+def _managed_policy_prefix(role_name: str, policy_name: str) -> str:
+    # Managed policy'ler hesap genelinde; multi-region role'leri çakışmasın diye role adıyla ayrılır
+    return f"{role_name}-{policy_name}-"
+
+
+def _decode(document):
+    # boto3 dokümanı URL-decode edip dict olarak döner; string gelirse parse et
+    return json.loads(document) if isinstance(document, str) else document
+
+
+def attached_managed_policies(role_name: str) -> dict:
+    """Role'e bağlı managed policy'ler: {PolicyName: PolicyArn}."""
+    iam = manager.get_client('iam', region=region)
+    attached = {}
+
+    try:
+        for page in iam.get_paginator("list_attached_role_policies").paginate(RoleName=role_name):
+            for policy in page["AttachedPolicies"]:
+                attached[policy["PolicyName"]] = policy["PolicyArn"]
+    except ClientError as e:
+        # Yeni oluşturulan role okumalara henüz yansımamış olabilir; bağlı bir şey de yoktur
+        if not _missing(e):
+            raise
+
+    return attached
+
+
+def managed_permission_documents(role_name: str, policy_name: str) -> list:
+    """Read-only: role'e bağlı, bu policy için paketlenmiş managed policy'lerin default dokümanları."""
+    iam = manager.get_client('iam', region=region)
+    prefix = _managed_policy_prefix(role_name, policy_name)
+    documents = []
+
+    for name, arn in sorted(attached_managed_policies(role_name).items()):
+        if not name.startswith(prefix):
+            continue
+        version = iam.get_policy(PolicyArn=arn)["Policy"]["DefaultVersionId"]
+        document = iam.get_policy_version(PolicyArn=arn, VersionId=version)["PolicyVersion"]["Document"]
+        documents.append(_decode(document))
+
+    return documents
+
+
+def ensure_managed_policy(policy_arn: str, policy_name: str, policy_doc: dict):
+    """Policy yoksa oluşturur; default versiyon farklıysa yeni default versiyon yazar."""
+    iam = manager.get_client('iam', region=region)
+
+    try:
+        default_version = iam.get_policy(PolicyArn=policy_arn)["Policy"]["DefaultVersionId"]
+    except ClientError as e:
+        if not _missing(e):
+            raise
+        iam.create_policy(PolicyName=policy_name, PolicyDocument=json.dumps(policy_doc))
+        logger.info("Managed Policy Created | %s", policy_name)
+        return
+
+    current = iam.get_policy_version(PolicyArn=policy_arn, VersionId=default_version)["PolicyVersion"]["Document"]
+    if policy_hash(_decode(current)) == policy_hash(policy_doc):
+        logger.info("Managed Policy Unchanged | %s", policy_name)
+        return
+
+    versions = iam.list_policy_versions(PolicyArn=policy_arn)["Versions"]
+    if len(versions) >= MAX_POLICY_VERSIONS:
+        oldest = min((v for v in versions if not v["IsDefaultVersion"]), key=lambda v: v["CreateDate"])
+        iam.delete_policy_version(PolicyArn=policy_arn, VersionId=oldest["VersionId"])
+
+    iam.create_policy_version(PolicyArn=policy_arn, PolicyDocument=json.dumps(policy_doc), SetAsDefault=True)
+    logger.info("Managed Policy Updated | %s", policy_name)
+
+
+def delete_managed_policy(policy_arn: str):
+    """Default olmayan versiyonlar silinmeden policy silinemez."""
+    iam = manager.get_client('iam', region=region)
+
+    for version in iam.list_policy_versions(PolicyArn=policy_arn)["Versions"]:
+        if not version["IsDefaultVersion"]:
+            iam.delete_policy_version(PolicyArn=policy_arn, VersionId=version["VersionId"])
+
+    iam.delete_policy(PolicyArn=policy_arn)
+
+
+def put_permission_policies(role_name: str, policy_name: str, kind: str, documents: list) -> bool:
+    """
+    build_permission_policies çıktısını role'e uygular. Değişmeyen dokümanlar
+    yazılmaz; artık gerekmeyen managed policy'ler (ve managed'a geçildiyse
+    inline policy) kaldırılır.
+    """
+    iam = manager.get_client('iam', region=region)
+    prefix = _managed_policy_prefix(role_name, policy_name)
+    wanted = set()
+
+    try:
+        attached = {
+            name: arn for name, arn in attached_managed_policies(role_name).items() if name.startswith(prefix)
+        }
+
+        if kind == "inline":
+            if not put_inline_policy(role_name, policy_name, documents[0]):
+                return False
+        else:
+            # Role okuması yeni oluşturulmuşsa NoSuchEntity dönebilir; hesap STS'den alınır
+            identity = manager.get_client('sts', region=region).get_caller_identity()
+            partition = identity["Arn"].split(":")[1]
+            account = f"arn:{partition}:iam::{identity['Account']}"
+            for i, document in enumerate(documents, start=1):
+                name = f"{prefix}{i}"
+                arn = f"{account}:policy/{name}"
+                ensure_managed_policy(arn, name, document)
+                if name not in attached:
+                    iam.attach_role_policy(RoleName=role_name, PolicyArn=arn)
+                    logger.info("Managed Policy Attached | %s -> %s", name, role_name)
+                wanted.add(name)
+
+            if get_inline_policy(role_name, policy_name) is not None:
+                iam.delete_role_policy(RoleName=role_name, PolicyName=policy_name)
+                logger.info("Inline Policy Replaced By Managed Policies | %s", policy_name)
+
+        for name, arn in attached.items():
+            if name not in wanted:
+                iam.detach_role_policy(RoleName=role_name, PolicyArn=arn)
+                delete_managed_policy(arn)
+                logger.info("Managed Policy Removed | %s", name)
+
+    except ClientError as e:
+        logger.error("Permission Policies Failed | %s", e)
         return False
 
+    return True
+
 
-def ensure_instance_profile(profile_name: str) -> bool:
-    iam = iam_client
+def ensure_instance_profile(profile_name: str, tags: dict = None) -> bool:
+    iam = manager.get_client('iam', region=region)
 
     try:
-        iam.create_instance_profile(InstanceProfileName=profile_name)
-        logger.info(f"Instance Profile Created | {profile_name}")
+        iam.create_instance_profile(InstanceProfileName=profile_name, Tags=_tag_list(tags))
+        logger.info("Instance Profile Created | %s", profile_name)
         return True
 
     except ClientError as e:
         if e.response["Error"]["Code"] == "EntityAlreadyExists":
-            logger.warning(f"Instance Profile Already Exists | {profile_name}")
-            return True
-
-        logger.error(f"CreateInstanceProfile Operation Failed | {e}")
+            logger.warning("Instance Profile Already Exists | %s", profile_name)
+            if not tags:
+                return True
+            return _tag_existing(
+                iam.tag_instance_profile, "instance profile", InstanceProfileName=profile_name, Tags=_tag_list(tags)
+            )
+
+        logger.error("CreateInstanceProfile Operation Failed | %s", e)
         return False
 
 
 def add_role_to_profile(profile_name: str, role_name: str) -> bool:
-    iam = iam_client
+    iam = manager.get_client('iam', region=region)
 
     try:
         iam.add_role_to_instance_profile(
@@ -77,7 +233,7 @@ def add_role_to_profile(profile_name: str, role_name: str) -> bool:
             RoleName=role_name
         )
 
-        logger.info(f"Role Added To Profile | {role_name} -> {profile_name}")
+        logger.info("Role Added To Profile | %s -> %s", role_name, profile_name)
         return True
 
     except ClientError as e:
@@ -85,7 +241,7 @@ def add_role_to_profile(profile_name: str, role_name: str) -> bool:
             logger.warning("Role already attached to profile")
             return True
 
-        logger.error(f"AddRoleToProfile Failed | {e}")
+        logger.error("AddRoleToProfile Failed | %s", e)
         return False
 
 
@@ -95,29 +251,126 @@ def setup_iam_infrastructure(
     policy_name,
     bucket_arn,
     table_arn,
-    kms_key_arn
+    kms_key_arn,
+    role_tags: dict = None,
+    profile_tags: dict = None
 ) -> bool:
 
-    if not create_role(role_name):
+    if not create_role(role_name, role_tags):
         return False
 
-    policy_doc = build_permission_policy(bucket_arn, table_arn, kms_key_arn)
+    # ARN'ler tek string ya da liste olabilir; büyük dokümanlar managed policy'lere paketlenir
+    try:
+        kind, documents = build_permission_policies(bucket_arn, table_arn, kms_key_arn)
+    except ValueError as e:
+        logger.error("Permission Policy Too Large | %s", e)
+        return False
 
-    if not put_inline_policy(role_name, policy_name, policy_doc):
+    if not put_permission_policies(role_name, policy_name, kind, documents):
         return False
 
-    if not ensure_instance_profile(profile_name):
+    if not ensure_instance_profile(profile_name, profile_tags):
         return False
 
     if not add_role_to_profile(profile_name, role_name):
         return False
 
+    # Sabit bir sleep yerine: role + profile okunabilir olana kadar backoff ile poll
+    try:
+        wait_for_instance_profile(profile_name, role_name, region=region)
+    except WaiterError as e:
+        logger.error("IAM Propagation Failed | %s", e)
+        return False
+
     logger.info("IAM Infrastructure Setup Completed Successfully")
     return True
 
 
-def delete_iam_resources(role_name, profile_name, policy_name):
-    iam = iam_client
+def describe_role(role_name: str):
+    """Read-only: role bilgisi, yoksa None."""
+    iam = manager.get_client('iam', region=region)
+
+    try:
+        role = iam.get_role(RoleName=role_name)["Role"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchEntity":
+            return None
+        raise
+
+    return {"arn": role["Arn"]}
+
+
+def get_inline_policy(role_name: str, policy_name: str):
+    """Read-only: inline policy dokümanı (dict), yoksa None."""
+    iam = manager.get_client('iam', region=region)
+
+    try:
+        document = iam.get_role_policy(RoleName=role_name, PolicyName=policy_name)["PolicyDocument"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchEntity":
+            return None
+        raise
+
+    return _decode(document)
+
+
+def describe_instance_profile(profile_name: str):
+    """Read-only: profile'a bağlı role isimleri, yoksa None."""
+    iam = manager.get_client('iam', region=region)
+
+    try:
+        profile = iam.get_instance_profile(InstanceProfileName=profile_name)["InstanceProfile"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchEntity":
+            return None
+        raise
+
+    return {"roles": [role["RoleName"] for role in profile["Roles"]]}
+
+
+def list_roles() -> dict:
+    """Read-only: hesaptaki bütün role'ler {RoleName: Arn}; tek paginated çağrı zinciri."""
+    iam = manager.get_client('iam', region=region)
+    roles = {}
+
+    for page in iam.get_paginator("list_roles").paginate():
+        for role in page["Roles"]:
+            roles[role["RoleName"]] = role["Arn"]
+
+    return roles
+
+
+def list_instance_profiles() -> dict:
+    """Read-only: hesaptaki bütün instance profile'lar {InstanceProfileName: [RoleName, ...]}."""
+    iam = manager.get_client('iam', region=region)
+    profiles = {}
+
+    for page in iam.get_paginator("list_instance_profiles").paginate():
+        for profile in page["InstanceProfiles"]:
+            profiles[profile["InstanceProfileName"]] = [role["RoleName"] for role in profile["Roles"]]
+
+    return profiles
+
+
+def instance_profile_has_role(profile_name: str, role_name: str) -> bool:
+    iam = manager.get_client('iam', region=region)
+
+    try:
+        profile = iam.get_instance_profile(InstanceProfileName=profile_name)["InstanceProfile"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchEntity":
+            return False
+        raise
+
+    return any(role["RoleName"] == role_name for role in profile["Roles"])
+
+
+def _missing(e: ClientError) -> bool:
+    return e.response["Error"]["Code"] == "NoSuchEntity"
+
+
+def delete_instance_profile(profile_name, role_name) -> bool:
+    iam = manager.get_client('iam', region=region)
 
     try:
         iam.remove_role_from_instance_profile(
@@ -125,25 +378,56 @@ def delete_iam_resources(role_name, profile_name, policy_name):
             RoleName=role_name
         )
     except ClientError as e:
-        error = e.response["Error"]["Code"]
-        logger.error(f'İAM ERROR: {error}')
+        if not _missing(e):
+            logger.error("İAM ERROR: %s", e.response["Error"]["Code"])
+            return False
 
     try:
         iam.delete_instance_profile(InstanceProfileName=profile_name)
     except ClientError as e:
-        error = e.response["Error"]["Code"]
-        logger.error(f'İAM ERROR: {error}')
+        if not _missing(e):
+            logger.error("İAM ERROR: %s", e.response["Error"]["Code"])
+            return False
+
+    logger.info("Instance Profile deleted | %s", profile_name)
+    return True
+
+
+def delete_role(role_name, policy_name) -> bool:
+    iam = manager.get_client('iam', region=region)
 
     try:
         iam.delete_role_policy(RoleName=role_name, PolicyName=policy_name)
     except ClientError as e:
-        error = e.response["Error"]["Code"]
-        logger.error(f'İAM ERROR: {error}')
+        if not _missing(e):
+            logger.error("İAM ERROR: %s", e.response["Error"]["Code"])
+            return False
+
+    # Bağlı managed policy'ler ayrılmadan role silinemez; bizim oluşturduklarımız silinir
+    try:
+        prefix = _managed_policy_prefix(role_name, policy_name)
+        for name, arn in attached_managed_policies(role_name).items():
+            iam.detach_role_policy(RoleName=role_name, PolicyArn=arn)
+            if name.startswith(prefix):
+                delete_managed_policy(arn)
+    except ClientError as e:
+        if not _missing(e):
+            logger.error("İAM ERROR: %s", e.response["Error"]["Code"])
+            return False
 
     try:
         iam.delete_role(RoleName=role_name)
     except ClientError as e:
-        error = e.response["Error"]["Code"]
-        logger.error(f'İAM ERROR: {error}')
+        if not _missing(e):
+            logger.error("İAM ERROR: %s", e.response["Error"]["Code"])
+            return False
+
+    logger.info("IAM Role deleted | %s", role_name)
+    return True
+
+
+def delete_iam_resources(role_name, profile_name, policy_name):
+    delete_instance_profile(profile_name, role_name)
+    delete_role(role_name, policy_name)
 
     logger.info("IAM resources deleted")
@@ -1,76 +1,141 @@
 from botocore.exceptions import ClientError
 from utils.logger import get_logger
 from utils.session import AWSSessionManager
-from config import KMS_ALIAS_NAME
+from config import AWS_REGION, KMS_ALIAS_NAME
 from utils.waiters import wait_for_kms_enabled
 
 logger = get_logger("kms_service" , 'INFO')
-region = 'us-east-1'
 manager = AWSSessionManager.get_instance()
-kms_client = manager.get_client('kms' ,region=region)
 
-def get_key_by_alias(alias_name: str):
-    kms = kms_client
+def get_key_by_alias(alias_name: str, region: str = AWS_REGION):
+    kms = manager.get_client('kms', region=region)
 
     try:
         response = kms.describe_key(KeyId=alias_name)
         meta = response["KeyMetadata"]
 
-        logger.info(f"KMS | Key found by alias | {alias_name}")
+        logger.info("KMS | Key found by alias | %s", alias_name)
         return meta["KeyId"], meta["Arn"]
 
     except ClientError as e:
         if e.response["Error"]["Code"] == "NotFoundException":
-            logger.info(f"KMS | Alias not found | {alias_name}")
+            logger.info("KMS | Alias not found | %s", alias_name)
             return None, None
 
-        logger.error(f"KMS | DescribeKey failed | {e}")
+        logger.error("KMS | DescribeKey failed | %s", e)
         raise
 
 
-def create_master_key_with_alias(alias_name: str):
-    kms = kms_client
+def describe_alias_key(alias_name: str, region: str = AWS_REGION):
+    """Read-only: alias'ın (ya da key id/ARN'in) gösterdiği key'in durumu, yoksa None."""
+    kms = manager.get_client('kms', region=region)
 
-    logger.info("KMS | Creating new master key")
+    try:
+        meta = kms.describe_key(KeyId=alias_name)["KeyMetadata"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NotFoundException":
+            return None
+        raise
+
+    return {"key_id": meta["KeyId"], "arn": meta["Arn"], "state": meta["KeyState"]}
 
-    response = kms.create_key(
-        Description="Aegis Master Symmetric Key",
-        KeyUsage="ENCRYPT_DECRYPT",
-        Origin="AWS_KMS"
-    )
 
-    meta = response["KeyMetadata"]
-    key_id = meta["KeyId"]
-    key_arn = meta["Arn"]
+def key_is_enabled(key_id: str, region: str = AWS_REGION) -> bool:
+    kms = manager.get_client('kms', region=region)
 
-    wait_for_kms_enabled(key_id)
+    try:
+        return kms.describe_key(KeyId=key_id)["KeyMetadata"]["KeyState"] == "Enabled"
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NotFoundException":
+            return False
+        raise
+
+
+def create_master_key_with_alias(alias_name: str, region: str = AWS_REGION, tags: dict = None,
+                                 pending_key_id: str = None, on_key_created=None):
+    """
+    CreateKey ile CreateAlias arasında kesilen bir çalışma alias'sız (sahipsiz)
+    bir key bırakır. pending_key_id o key'dir: hâlâ kullanılabiliyorsa yeni key
+    oluşturulmaz, alias ona bağlanır. on_key_created(key_id) yeni key alias'tan
+    önce kaydedilsin diye CreateKey'in hemen ardından çağrılır.
+    """
+    kms = manager.get_client('kms', region=region)
+
+    pending = describe_alias_key(pending_key_id, region=region) if pending_key_id else None
+    if pending is not None and pending["state"] in ("Enabled", "Creating"):
+        logger.info("KMS | Adopting key from interrupted run | %s", pending['key_id'])
+        key_id = pending["key_id"]
+        key_arn = pending["arn"]
+    else:
+        logger.info("KMS | Creating new master key")
+
+        params = dict(
+            Description="Aegis Master Symmetric Key",
+            KeyUsage="ENCRYPT_DECRYPT",
+            Origin="AWS_KMS"
+        )
+        if tags:
+            params["Tags"] = [{"TagKey": key, "TagValue": value} for key, value in tags.items()]
+
+        response = kms.create_key(**params)
+
+        meta = response["KeyMetadata"]
+        key_id = meta["KeyId"]
+        key_arn = meta["Arn"]
+
+        if on_key_created is not None:
+            on_key_created(key_id)
+
+    wait_for_kms_enabled(key_id, region=region)
 
     kms.create_alias(
         AliasName=alias_name,
         TargetKeyId=key_id
     )
 
-    logger.info(f"KMS | Key created and alias assigned | {alias_name}")
+    logger.info("KMS | Key created and alias assigned | %s", alias_name)
 
     return key_id, key_arn
 
 
-def create_master_key():
+def create_master_key(alias_name: str = KMS_ALIAS_NAME, region: str = AWS_REGION, tags: dict = None,
+                      pending_key_id: str = None, on_key_created=None):
     """
     Alias varsa mevcut key kullanılır.
-    Yoksa yeni key oluşturulur.
+    Yoksa yeni key oluşturulur (ya da pending_key_id sahiplenilir).
     """
 
-    key_id, key_arn = get_key_by_alias(KMS_ALIAS_NAME)
+    key_id, key_arn = get_key_by_alias(alias_name, region=region)
 
     if key_id:
+        # Stack tag'lerinden önce oluşturulmuş key'ler drift discovery'de görünsün diye; TagResource idempotent
+        if tags:
+            manager.get_client('kms', region=region).tag_resource(
+                KeyId=key_id, Tags=[{"TagKey": key, "TagValue": value} for key, value in tags.items()]
+            )
         return key_id, key_arn
 
-    return create_master_key_with_alias(KMS_ALIAS_NAME)
+    return create_master_key_with_alias(alias_name, region, tags, pending_key_id, on_key_created)
+
+
+def schedule_key_deletion(key_id: str, region: str = AWS_REGION) -> bool:
+    """Alias'sız key'i siler; zaten silinmiş ya da silinmeyi bekliyorsa da True."""
+    kms = manager.get_client('kms', region=region)
+
+    try:
+        kms.schedule_key_deletion(KeyId=key_id, PendingWindowInDays=7)
+        logger.info("KMS | Key scheduled for deletion | %s", key_id)
+        return True
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code in ("NotFoundException", "KMSInvalidStateException"):
+            return True
+        logger.error("KMS | ScheduleKeyDeletion failed | %s | %s", key_id, code)
+        return False
 
 
-def delete_kms_key_by_alias(alias_name):
-    kms = kms_client
+def delete_kms_key_by_alias(alias_name, region: str = AWS_REGION):
+    kms = manager.get_client('kms', region=region)
 
     try:
         meta = kms.describe_key(KeyId=alias_name)["KeyMetadata"]
@@ -83,7 +148,10 @@ def delete_kms_key_by_alias(alias_name):
             PendingWindowInDays=7
         )
 
-        logger.info(f"KMS | Key scheduled for deletion | {key_id}")
+        logger.info("KMS | Key scheduled for deletion | %s", key_id)
+        return True
 
     except ClientError as e:
-        logger.warning(f"KMS | Cleanup skipped | {e.response['Error']['Code']}")
+        code = e.response['Error']['Code']
+        logger.warning("KMS | Cleanup skipped | %s", code)
+        return code == "NotFoundException"
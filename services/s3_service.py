@@ -1,54 +1,182 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from utils.logger import get_logger
-from config import AWS_REGION
+from config import AWS_REGION, S3_EMPTY_MAX_WORKERS
 from utils.session import AWSSessionManager
+from utils.waiters import backoff_delays
 
-region = 'us-east-1'
 
 manager = AWSSessionManager.get_instance()
-s3_client = manager.get_client('s3', region=region)
 logger = get_logger("s3_service", 'INFO')
 
-def create_bucket(bucket_name):
-    s3 = s3_client
+# delete_objects tek istekte en fazla 1000 key kabul eder
+DELETE_BATCH_SIZE = 1000
+DELETE_MAX_RETRIES = 5
+
+def create_bucket(bucket_name, region: str = AWS_REGION, tags: dict = None):
+    s3 = manager.get_client('s3', region=region)
 
     try:
-        if AWS_REGION == "us-east-1":
+        if region == "us-east-1":
             s3.create_bucket(Bucket=bucket_name)
         else:
-            s3.create_bucket(
-                Bucket=bucket_name,
-                CreateBucketConfiguration={
-                    "LocationConstraint": AWS_REGION
-                }
-            )
+            try:
+                s3.create_bucket(
+                    Bucket=bucket_name,
+                    CreateBucketConfiguration={
+                        "LocationConstraint": region
+                    }
+                )
+            except ClientError as e:
+                # Yarıda kalan bir apply bucket'ı oluşturmuş olabilir; us-east-1 bu durumda zaten hata vermez
+                if e.response["Error"]["Code"] != "BucketAlreadyOwnedByYou":
+                    raise
+                logger.info("S3 | Bucket already owned | %s", bucket_name)
+
+        if tags:
+            # PutBucketTagging bütün tag set'ini değiştirir; tag:TagResources mevcut tag'lere ekler
+            from services.tagging_service import tag_resources
+
+            if not tag_resources([f"arn:aws:s3:::{bucket_name}"], tags, region=region):
+                return False
 
-        logger.info(f"S3 Bucket Created successfully| {bucket_name}")
+        logger.info("S3 Bucket Created successfully| %s", bucket_name)
         return True
 
     except ClientError as e:
         error_code = e.response["Error"]["Code"]
         error_message = e.response["Error"]["Message"]
 
-        logger.error(f"S3 CreateBucket operation Failed | {error_code} | {error_message}")
+        logger.error("S3 CreateBucket operation Failed | %s | %s", error_code, error_message)
         return False
 
 
-def delete_bucket(bucket_name):
-    s3 = s3_client
+def describe_bucket(bucket_name, region: str = AWS_REGION):
+    """Read-only: bucket bölgesi, yoksa None."""
+    s3 = manager.get_client('s3', region=region)
+
+    try:
+        response = s3.head_bucket(Bucket=bucket_name)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchBucket", "NotFound"):
+            return None
+        raise
+
+    return {"region": response.get("BucketRegion")}
+
+
+def bucket_exists(bucket_name, region: str = AWS_REGION) -> bool:
+    s3 = manager.get_client('s3', region=region)
 
     try:
-        objs = s3.list_objects_v2(Bucket=bucket_name)
-        if "Contents" in objs:
-            s3.delete_objects(
+        s3.head_bucket(Bucket=bucket_name)
+        return True
+    except ClientError as e:
+        logger.info("S3 bucket not confirmed | %s | %s", bucket_name, e.response['Error']['Code'])
+        return False
+
+
+def _iter_delete_batches(s3, bucket_name, batch_size=DELETE_BATCH_SIZE):
+    """
+    list_object_versions sayfalarını stream eder; object version'ları ve
+    delete marker'ları batch_size'lık paketler halinde üretir.
+    Versioning kapalı bucket'larda VersionId "null" döner ve aynı şekilde silinir.
+    """
+    paginator = s3.get_paginator("list_object_versions")
+    batch = []
+
+    for page in paginator.paginate(Bucket=bucket_name, PaginationConfig={"PageSize": batch_size}):
+        for entry in page.get("Versions", []) + page.get("DeleteMarkers", []):
+            batch.append({"Key": entry["Key"], "VersionId": entry["VersionId"]})
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+
+    if batch:
+        yield batch
+
+
+def _delete_batch(s3, bucket_name, objects, max_retries=DELETE_MAX_RETRIES):
+    """Bir batch'i siler, key bazlı hataları backoff ile tekrar dener. (silinen, başarısız) döner."""
+    pending = objects
+    delays = backoff_delays(initial=0.5, maximum=8.0)
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = s3.delete_objects(
                 Bucket=bucket_name,
-                Delete={"Objects":[{"Key":o["Key"]} for o in objs["Contents"]]}
+                Delete={"Objects": pending, "Quiet": True}
             )
+            errors = response.get("Errors", [])
+        except ClientError as e:
+            logger.warning("S3 DeleteObjects failed | %s | attempt=%s", e.response['Error']['Code'], attempt + 1)
+            errors = pending
+
+        if not errors:
+            return len(objects), 0
+
+        pending = [
+            {"Key": err["Key"], "VersionId": err["VersionId"]} if err.get("VersionId") else {"Key": err["Key"]}
+            for err in errors
+        ]
+
+        if attempt < max_retries:
+            time.sleep(next(delays))
+
+    logger.error("S3 DeleteObjects gave up | %s keys | first=%s", len(pending), pending[0]['Key'])
+    return len(objects) - len(pending), len(pending)
+
+
+def empty_bucket(bucket_name, max_workers=S3_EMPTY_MAX_WORKERS, region: str = AWS_REGION):
+    """
+    Bucket'taki tüm object version'larını ve delete marker'ları siler.
+    Listeleme ve silme aynı anda akar; en fazla 2 * max_workers batch
+    bellekte bulunur, obje sayısından bağımsız olarak bellek sınırlıdır.
+    """
+    s3 = manager.get_client('s3', region=region)
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    lock = threading.Lock()
+    totals = {"deleted": 0, "failed": 0}
+
+    def on_done(future):
+        in_flight.release()
+        try:
+            deleted, failed = future.result()
+        except Exception as e:
+            logger.error("S3 delete batch crashed | %s", e)
+            deleted, failed = 0, 1
+        with lock:
+            totals["deleted"] += deleted
+            totals["failed"] += failed
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-empty") as pool:
+        for batch in _iter_delete_batches(s3, bucket_name):
+            in_flight.acquire()
+            pool.submit(_delete_batch, s3, bucket_name, batch).add_done_callback(on_done)
+
+    logger.info("S3 bucket emptied | %s | deleted=%s | failed=%s", bucket_name, totals['deleted'], totals['failed'])
+    return totals["deleted"], totals["failed"]
+
+
+def delete_bucket(bucket_name, region: str = AWS_REGION):
+    s3 = manager.get_client('s3', region=region)
+
+    try:
+        _, failed = empty_bucket(bucket_name, region=region)
+        if failed:
+            logger.error("S3 bucket not empty, skipping delete | %s | failed=%s", bucket_name, failed)
+            return False
 
         s3.delete_bucket(Bucket=bucket_name)
-        logger.info(f"S3 bucket deleted: {bucket_name}")
+        logger.info("S3 bucket deleted: %s", bucket_name)
+        return True
     except ClientError as e:
         error = e.response["Error"]["Code"]
+        if error == "NoSuchBucket":
+            logger.info("S3 bucket not found: %s", bucket_name)
+            return True
         messages = e.response["Error"]["Message"]
-        logger.error(f'AWS ERROR: {error} | {messages}')
-        
+        logger.error("AWS ERROR: %s | %s", error, messages)
+        return False
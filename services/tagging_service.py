@@ -0,0 +1,42 @@
+from utils.logger import get_logger
+from utils.session import AWSSessionManager
+from config import AWS_REGION
+
+logger = get_logger("tagging_service", 'INFO')
+manager = AWSSessionManager.get_instance()
+
+# TagResources tek çağrıda en fazla 20 ARN kabul eder
+TAG_BATCH_SIZE = 20
+
+
+def get_tagged_resources(tag_key: str, region: str = AWS_REGION) -> list:
+    """
+    Region'da tag_key tag'ini taşıyan bütün kaynaklar: [(arn, {tag: value})].
+    Servis ve kaynak türünden bağımsız tek bir paginated tag:GetResources.
+    """
+    tagging = manager.get_client('resourcegroupstaggingapi', region=region)
+    paginator = tagging.get_paginator("get_resources")
+    resources = []
+
+    for page in paginator.paginate(TagFilters=[{"Key": tag_key}]):
+        for mapping in page["ResourceTagMappingList"]:
+            tags = {tag["Key"]: tag["Value"] for tag in mapping.get("Tags", [])}
+            resources.append((mapping["ResourceARN"], tags))
+
+    logger.info("Tagging | Discovered | %s | %s | resources=%d", region, tag_key, len(resources))
+    return resources
+
+
+def tag_resources(arns: list, tags: dict, region: str = AWS_REGION) -> bool:
+    """Mevcut tag'lere ekler (üzerine yazmaz); 20'lik batch'ler halinde."""
+    tagging = manager.get_client('resourcegroupstaggingapi', region=region)
+    ok = True
+
+    for i in range(0, len(arns), TAG_BATCH_SIZE):
+        batch = arns[i:i + TAG_BATCH_SIZE]
+        failed = tagging.tag_resources(ResourceARNList=batch, Tags=tags).get("FailedResourcesMap", {})
+        for arn, failure in failed.items():
+            logger.error("Tagging Failed | %s | %s | %s", arn, failure.get('ErrorCode'), failure.get('ErrorMessage'))
+            ok = False
+
+    return ok
@@ -0,0 +1,280 @@
+import io
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
+from utils.logger import get_logger
+from utils.session import AWSSessionManager
+from utils.state import StateStore, fingerprint
+from config import (
+    AWS_REGION, KMS_ALIAS_NAME, S3_TRANSFER_MAX_WORKERS, S3_MULTIPART_THRESHOLD, S3_MIN_PART_SIZE,
+    S3_TRANSFER_STATE_FILE
+)
+
+logger = get_logger("transfer_service", 'INFO')
+manager = AWSSessionManager.get_instance()
+
+# S3 multipart limitleri
+MAX_PARTS = 10000
+MAX_PART_SIZE = 5 * 1024 ** 3
+# Ranged GET gövdesi diske bu boyutta parçalar halinde yazılır
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+_state_lock = threading.Lock()
+_state = None
+
+
+def _transfers() -> StateStore:
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = StateStore(S3_TRANSFER_STATE_FILE)
+        return _state
+
+
+def part_size_for(size: int, min_part_size: int = S3_MIN_PART_SIZE) -> int:
+    """Part sayısı 10.000'i geçmeyecek şekilde min_part_size'ı ikiye katlayarak büyütür."""
+    part_size = min_part_size
+    while -(-size // part_size) > MAX_PARTS and part_size < MAX_PART_SIZE:
+        part_size *= 2
+    return min(part_size, MAX_PART_SIZE)
+
+
+class _PartReader(io.RawIOBase):
+    """
+    mmap'lenmiş dosyanın bir dilimini kopyalamadan file-like olarak sunar.
+    botocore gövdeyi checksum ve gönderim için küçük parçalar halinde okur;
+    bellekte hiçbir zaman part'ın tamamı tutulmaz.
+    """
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def __len__(self):
+        return len(self._view)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, min(base + offset, len(self._view)))
+        return self._pos
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+def _sse_args(kms_key_id) -> dict:
+    if not kms_key_id:
+        return {}
+    return {"ServerSideEncryption": "aws:kms", "SSEKMSKeyId": kms_key_id, "BucketKeyEnabled": True}
+
+
+def _uploaded_parts(s3, bucket_name, key, upload_id) -> dict:
+    """Yarıda kalan upload'ın tamamlanmış part'ları: {PartNumber: ETag}. Upload yoksa None."""
+    parts = {}
+    try:
+        for page in s3.get_paginator("list_parts").paginate(Bucket=bucket_name, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part["ETag"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchUpload":
+            return None
+        raise
+    return parts
+
+
+def upload_file(path: str, bucket_name: str, key: str, kms_key_id: str = KMS_ALIAS_NAME,
+                max_workers: int = S3_TRANSFER_MAX_WORKERS, region: str = AWS_REGION) -> str:
+    """
+    Dosyayı SSE-KMS ile yükler. S3_MULTIPART_THRESHOLD üstündeki dosyalar
+    mmap üzerinden paralel multipart upload ile gönderilir. Upload yarıda
+    kalırsa aynı çağrı kaldığı yerden devam eder (tamamlanmış part'lar
+    list_parts ile bulunur ve tekrar gönderilmez). ETag döner.
+    """
+    s3 = manager.get_client('s3', region=region)
+    size = os.path.getsize(path)
+    sse = _sse_args(kms_key_id)
+
+    if size < S3_MULTIPART_THRESHOLD:
+        with open(path, "rb") as f:
+            etag = s3.put_object(Bucket=bucket_name, Key=key, Body=f, **sse)["ETag"]
+        logger.info("S3 upload complete | s3://%s/%s | %s bytes", bucket_name, key, size)
+        return etag
+
+    state = _transfers()
+    name = f"upload:{bucket_name}/{key}"
+    fp = fingerprint({
+        "path": os.path.abspath(path), "size": size, "mtime": os.path.getmtime(path),
+        "bucket": bucket_name, "key": key, "kms_key_id": kms_key_id
+    })
+
+    record = state.get(name)
+    done = None
+    if record and record["fingerprint"] == fp:
+        upload_id, part_size = record["value"]["upload_id"], record["value"]["part_size"]
+        done = _uploaded_parts(s3, bucket_name, key, upload_id)
+        if done is not None:
+            logger.info("S3 upload resumed | s3://%s/%s | parts done=%s", bucket_name, key, len(done))
+
+    if done is None:
+        part_size = part_size_for(size)
+        upload_id = s3.create_multipart_upload(Bucket=bucket_name, Key=key, **sse)["UploadId"]
+        state.put(name, {"upload_id": upload_id, "part_size": part_size}, fp)
+        done = {}
+
+    part_count = -(-size // part_size)
+    logger.info(
+        "S3 multipart upload | s3://%s/%s | %s bytes | parts=%s x %s | workers=%s",
+        bucket_name, key, size, part_count, part_size, max_workers
+    )
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+
+        def upload_part(number):
+            start = (number - 1) * part_size
+            body = _PartReader(view[start:start + part_size])
+            try:
+                return number, s3.upload_part(
+                    Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+                )["ETag"]
+            finally:
+                body._view.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-upload") as pool:
+                futures = [pool.submit(upload_part, n) for n in range(1, part_count + 1) if n not in done]
+                try:
+                    for future in as_completed(futures):
+                        number, etag = future.result()
+                        done[number] = etag
+                except BaseException:
+                    # Upload açık kalır; aynı çağrı tekrarlandığında kaldığı yerden devam eder
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            view.release()
+
+    etag = s3.complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": [{"PartNumber": n, "ETag": done[n]} for n in sorted(done)]}
+    )["ETag"]
+    state.remove(name)
+
+    logger.info("S3 upload complete | s3://%s/%s | %s bytes | parts=%s", bucket_name, key, size, part_count)
+    return etag
+
+
+def abort_upload(bucket_name: str, key: str, region: str = AWS_REGION) -> bool:
+    """Kayıtlı (yarıda kalmış) upload'ı iptal eder; S3'te biriken part'lar silinir."""
+    s3 = manager.get_client('s3', region=region)
+    state = _transfers()
+    name = f"upload:{bucket_name}/{key}"
+    record = state.get(name)
+
+    if not record:
+        return False
+
+    try:
+        s3.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=record["value"]["upload_id"])
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchUpload":
+            raise
+
+    state.remove(name)
+    logger.info("S3 upload aborted | s3://%s/%s", bucket_name, key)
+    return True
+
+
+def download_file(bucket_name: str, key: str, path: str, max_workers: int = S3_TRANSFER_MAX_WORKERS,
+                  region: str = AWS_REGION) -> str:
+    """
+    Objeyi paralel ranged GET'lerle indirir. Part'lar önceden boyutlandırılmış
+    "<path>.part" dosyasına kendi offset'lerine yazılır; bellek kullanımı
+    max_workers * DOWNLOAD_CHUNK_SIZE ile sınırlıdır. Tamamlanan part'lar
+    state'e kaydedilir; yarıda kalan indirme, obje değişmediyse (ETag)
+    kaldığı yerden devam eder. ETag döner.
+    """
+    s3 = manager.get_client('s3', region=region)
+    head = s3.head_object(Bucket=bucket_name, Key=key)
+    size, etag = head["ContentLength"], head["ETag"]
+    tmp = f"{path}.part"
+
+    if size < S3_MULTIPART_THRESHOLD:
+        body = s3.get_object(Bucket=bucket_name, Key=key, IfMatch=etag)["Body"]
+        with open(tmp, "wb") as f:
+            for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(tmp, path)
+        logger.info("S3 download complete | s3://%s/%s | %s bytes", bucket_name, key, size)
+        return etag
+
+    state = _transfers()
+    name = f"download:{os.path.abspath(path)}"
+    fp = fingerprint({"bucket": bucket_name, "key": key, "etag": etag, "size": size})
+
+    record = state.get(name)
+    if record and record["fingerprint"] == fp and os.path.exists(tmp):
+        part_size, done = record["value"]["part_size"], set(record["value"]["done"])
+        logger.info("S3 download resumed | s3://%s/%s | parts done=%s", bucket_name, key, len(done))
+    else:
+        part_size, done = part_size_for(size), set()
+        with open(tmp, "wb") as f:
+            f.truncate(size)
+
+    part_count = -(-size // part_size)
+    progress_lock = threading.Lock()
+    logger.info(
+        "S3 ranged download | s3://%s/%s | %s bytes | parts=%s x %s | workers=%s",
+        bucket_name, key, size, part_count, part_size, max_workers
+    )
+
+    fd = os.open(tmp, os.O_WRONLY)
+    try:
+        def download_part(number):
+            start = (number - 1) * part_size
+            end = min(start + part_size, size) - 1
+            body = s3.get_object(Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)["Body"]
+
+            offset = start
+            for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+
+            with progress_lock:
+                done.add(number)
+                state.put(name, {"part_size": part_size, "done": sorted(done)}, fp)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-download") as pool:
+            futures = [pool.submit(download_part, n) for n in range(1, part_count + 1) if n not in done]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        os.close(fd)
+
+    os.replace(tmp, path)
+    state.remove(name)
+
+    logger.info("S3 download complete | s3://%s/%s | %s bytes | parts=%s", bucket_name, key, size, part_count)
+    return etag
@@ -0,0 +1,177 @@
+import atexit
+import itertools
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from config import AWS_REGION, AUDIT_QUEUE_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_CLOSE_TIMEOUT, AUDIT_MAX_RETRIES
+from utils.session import AWSSessionManager
+from utils.logger import get_logger, RUN_ID
+
+logger = get_logger("audit", 'INFO')
+manager = AWSSessionManager.get_instance()
+
+# BatchWriteItem tek çağrıda en fazla 25 item kabul eder
+BATCH_SIZE = 25
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+class AuditLog:
+    """
+    Aegis_Audit_Log tablosuna asenkron yazan sink.
+    record() sadece bounded bir kuyruğa ekler ve hemen döner; kayıtlar
+    arka plan thread'inde 25'lik BatchWriteItem çağrılarıyla yazılır.
+    UnprocessedItems backoff ile tekrar denenir. Tablo henüz yoksa (ilk
+    apply) kayıtlar bekletilir ve bir sonraki flush'ta tekrar denenir.
+    """
+
+    def __init__(self, table_name: str, region: str = AWS_REGION, run_id: str = RUN_ID,
+                 max_queue: int = AUDIT_QUEUE_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL):
+        self.table_name = table_name
+        self.region = region
+        self.run_id = run_id
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        # dropped hem record() çağıranlardan hem writer thread'inden artırılır
+        self._dropped_lock = threading.Lock()
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seq = itertools.count(1)
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"audit-{region}", daemon=True)
+        self._thread.start()
+
+    def record(self, resource: str, operation: str, outcome: str, duration: float, error=None):
+        item = {
+            "file_id": {"S": f"{self.run_id}#{next(self._seq):06d}"},
+            "run_id": {"S": self.run_id},
+            "region": {"S": self.region},
+            "resource": {"S": resource},
+            "operation": {"S": operation},
+            "outcome": {"S": outcome},
+            "duration_ms": {"N": str(int(duration * 1000))},
+            "timestamp": {"S": datetime.now(timezone.utc).isoformat()},
+        }
+        if error is not None:
+            item["error"] = {"S": str(error)[:1000]}
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._drop(1)
+            return
+
+        if self._queue.qsize() >= BATCH_SIZE:
+            self._wake.set()
+
+    def _drop(self, count: int):
+        with self._dropped_lock:
+            self.dropped += count
+
+    def record_node(self, operation: str, result):
+        """ResourceGraph.run(on_result=...) için: NodeResult'ı kaydeder."""
+        self.record(result.name, operation, result.status, result.duration, result.error)
+
+    def close(self, timeout: float = AUDIT_CLOSE_TIMEOUT):
+        """Kuyruktaki her şeyi yazar (en fazla timeout saniye bekler)."""
+        self._closing.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+        if self._thread.is_alive() or self.dropped:
+            logger.warning(
+                "Audit | %s | %s | written=%d | dropped=%d | unflushed=%d",
+                self.table_name, self.region, self.written, self.dropped, self._queue.qsize()
+            )
+        else:
+            logger.info("Audit | %s | %s | written=%d | run=%s", self.table_name, self.region, self.written, self.run_id)
+
+    def _run(self):
+        pending = []
+
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            closing = self._closing.is_set()
+
+            # Writer thread beklenmeyen bir hatada ölürse kuyruk sessizce dolar; tur atlanır, kayıtlar bekler
+            try:
+                while True:
+                    try:
+                        pending.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if pending:
+                    pending = self._write(pending)
+            except Exception:
+                logger.exception("Audit | Writer error, retrying next flush | %s | %s", self.table_name, self.region)
+
+            # Yazılamayan kayıtlar da bounded: en eskiler düşer
+            if len(pending) > self.max_queue:
+                self._drop(len(pending) - self.max_queue)
+                pending = pending[-self.max_queue:]
+
+            if closing:
+                self._drop(len(pending))
+                return
+
+    def _write(self, items: list) -> list:
+        """Item'ları 25'lik batch'lerle yazar; yazılamayanları döner."""
+        # botocore sadece arka plan thread'inde yüklenir; CLI import süresine girmez
+        from utils.waiters import backoff_delays
+
+        dynamodb = manager.get_client('dynamodb', region=self.region)
+
+        for i in range(0, len(items), BATCH_SIZE):
+            requests = [{"PutRequest": {"Item": item}} for item in items[i:i + BATCH_SIZE]]
+            delays = backoff_delays()
+
+            try:
+                for _ in range(AUDIT_MAX_RETRIES + 1):
+                    response = dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                    unprocessed = response.get("UnprocessedItems", {}).get(self.table_name, [])
+                    self.written += len(requests) - len(unprocessed)
+                    requests = unprocessed
+                    if not requests:
+                        break
+                    time.sleep(next(delays))
+            except Exception as e:
+                # API, bağlantı, credential hataları: kayıtlar bir sonraki flush'a kalır.
+                # İlk apply'da tablo henüz yokken her flush'ta uyarı basılmasın
+                code = getattr(e, "response", {}).get("Error", {}).get("Code", type(e).__name__)
+                level = logging.DEBUG if code == "ResourceNotFoundException" else logging.WARNING
+                logger.log(level, "Audit | Write deferred | %s | %s | %d item(s)", code, e, len(items) - i)
+                return [r["PutRequest"]["Item"] for r in requests] + items[i + BATCH_SIZE:]
+
+            if requests:
+                return [r["PutRequest"]["Item"] for r in requests] + items[i + BATCH_SIZE:]
+
+        return []
+
+
+def audit_log(table_name: str, region: str = AWS_REGION) -> AuditLog:
+    """(tablo, region) başına tek AuditLog; process çıkışında hepsi flush edilir."""
+    with _logs_lock:
+        key = (table_name, region)
+        if key not in _logs:
+            _logs[key] = AuditLog(table_name, region)
+        return _logs[key]
+
+
+def close_audit_logs():
+    with _logs_lock:
+        logs = list(_logs.values())
+        _logs.clear()
+
+    for log in logs:
+        log.close()
+
+
+atexit.register(close_audit_logs)
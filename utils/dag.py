@@ -0,0 +1,327 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from utils.logger import get_logger, log_context
+from utils.metrics import metrics
+
+logger = get_logger("dag")
+
+PENDING = "pending"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class NodeResult:
+    def __init__(self, name: str):
+        self.name = name
+        self.status = PENDING
+        self.value = None
+        self.error = None
+        self.started = None
+        self.duration = 0.0
+
+
+class ResourceGraph:
+    """
+    Resource DAG'i. Her node, bağımlı olduğu node'ların sonuçlarını
+    keyword argument olarak alır: add("iam", fn, deps=("kms",)) -> fn(kms=...)
+    service, run_graphs'ın servis başına eşzamanlılık limiti içindir.
+    """
+
+    def __init__(self, name: str = "graph"):
+        self.name = name
+        self._nodes = {}
+        self._services = {}
+
+    def add(self, name: str, func, deps=(), service: str = None):
+        if name in self._nodes:
+            raise ValueError(f"Duplicate node: {name}")
+        self._nodes[name] = (func, tuple(deps))
+        self._services[name] = service
+        return self
+
+    def func(self, name: str):
+        return self._nodes[name][0]
+
+    def service(self, name: str):
+        return self._services.get(name)
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def deps(self, name: str):
+        return self._nodes[name][1]
+
+    def subgraph(self, names):
+        """Sadece verilen node'ları ve onların (transitive) bağımlılıklarını içeren yeni graf."""
+        selected = []
+
+        def visit(name):
+            if name not in self._nodes:
+                raise ValueError(f"Unknown node: {name}")
+            if name in selected:
+                return
+            for dep in self._nodes[name][1]:
+                visit(dep)
+            selected.append(name)
+
+        for name in names:
+            visit(name)
+
+        graph = ResourceGraph(self.name)
+        for name in selected:
+            func, deps = self._nodes[name]
+            graph.add(name, func, deps, self._services[name])
+        return graph
+
+    def validate(self):
+        for name, (_, deps) in self._nodes.items():
+            for dep in deps:
+                if dep not in self._nodes:
+                    raise ValueError(f"Unknown dependency | {name} -> {dep}")
+
+        visiting, done = set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle | {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dep in self._nodes[name][1]:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._nodes:
+            visit(name, [])
+
+    def run(self, max_parallel: int = 4, on_result=None) -> dict:
+        """
+        Node'ları bağımlılıkları hazır olur olmaz sınırlı bir thread pool'da
+        çalıştırır. Hata alan node'un bağımlıları SKIPPED olarak işaretlenir,
+        bağımsız dallar çalışmaya devam eder.
+        on_result(NodeResult) her node bittiğinde/atlandığında çağrılır.
+        """
+        self.validate()
+
+        results = {name: NodeResult(name) for name in self._nodes}
+        remaining = dict(self._nodes)
+        running = {}
+        max_parallel = max(1, max_parallel)
+        graph_start = time.perf_counter()
+
+        logger.info("DAG | %s started | nodes=%d | max_parallel=%d", self.name, len(self._nodes), max_parallel)
+
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix=self.name) as pool:
+            try:
+                self._schedule(pool, remaining, running, results, max_parallel, graph_start, on_result)
+            except KeyboardInterrupt:
+                from utils.waiters import cancel_all
+
+                # Çalışan node'lar waiter içinde bekliyorsa hemen çıksınlar
+                cancel_all()
+                raise
+
+        total = time.perf_counter() - graph_start
+        logger.info("DAG | %s completed | %.2fs", self.name, total)
+        return results
+
+    def _schedule(self, pool, remaining, running, results, max_parallel, graph_start, on_result=None):
+        def done(result):
+            if result.status != SKIPPED:
+                metrics.observe("step", f"{self.name.split('[')[0]}.{result.name}", result.duration)
+            if on_result is not None:
+                on_result(result)
+
+        while remaining or running:
+            for name in list(remaining):
+                if len(running) >= max_parallel:
+                    break
+
+                func, deps = remaining[name]
+                dep_status = [results[d].status for d in deps]
+
+                if any(s in (FAILED, SKIPPED) for s in dep_status):
+                    results[name].status = SKIPPED
+                    del remaining[name]
+                    logger.warning("DAG | Node skipped | %s | upstream failure", name)
+                    done(results[name])
+                    continue
+
+                if all(s == SUCCEEDED for s in dep_status):
+                    kwargs = {d: results[d].value for d in deps}
+                    results[name].started = time.perf_counter() - graph_start
+                    running[pool.submit(self._timed, func, kwargs, f"{self.name}.{name}")] = name
+                    del remaining[name]
+                    logger.info("DAG | Node started | %s", name)
+
+            if not running:
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                name = running.pop(future)
+                result = results[name]
+                duration, value, error = future.result()
+                result.duration = duration
+
+                if error is None:
+                    result.status = SUCCEEDED
+                    result.value = value
+                    logger.info("DAG | Node finished | %s | %.2fs", name, duration)
+                else:
+                    result.status = FAILED
+                    result.error = error
+                    logger.error("DAG | Node failed | %s | %.2fs | %s", name, duration, error)
+
+                done(result)
+
+    @staticmethod
+    def _timed(func, kwargs, step):
+        start = time.perf_counter()
+        try:
+            # Node içinde yazılan bütün log kayıtları step ile ilişkilendirilir
+            with log_context(step):
+                value = func(**kwargs)
+            return time.perf_counter() - start, value, None
+        except Exception as e:
+            return time.perf_counter() - start, None, e
+
+
+def run_graphs(graphs: dict, max_parallel: int, service_limits: dict = None, on_result=None) -> dict:
+    """
+    Birçok bağımsız graf (örn. spec'teki her stack'in apply grafiği) tek bir
+    paylaşılan thread pool'da çalışır:
+      - max_parallel: bütün graflarda aynı anda çalışan toplam node sayısı
+      - service_limits: {"iam": 4, ...} aynı servisin node'larından aynı anda en fazla
+      - adil sıra: her turda graflar sırayla, graf başına en fazla bir node başlatır;
+        bir sonraki tur kaldığı graftan devam eder, büyük bir graf ötekileri aç bırakmaz
+      - izolasyon: bir node'un hatası sadece kendi grafındaki bağımlılarını atlatır
+    graphs: {label: ResourceGraph}; on_result(label, NodeResult).
+    Dönüş: {label: {node: NodeResult}}.
+    """
+    service_limits = service_limits or {}
+    for graph in graphs.values():
+        graph.validate()
+
+    results = {label: {name: NodeResult(name) for name in graph.nodes()} for label, graph in graphs.items()}
+    remaining = {label: list(graph.nodes()) for label, graph in graphs.items()}
+    running = {}
+    busy = Counter()
+    order = list(graphs)
+    cursor = 0
+    max_parallel = max(1, max_parallel)
+    start = time.perf_counter()
+
+    logger.info(
+        "DAG | scheduler started | graphs=%d | nodes=%d | max_parallel=%d",
+        len(graphs), sum(len(names) for names in remaining.values()), max_parallel
+    )
+
+    def done(label, result):
+        if result.status != SKIPPED:
+            metrics.observe("step", f"{graphs[label].name.split('[')[0]}.{result.name}", result.duration)
+        if on_result is not None:
+            on_result(label, result)
+
+    def next_ready(label):
+        """Grafın başlatılabilir ilk node'u; upstream'i başarısız olanları yol üstünde atlar."""
+        graph = graphs[label]
+        for name in list(remaining[label]):
+            dep_status = [results[label][d].status for d in graph.deps(name)]
+
+            if any(s in (FAILED, SKIPPED) for s in dep_status):
+                results[label][name].status = SKIPPED
+                remaining[label].remove(name)
+                logger.warning("DAG | Node skipped | %s.%s | upstream failure", graph.name, name)
+                done(label, results[label][name])
+                continue
+
+            service = graph.service(name)
+            limit = max(1, service_limits.get(service, max_parallel))
+            if all(s == SUCCEEDED for s in dep_status) and busy[service] < limit:
+                return name
+        return None
+
+    def schedule(pool):
+        nonlocal cursor
+        while any(remaining.values()) or running:
+            started = True
+            while started and len(running) < max_parallel:
+                started = False
+                for i in range(len(order)):
+                    if len(running) >= max_parallel:
+                        break
+                    label = order[(cursor + i) % len(order)]
+                    name = next_ready(label)
+                    if name is None:
+                        continue
+
+                    graph = graphs[label]
+                    kwargs = {d: results[label][d].value for d in graph.deps(name)}
+                    results[label][name].started = time.perf_counter() - start
+                    remaining[label].remove(name)
+                    busy[graph.service(name)] += 1
+                    future = pool.submit(ResourceGraph._timed, graph.func(name), kwargs, f"{graph.name}.{name}")
+                    running[future] = (label, name)
+                    started = True
+                    logger.info("DAG | Node started | %s.%s", graph.name, name)
+                # Sıradaki tur bir sonraki graftan başlar
+                cursor = (cursor + 1) % max(1, len(order))
+
+            if not running:
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                label, name = running.pop(future)
+                graph = graphs[label]
+                busy[graph.service(name)] -= 1
+                result = results[label][name]
+                result.duration, value, error = future.result()
+
+                if error is None:
+                    result.status = SUCCEEDED
+                    result.value = value
+                    logger.info("DAG | Node finished | %s.%s | %.2fs", graph.name, name, result.duration)
+                else:
+                    result.status = FAILED
+                    result.error = error
+                    logger.error("DAG | Node failed | %s.%s | %.2fs | %s", graph.name, name, result.duration, error)
+
+                done(label, result)
+
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="scheduler") as pool:
+        try:
+            schedule(pool)
+        except KeyboardInterrupt:
+            from utils.waiters import cancel_all
+
+            cancel_all()
+            raise
+
+    logger.info("DAG | scheduler completed | graphs=%d | %.2fs", len(graphs), time.perf_counter() - start)
+    return results
+
+
+def format_summary(results: dict) -> str:
+    rows = sorted(results.values(), key=lambda r: (r.started is None, r.started or 0))
+    width = max([len(r.name) for r in rows] + [4])
+
+    lines = [f"{'NODE'.ljust(width)}  {'STATUS':<9}  {'START':>7}  {'DURATION':>8}  RESULT"]
+    for r in rows:
+        start = f"{r.started:.2f}s" if r.started is not None else "-"
+        detail = r.error if r.error is not None else (r.value if r.value is not None else "")
+        lines.append(
+            f"{r.name.ljust(width)}  {r.status:<9}  {start:>7}  {r.duration:>7.2f}s  {str(detail)[:80]}"
+        )
+
+    return "\n".join(lines)
+
+
+def failed_nodes(results: dict) -> list:
+    return [r.name for r in results.values() if r.status != SUCCEEDED]
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+import uuid
+from utils.logger import get_logger
+from utils.state import fingerprint
+
+logger = get_logger("journal")
+
+JOURNAL_VERSION = 1
+
+
+class Journal:
+    """
+    Stack başına append-only operasyon journal'ı (JSON lines). Her kayıt
+    yazıldığı anda fsync'lenir; process öldürülse bile o ana kadar olan
+    her adım diskte kalır.
+
+      begin    {op, run}            apply/destroy başladı
+      intent   {step, fp}           adım başlıyor
+      done     {step, fp, value}    adım tamamlandı
+      failed   {step, error}        adım hata verdi
+      resource {kind, id}           henüz ismine bağlanmamış, faturalanan kaynak
+                                    (örn. alias'ı oluşturulmadan önceki KMS key)
+      settled  {kind, id}           o kaynak sahiplenildi ya da silindi
+
+    Başarıyla biten çalışmanın journal'ı silinir. Dosya duruyorsa önceki
+    çalışma yarıda kalmıştır: aynı operasyon tekrar başlatıldığında
+    tamamlanmış adımlar (aynı fingerprint ile) AWS'e hiç gidilmeden atlanır,
+    sadece yarım kalan ve hiç başlamayan adımlar çalışır.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._completed = {}
+        self._orphans = {}
+        self.resumed = False
+
+    def _read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+
+        records = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Yazılırken kesilen son satır
+                    logger.warning("Journal | Truncated record ignored | %s", self.path)
+                    break
+        if records and records[0].get("version") != JOURNAL_VERSION:
+            logger.warning("Journal | Unsupported journal version, ignoring | %s", records[0].get('version'))
+            return []
+        return records
+
+    def begin(self, op: str, resume: bool = True):
+        """
+        Önceki journal'ı okur ve yeni çalışmayı başlatır. Son çalışma aynı
+        operasyonsa ve resume=True ise tamamlanmış adımları devralır.
+        Sahipsiz kaynaklar (resource kaydı olup settled olmayanlar) her
+        durumda yeni journal'a taşınır.
+        """
+        records = self._read()
+
+        last = max((i for i, r in enumerate(records) if r["event"] == "begin"), default=None)
+        inherited = []
+        if resume and last is not None and records[last]["op"] == op:
+            for record in records[last:]:
+                if record["event"] == "done":
+                    self._completed[record["step"]] = (record["fp"], record["value"])
+                    inherited.append(record)
+            self.resumed = True
+            logger.info(
+                "Journal | Resuming interrupted %s | %s | run=%s | completed=%d",
+                op, self.path, records[last]["run"], len(self._completed)
+            )
+
+        for record in records:
+            if record["event"] == "resource":
+                self._orphans[(record["kind"], record["id"])] = record
+            elif record["event"] == "settled":
+                self._orphans.pop((record["kind"], record["id"]), None)
+
+        # Yeni journal: versiyon, taşınan sahipsiz kaynaklar, begin ve devralınan done kayıtları;
+        # atomik olarak yazılır. Done'lar taşınmazsa devam eden çalışma da kesilirse ilk
+        # çalışmada biten adımlar kaybolur ve üçüncü çalışma onları tekrar çalıştırır.
+        begin = {"event": "begin", "op": op, "run": uuid.uuid4().hex[:12], "ts": round(time.time(), 3)}
+        header = [{"event": "version", "version": JOURNAL_VERSION}, *self._orphans.values(), begin, *inherited]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for record in header:
+                f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        return self
+
+    def _append(self, record: dict):
+        record["ts"] = round(time.time(), 3)
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def completed(self, step: str, fp: str = None):
+        """Yarıda kalan çalışmada aynı fingerprint ile tamamlanmışsa (True, value)."""
+        entry = self._completed.get(step)
+        if entry is not None and entry[0] == fp:
+            return True, entry[1]
+        return False, None
+
+    def intent(self, step: str, fp: str = None):
+        self._append({"event": "intent", "step": step, "fp": fp})
+
+    def done(self, step: str, fp: str, value):
+        self._append({"event": "done", "step": step, "fp": fp, "value": value})
+
+    def failed(self, step: str, error: Exception):
+        self._append({"event": "failed", "step": step, "error": str(error)})
+
+    def resource(self, kind: str, resource_id: str):
+        """Oluşturuldu ama henüz ismine bağlanmadı; çalışma burada kesilirse sahipsiz kalır."""
+        with self._lock:
+            self._orphans[(kind, resource_id)] = {"event": "resource", "kind": kind, "id": resource_id}
+        self._append({"event": "resource", "kind": kind, "id": resource_id})
+
+    def settle(self, kind: str, resource_id: str):
+        with self._lock:
+            if self._orphans.pop((kind, resource_id), None) is None:
+                return
+        self._append({"event": "settled", "kind": kind, "id": resource_id})
+
+    def orphans(self, kind: str) -> list:
+        with self._lock:
+            return [resource_id for k, resource_id in self._orphans if k == kind]
+
+    def end(self, ok: bool):
+        """
+        Başarılı çalışmanın journal'ı silinir (değerler state dosyasında).
+        Sahipsiz kaynak kaldıysa sadece onlar tutulur. Başarısız çalışmanın
+        journal'ı olduğu gibi kalır; bir sonraki çalışma oradan devam eder.
+        """
+        if not ok:
+            logger.info("Journal | Run incomplete, journal kept for resume | %s", self.path)
+            return
+
+        with self._lock:
+            orphans = list(self._orphans.values())
+        if not orphans:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for record in [{"event": "version", "version": JOURNAL_VERSION}, *orphans]:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.warning("Journal | Unsettled resources kept | %s | %d", self.path, len(orphans))
+
+
+def journaled(journal: Journal, name: str, func, inputs: dict = None):
+    """
+    Node fonksiyonunu journal ile sarar: önce intent, bitince done (değeriyle)
+    yazılır. Yarıda kalan çalışma devam ettirilirken aynı girdilerle (bağımlılık
+    değerleri dahil) tamamlanmış node hiçbir AWS çağrısı yapmadan değerini döner.
+    inputs None ise (destroy) fingerprint kullanılmaz.
+    """
+    if journal is None:
+        return func
+
+    def run(**deps):
+        fp = fingerprint({**inputs, **deps}) if inputs is not None else None
+
+        done, value = journal.completed(name, fp)
+        if done:
+            logger.info("Journal | Completed before interruption, skipped | %s", name)
+            return value
+
+        journal.intent(name, fp)
+        try:
+            value = func(**deps)
+        except Exception as e:
+            journal.failed(name, e)
+            raise
+        journal.done(name, fp, value)
+        return value
+
+    return run
@@ -0,0 +1,19 @@
+import importlib
+
+
+def lazy(module: str, name: str):
+    """
+    module.name'i ilk çağrıldığında import eden bir proxy döner.
+    CLI'lar servis modüllerini (ve dolayısıyla boto3/botocore'u) sadece
+    çalışan komut gerçekten ihtiyaç duyduğunda yükler; --help anında açılır.
+    """
+    resolved = []
+
+    def call(*args, **kwargs):
+        if not resolved:
+            resolved.append(getattr(importlib.import_module(module), name))
+        return resolved[0](*args, **kwargs)
+
+    call.__name__ = name
+    call.__qualname__ = f"{module}.{name}"
+    return call
@@ -1,23 +1,165 @@
+import atexit
+import contextvars
+import json
 import logging
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import LOG_FORMAT, LOG_RATE_LIMIT_BURST, LOG_RATE_LIMIT_INTERVAL
 
-def get_logger(name: str = "Cost_opt" , level: str = "INFO"):
+# Bu process'in yaptığı bütün apply/destroy kayıtları (log + audit) aynı run_id'yi taşır
+RUN_ID = uuid.uuid4().hex
+
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# O an çalışan DAG adımı (örn. "apply[us-east-1].ec2"); thread başına ayrı
+_step = contextvars.ContextVar("aegis_log_step", default=None)
+
+
+@contextmanager
+def log_context(step: str):
+    """Bu blokta (bu thread'de) yazılan log kayıtları step alanını taşır."""
+    token = _step.set(step)
+    try:
+        yield
+    finally:
+        _step.reset(token)
+
+
+class JSONFormatter(logging.Formatter):
+    """Satır başına bir JSON obje (JSON Lines)."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", RUN_ID),
+            "step": getattr(record, "step", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    if fmt == "json":
+        return JSONFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Aynı şablondan (logger + %-style mesaj) gelen INFO/DEBUG kayıtlarını
+    interval saniyede en fazla burst adet geçirir. Bastırılan kayıt sayısı
+    bir sonraki geçen kayda eklenir. WARNING ve üstü hiç bastırılmaz.
+    """
+
+    def __init__(self, burst: int = LOG_RATE_LIMIT_BURST, interval: float = LOG_RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+
+            if count >= self.burst:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+
+            self._windows[key] = (start, count + 1, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} | suppressed={suppressed}"
+        return True
+
+
+class _ContextHandler(QueueHandler):
+    """
+    Çağıran thread'de sadece mesajı birleştirip kuyruğa atar; zaman
+    formatlama, JSON serileştirme ve stream I/O listener thread'inde yapılır.
+    """
+
+    def prepare(self, record):
+        record.run_id = RUN_ID
+        record.step = _step.get()
+        # args sonradan değişebilir (örn. bekleyen id listesi); mesaj şimdi sabitlenir
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_queue = queue.SimpleQueue()
+_handler = _ContextHandler(_queue)
+_output = logging.StreamHandler(sys.stderr)
+_output.setFormatter(_formatter(LOG_FORMAT))
+_listener = QueueListener(_queue, _output)
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def _start_listener():
+    global _listener_started
+    with _listener_lock:
+        if not _listener_started:
+            _listener.start()
+            _listener_started = True
+
+
+def _stop_listener():
+    global _listener_started
+    with _listener_lock:
+        if _listener_started:
+            # stop() kuyrukta kalan her kaydı yazdıktan sonra döner
+            _listener.stop()
+            _listener_started = False
+
+
+def flush_logs():
+    """O ana kadar kuyruğa giren bütün kayıtların yazılmasını bekler."""
+    _stop_listener()
+    _output.flush()
+    _start_listener()
+
+
+# audit/metrics atexit hook'larından sonra çalışır (önce import edildiğimiz için)
+atexit.register(_stop_listener)
+
+
+def set_log_format(fmt: str):
+    """'text' (varsayılan) veya 'json' (JSON Lines)."""
+    _output.setFormatter(_formatter(fmt))
+
+
+def get_logger(name: str = "Cost_opt", level: str = "INFO", rate_limit: bool = False):
     logger = logging.getLogger(name)
     logger.propagate = False
 
-    level_value = getattr(logging , level.upper(), logging.INFO)
-
+    level_value = getattr(logging, level.upper(), logging.INFO)
     logger.setLevel(level_value)
-    if not logger.handlers:
-        
-        formatter = logging.Formatter(
-            "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
-
-        handler = logging.StreamHandler()
-        handler.setLevel(level_value)
-        handler.setFormatter(formatter)
 
-        logger.addHandler(handler)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+    if rate_limit and not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter())
 
-    return logger
\ No newline at end of file
+    _start_listener()
+    return logger
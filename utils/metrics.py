@@ -0,0 +1,270 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import METRICS_JSON_FILE, METRICS_PROM_FILE
+from utils.logger import get_logger
+
+logger = get_logger("metrics")
+
+# Prometheus histogram bucket'ları (saniye)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "ProvisionedThroughputExceededException", "TransactionInProgressException",
+    "RequestLimitExceeded", "BandwidthLimitExceeded", "LimitExceededException", "RequestThrottled",
+    "SlowDown", "PriorRequestNotComplete", "EC2ThrottledException",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Bucket sınırlarından yaklaşık quantile (Prometheus histogram_quantile gibi üst sınır)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "max": round(self.max, 4),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class Metrics:
+    """
+    Process genelindeki AWS çağrı ve süre metrikleri.
+      calls:  (service, operation, region) -> latency histogram, hata/retry/throttle, byte sayıları
+      timers: (kind, name) -> süre histogramı (waiter'lar, DAG adımları)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.timers = {}
+
+    def _call(self, key) -> _Call:
+        call = self.calls.get(key)
+        if call is None:
+            call = self.calls[key] = _Call()
+        return call
+
+    def record_call(self, key, latency: float, retries: int = 0, error: bool = False, bytes_received: int = 0):
+        with self._lock:
+            call = self._call(key)
+            call.latency.observe(latency)
+            call.retries += retries
+            call.errors += int(error)
+            call.bytes_received += bytes_received
+
+    def record_sent(self, key, size: int):
+        with self._lock:
+            self._call(key).bytes_sent += size
+
+    def record_throttle(self, key):
+        with self._lock:
+            self._call(key).throttles += 1
+
+    def observe(self, kind: str, name: str, seconds: float):
+        with self._lock:
+            timer = self.timers.get((kind, name))
+            if timer is None:
+                timer = self.timers[(kind, name)] = Histogram()
+            timer.observe(seconds)
+
+    @contextmanager
+    def timer(self, kind: str, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, name, time.perf_counter() - start)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "generated_at": int(time.time()),
+                "aws_calls": [
+                    {
+                        "service": service, "operation": operation, "region": region,
+                        "errors": call.errors, "retries": call.retries, "throttles": call.throttles,
+                        "bytes_sent": call.bytes_sent, "bytes_received": call.bytes_received,
+                        "latency": call.latency.summary(),
+                    }
+                    for (service, operation, region), call in sorted(self.calls.items())
+                ],
+                "timers": [
+                    {"kind": kind, "name": name, "duration": timer.summary()}
+                    for (kind, name), timer in sorted(self.timers.items())
+                ],
+            }
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def histogram(metric, labels, hist):
+            cumulative = 0
+            for bound, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {hist.sum}")
+            lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            calls = sorted(self.calls.items())
+            timers = sorted(self.timers.items())
+
+            lines.append("# TYPE aegis_aws_request_duration_seconds histogram")
+            for (service, operation, region), call in calls:
+                labels = f'service="{service}",operation="{operation}",region="{region}"'
+                histogram("aegis_aws_request_duration_seconds", labels, call.latency)
+
+            for metric, attr in (
+                ("aegis_aws_request_errors_total", "errors"),
+                ("aegis_aws_request_retries_total", "retries"),
+                ("aegis_aws_request_throttles_total", "throttles"),
+                ("aegis_aws_bytes_sent_total", "bytes_sent"),
+                ("aegis_aws_bytes_received_total", "bytes_received"),
+            ):
+                lines.append(f"# TYPE {metric} counter")
+                for (service, operation, region), call in calls:
+                    labels = f'service="{service}",operation="{operation}",region="{region}"'
+                    lines.append(f"{metric}{{{labels}}} {getattr(call, attr)}")
+
+            lines.append("# TYPE aegis_duration_seconds histogram")
+            for (kind, name), timer in timers:
+                histogram("aegis_duration_seconds", f'kind="{kind}",name="{name}"', timer)
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _content_length(headers) -> int:
+    value = headers.get("X-Amz-Decoded-Content-Length") or headers.get("Content-Length") or 0
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def instrument(client, registry: Metrics = metrics):
+    """
+    Client'ın botocore event'lerine metrik hook'larını takar. Hook'lar hiçbir
+    şey döndürmez; botocore'un retry/imzalama davranışı değişmez.
+    """
+    # botocore bu noktada zaten yüklü; modül seviyesinde import CLI açılışını yavaşlatırdı
+    from botocore.utils import determine_content_length
+
+    region = client.meta.region_name
+    service = client.meta.service_model.service_name
+    events = client.meta.events
+
+    def key(operation_name):
+        return service, operation_name, region
+
+    def before_call(model, context, **kwargs):
+        context["aegis_metrics_start"] = time.perf_counter()
+
+    def request_created(request, operation_name, **kwargs):
+        # Header'lar henüz hazırlanmadı; gövde boyutu doğrudan ölçülür (stream'ler seek/tell ile)
+        if request.body:
+            registry.record_sent(key(operation_name), determine_content_length(request.body) or 0)
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        start = context.get("aegis_metrics_start")
+        if start is None:
+            return
+        registry.record_call(
+            key(model.name),
+            time.perf_counter() - start,
+            retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+            error=http_response.status_code >= 300,
+            bytes_received=_content_length(http_response.headers)
+        )
+
+    def after_call_error(model, context, **kwargs):
+        start = context.get("aegis_metrics_start")
+        if start is not None:
+            registry.record_call(key(model.name), time.perf_counter() - start, error=True)
+
+    def needs_retry(response=None, operation=None, **kwargs):
+        # Her deneme için çağrılır; sadece throttle cevaplarını sayar
+        if response is not None and operation is not None:
+            code = response[1].get("Error", {}).get("Code")
+            if code in THROTTLE_CODES:
+                registry.record_throttle(key(operation.name))
+
+    events.register("before-call", before_call, unique_id="aegis-metrics-before-call")
+    events.register("request-created", request_created, unique_id="aegis-metrics-request-created")
+    events.register("after-call", after_call, unique_id="aegis-metrics-after-call")
+    events.register("after-call-error", after_call_error, unique_id="aegis-metrics-after-call-error")
+    # Retry handler sleep süresi döndüğünde emit durur; throttle'ları görebilmek için önce biz çalışırız
+    events.register_first("needs-retry", needs_retry, unique_id="aegis-metrics-needs-retry")
+    return client
+
+
+def _write(path: str, content: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def write_metrics_report(json_path: str = METRICS_JSON_FILE, prom_path: str = METRICS_PROM_FILE):
+    """Run sonunda JSON raporu ve Prometheus textfile'ı yazar (node_exporter textfile collector)."""
+    report = metrics.report()
+    if not report["aws_calls"] and not report["timers"]:
+        return None
+
+    _write(json_path, json.dumps(report, indent=2))
+    _write(prom_path, metrics.prometheus())
+
+    calls = sum(c["latency"]["count"] for c in report["aws_calls"])
+    retries = sum(c["retries"] for c in report["aws_calls"])
+    throttles = sum(c["throttles"] for c in report["aws_calls"])
+    logger.info(
+        "Metrics | calls=%s | retries=%s | throttles=%s | %s | %s",
+        calls, retries, throttles, json_path, prom_path
+    )
+    return report
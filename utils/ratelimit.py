@@ -0,0 +1,150 @@
+import threading
+import time
+from config import (
+    RATE_LIMITS, RATE_LIMIT_DEFAULT, RATE_LIMIT_MIN_RATE, RATE_LIMIT_MAX_CONCURRENCY, RATE_LIMIT_DECREASE_INTERVAL
+)
+from utils.logger import get_logger
+from utils.metrics import metrics, THROTTLE_CODES
+
+logger = get_logger("ratelimit")
+
+# Hesap genelinde limitlenen servisler; client region'ı ne olursa olsun tek limiter
+GLOBAL_SERVICES = {"iam"}
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket + AIMD eşzamanlılık limiti.
+      - rate:  saniyede izin verilen istek (token dolum hızı), burst kadar birikebilir
+      - limit: aynı anda uçuşta olabilecek istek sayısı
+    Başarılı her çağrıda ikisi de toplamsal artar (limit pencere başına ~+1,
+    rate max_rate/20), throttle cevabında ikisi de yarıya iner. Aynı anda
+    dönen bir throttle dalgası tek bir düşüş sayılır (decrease_interval).
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY,
+                 min_rate: float = RATE_LIMIT_MIN_RATE, decrease_interval: float = RATE_LIMIT_DECREASE_INTERVAL):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.decrease_interval = decrease_interval
+        self.throttles = 0
+
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._decreased = 0.0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _take(self, slot: bool) -> float:
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                has_slot = not slot or self._in_flight < int(self.limit)
+                if self._tokens >= 1 and has_slot:
+                    self._tokens -= 1
+                    if slot:
+                        self._in_flight += 1
+                    return now - start
+                # Slot yoksa release() uyandırır; token yoksa dolum süresi kadar beklenir
+                self._cond.wait((1 - self._tokens) / self.rate if self._tokens < 1 else None)
+
+    def acquire(self) -> float:
+        """Bir token ve bir eşzamanlılık slotu alır; beklenen süreyi döner."""
+        return self._take(slot=True)
+
+    def acquire_retry(self) -> float:
+        """Retry denemesi: slot zaten bu çağrıda, sadece token alınır."""
+        return self._take(slot=False)
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if not throttled:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._decreased < self.decrease_interval:
+                return
+            self._decreased = now
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.limit = max(1.0, self.limit / 2)
+            # Birikmiş burst da kısılır; aksi halde düşüşten hemen sonra yine patlama olur
+            self._tokens = min(self._tokens, 1.0)
+            rate, limit = self.rate, int(self.limit)
+
+        logger.warning("RateLimit | Throttled, backing off | %s | rate=%.1f/s | concurrency=%d", self.name, rate, limit)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(service: str, region: str) -> AdaptiveLimiter:
+    """(service, region) başına process genelinde tek limiter; bütün client'lar paylaşır."""
+    key = (service, "global" if service in GLOBAL_SERVICES else region)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                rate, burst = RATE_LIMITS.get(service, RATE_LIMIT_DEFAULT)
+                limiter = _limiters[key] = AdaptiveLimiter(f"{key[0]}.{key[1]}", rate, burst)
+    return limiter
+
+
+def rate_limit(client):
+    """
+    Client'ın her API çağrısını (service, region) limiter'ından geçirir.
+    Çağrı başında slot + token, her retry denemesinde ek bir token alınır;
+    throttle cevapları limiter'ı yavaşlatır.
+    """
+    service = client.meta.service_model.service_name
+    limiter = limiter_for(service, client.meta.region_name)
+    events = client.meta.events
+
+    def before_call(model, context, **kwargs):
+        waited = limiter.acquire()
+        context["aegis_rate_limited"] = True
+        if waited > 0.001:
+            metrics.observe("ratelimit_wait", f"{limiter.name}.{model.name}", waited)
+
+    def request_created(request, **kwargs):
+        context = getattr(request, "context", {}) or {}
+        if context.get("aegis_rate_limited") and context.get("retries", {}).get("attempt", 1) > 1:
+            limiter.acquire_retry()
+
+    def after_call(parsed, context, **kwargs):
+        if context.pop("aegis_rate_limited", False):
+            limiter.release(throttled=parsed.get("Error", {}).get("Code") in THROTTLE_CODES)
+
+    def after_call_error(context, **kwargs):
+        if context.pop("aegis_rate_limited", False):
+            limiter.release()
+
+    def needs_retry(response=None, **kwargs):
+        if response is not None and response[1].get("Error", {}).get("Code") in THROTTLE_CODES:
+            limiter.on_throttle()
+
+    events.register("before-call", before_call, unique_id="aegis-ratelimit-before-call")
+    events.register("request-created", request_created, unique_id="aegis-ratelimit-request-created")
+    events.register("after-call", after_call, unique_id="aegis-ratelimit-after-call")
+    events.register("after-call-error", after_call_error, unique_id="aegis-ratelimit-after-call-error")
+    events.register_first("needs-retry", needs_retry, unique_id="aegis-ratelimit-needs-retry")
+    return client
@@ -1,9 +1,15 @@
-import boto3
-from typing import TYPE_CHECKING, overload, Literal
+import threading
+from typing import TYPE_CHECKING, Optional, overload, Literal
+from config import AWS_MAX_POOL_CONNECTIONS, AWS_RETRY_MODE, AWS_MAX_ATTEMPTS
+from utils.metrics import instrument
+from utils.ratelimit import rate_limit
 
 # Bu blok sadece sen kod yazarken çalışır (IDE için),
 # Kod çalıştırıldığında (Runtime) burası atlanır, performans kaybı olmaz.
+# boto3/botocore import'u ~200ms sürer; runtime'da ilk client istendiğinde yüklenir.
 if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
     from mypy_boto3_ec2 import EC2Client
     from mypy_boto3_iam import IAMClient
     from mypy_boto3_s3 import S3Client
@@ -13,48 +19,103 @@ if TYPE_CHECKING:
 
 AWSService = Literal['ec2','dynamodb','s3','kms','iam','ssm']
 
+
+def _config_key(config: Optional["Config"]) -> tuple:
+    """Config hashable değil; kullanıcının verdiği seçeneklerden bir cache anahtarı üretir."""
+    if config is None:
+        return ()
+    options = getattr(config, "_user_provided_options", {})
+    return tuple(sorted((name, repr(value)) for name, value in options.items()))
+
+
 class AWSSessionManager:
+    """
+    Process genelinde tek client havuzu. Verilen her client'a paylaşılan
+    rate limiter (bkz. utils/ratelimit.py) ve metrik hook'ları
+    (bkz. utils/metrics.py) takılır.
+    boto3 Session thread-safe değildir, client'lar ise oluşturulduktan sonra
+    thread-safe'tir. Bu yüzden Session/client oluşturma tek bir lock altında
+    yapılır, oluşturulan client (service, region, profile, config) anahtarıyla
+    cache'lenir ve tüm thread'ler aynı client'ı (ve connection pool'u) paylaşır.
+    """
     _instance = None
-    
-    def __init__(self):
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_pool_connections: int = AWS_MAX_POOL_CONNECTIONS):
         self._session = {}
+        self._clients = {}
+        self._lock = threading.RLock()
+        self.max_pool_connections = max_pool_connections
 
     @classmethod
     def get_instance(cls):
         """Singleton Pattern: Her yerden aynı yöneticiye ulaşmak için."""
         if cls._instance is None:
-            cls._instance = cls()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
         return cls._instance
 
-    def get_session(self, region: str = "us-east-1") -> boto3.Session:
-        if region not in self._session:
-            # Burada ileride profil veya assume role mantığı ekleyebilirsin
-            self._session[region] = boto3.Session(region_name=region)
-        return self._session[region]
+    def get_session(self, region: str = "us-east-1", profile: Optional[str] = None) -> "boto3.Session":
+        import boto3
+
+        with self._lock:
+            key = (region, profile)
+            if key not in self._session:
+                # Burada ileride assume role mantığı ekleyebilirsin
+                self._session[key] = boto3.Session(region_name=region, profile_name=profile)
+            return self._session[key]
 
     # --- SİHİRLİ KISIM: OVERLOADLAR ---
     # IDE'ye diyoruz ki: Eğer sana 'ec2' stringi gelirse, EC2Client tipinde dön.
-    
+
     @overload
-    def get_client(self, service_name: Literal['ec2'], region: str = "us-east-1") -> "EC2Client": ...
+    def get_client(self, service_name: Literal['ec2'], region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None) -> "EC2Client": ...
 
     @overload
-    def get_client(self, service_name: Literal['kms'], region: str = "us-east-1") -> "KMSClient": ...
+    def get_client(self, service_name: Literal['kms'], region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None) -> "KMSClient": ...
 
     @overload
-    def get_client(self, service_name: Literal['s3'], region: str = "us-east-1") -> "S3Client": ...
+    def get_client(self, service_name: Literal['s3'], region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None) -> "S3Client": ...
 
     @overload
-    def get_client(self, service_name: Literal['dynamodb'], region: str = "us-east-1") -> "DynamoDBClient": ...
+    def get_client(self, service_name: Literal['dynamodb'], region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None) -> "DynamoDBClient": ...
 
     @overload
-    def get_client(self, service_name: Literal['iam'], region: str = "us-east-1") -> "IAMClient": ...
+    def get_client(self, service_name: Literal['iam'], region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None) -> "IAMClient": ...
 
     @overload
-    def get_client(self, service_name: Literal['ssm'], region: str = "us-east-1") -> "SSMClient": ...
+    def get_client(self, service_name: Literal['ssm'], region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None) -> "SSMClient": ...
 
 
     # --- GERÇEK ÇALIŞAN KOD ---
-    def get_client(self, service_name: AWSService, region: str = "us-east-1"):
-        session = self.get_session(region)
-        return session.client(service_name)
\ No newline at end of file
+    def get_client(self, service_name: AWSService, region: str = "us-east-1", profile: Optional[str] = None, config: Optional["Config"] = None):
+        key = (service_name, region, profile, _config_key(config))
+
+        # Hızlı yol: cache'te varsa lock almadan dön
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        from botocore.config import Config
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                base = Config(
+                    max_pool_connections=self.max_pool_connections,
+                    retries={"mode": AWS_RETRY_MODE, "max_attempts": AWS_MAX_ATTEMPTS}
+                )
+                merged = base.merge(config) if config is not None else base
+                # Limiter önce takılır: kuyrukta beklenen süre latency metriğine girmez
+                client = instrument(rate_limit(self.get_session(region, profile).client(service_name, config=merged)))
+                self._clients[key] = client
+            return client
+
+    def shutdown(self):
+        """Tüm client'ların connection pool'larını kapatır ve cache'i temizler."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._session.clear()
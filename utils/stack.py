@@ -0,0 +1,240 @@
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from config import (
+    AWS_REGION, AWS_ACCOUNT_ID, S3_BUCKET_NAME, DYNAMODB_TABLE_NAME, DYNAMODB_BILLING_MODE,
+    IAM_ROLE_NAME, IAM_INSTANCE_PROFILE_NAME, IAM_INLINE_POLICY_NAME,
+    EC2_KEY_PAIR_NAME, EC2_SECURITY_GROUP_NAME, EC2_INSTANCE_TAG_NAME, EC2_WORKER_COUNT,
+    SSH_ALLOWED_CIDR, SSM_AMI_PARAMETER, KMS_ALIAS_NAME, STATE_FILE, STACK_STATE_DIR,
+    STACK_TAG_KEY, RESOURCE_TAG_KEY, EC2_WARM_POOL_SIZE
+)
+from utils.logger import get_logger
+
+logger = get_logger("stack")
+
+
+@dataclass(frozen=True)
+class Stack:
+    """Tek bir region'da yönetilen Aegis kaynaklarının isimleri."""
+    region: str
+    account_id: str
+    bucket_name: str
+    table_name: str
+    billing_mode: str
+    role_name: str
+    profile_name: str
+    policy_name: str
+    key_pair_name: str
+    security_group_name: str
+    instance_tag: str
+    worker_count: int
+    ssh_cidr: str
+    ami_parameter: str
+    kms_alias: str
+    state_file: str
+    # Spec dosyasından gelen stack'lerin adı; config.py'deki tek stack için None
+    name: str = None
+    # Çalışan worker'lara ek olarak durdurulmuş bekletilen instance sayısı
+    warm_pool: int = EC2_WARM_POOL_SIZE
+
+    @property
+    def label(self) -> str:
+        """Log, DAG ve rapor satırlarında stack'i tanımlayan kısa ad."""
+        return self.name or self.region
+
+    def tags(self, resource: str) -> dict:
+        """Kaynağa oluşturulurken yazılan tag'ler; drift.py bunlarla keşfeder (örn. resource="ec2.key_pair")."""
+        return {STACK_TAG_KEY: self.label, RESOURCE_TAG_KEY: resource}
+
+    @property
+    def journal_file(self) -> str:
+        """State dosyasının yanındaki operasyon journal'ı (bkz. utils/journal.py)."""
+        return self.state_file.rsplit(".json", 1)[0] + ".journal"
+
+    @property
+    def bucket_arn(self) -> str:
+        return f"arn:aws:s3:::{self.bucket_name}"
+
+    @property
+    def table_arn(self) -> str:
+        return f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{self.table_name}"
+
+
+def stack_for_region(region: str = AWS_REGION, worker_count: int = EC2_WORKER_COUNT,
+                     warm_pool: int = EC2_WARM_POOL_SIZE) -> Stack:
+    """
+    Ana region config.py'deki isimleri birebir kullanır. Diğer region'larda
+    global isim alanındaki kaynaklar (S3 bucket, IAM role/profile) ve state
+    dosyası region ekiyle ayrılır; böylece her region'ın policy'si sadece
+    kendi ARN'lerine izin verir ve stack'ler birbirinin üzerine yazmaz.
+    """
+    if region == AWS_REGION:
+        suffix, state_file = "", STATE_FILE
+    else:
+        suffix = f"-{region}"
+        state_file = STATE_FILE.replace(".json", f"{suffix}.json")
+
+    return Stack(
+        region=region,
+        account_id=AWS_ACCOUNT_ID,
+        bucket_name=f"{S3_BUCKET_NAME}{suffix}",
+        table_name=DYNAMODB_TABLE_NAME,
+        billing_mode=DYNAMODB_BILLING_MODE,
+        role_name=f"{IAM_ROLE_NAME}{suffix}",
+        profile_name=f"{IAM_INSTANCE_PROFILE_NAME}{suffix}",
+        policy_name=IAM_INLINE_POLICY_NAME,
+        key_pair_name=EC2_KEY_PAIR_NAME,
+        security_group_name=EC2_SECURITY_GROUP_NAME,
+        instance_tag=EC2_INSTANCE_TAG_NAME,
+        worker_count=worker_count,
+        ssh_cidr=SSH_ALLOWED_CIDR,
+        ami_parameter=SSM_AMI_PARAMETER,
+        kms_alias=KMS_ALIAS_NAME,
+        state_file=state_file,
+        warm_pool=warm_pool
+    )
+
+
+# S3 bucket adına da girdiği için küçük harf, rakam ve tire
+STACK_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,29}$")
+# Spec'te stack başına değiştirilebilen alanlar (isimler varsayılan olarak stack adıyla türetilir)
+SPEC_FIELDS = {f.name for f in fields(Stack)} - {"account_id", "name"}
+
+
+def stack_for_spec(name: str, region: str = AWS_REGION, **overrides) -> Stack:
+    """
+    Spec'teki tek bir stack. Hesap/region içinde tekil olması gereken bütün
+    isimler (bucket, tablo, role, profile, key pair, SG, instance tag, KMS
+    alias) ve state dosyası stack adıyla ayrılır; overrides bunları ezebilir.
+    """
+    if not STACK_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid stack name: {name!r} (lowercase letters, digits and '-', max 30)")
+
+    unknown = set(overrides) - SPEC_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown stack fields | {name} | {', '.join(sorted(unknown))}")
+
+    suffix = f"-{name}"
+    defaults = dict(
+        region=region,
+        account_id=AWS_ACCOUNT_ID,
+        bucket_name=f"{S3_BUCKET_NAME}{suffix}",
+        table_name=f"{DYNAMODB_TABLE_NAME}{suffix}",
+        billing_mode=DYNAMODB_BILLING_MODE,
+        role_name=f"{IAM_ROLE_NAME}{suffix}",
+        profile_name=f"{IAM_INSTANCE_PROFILE_NAME}{suffix}",
+        policy_name=IAM_INLINE_POLICY_NAME,
+        key_pair_name=f"{EC2_KEY_PAIR_NAME}{suffix}",
+        security_group_name=f"{EC2_SECURITY_GROUP_NAME}{suffix}",
+        instance_tag=f"{EC2_INSTANCE_TAG_NAME}{suffix}",
+        worker_count=EC2_WORKER_COUNT,
+        ssh_cidr=SSH_ALLOWED_CIDR,
+        ami_parameter=SSM_AMI_PARAMETER,
+        kms_alias=f"{KMS_ALIAS_NAME}{suffix}",
+        state_file=f"{STACK_STATE_DIR}/{name}.json",
+        name=name,
+        warm_pool=EC2_WARM_POOL_SIZE
+    )
+    return Stack(**{**defaults, **overrides})
+
+
+def load_stack_spec(path: str, names=None) -> list:
+    """
+    Spec dosyası (JSON):
+      {"defaults": {"region": "eu-west-1", "worker_count": 2},
+       "stacks": [{"name": "tenant-a"}, {"name": "tenant-b", "region": "us-east-1"}]}
+    defaults her stack'e uygulanır, stack'teki alanlar defaults'u ezer.
+    names verilirse sadece o stack'ler döner.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+
+    defaults = spec.get("defaults", {})
+    stacks, seen = [], set()
+    for entry in spec.get("stacks", []):
+        entry = {**defaults, **entry}
+        name = entry.pop("name", None)
+        if not name:
+            raise ValueError(f"Stack without a name in {path}")
+        if name in seen:
+            raise ValueError(f"Duplicate stack name in {path}: {name}")
+        seen.add(name)
+        stacks.append(stack_for_spec(name, **entry))
+
+    if names:
+        missing = set(names) - seen
+        if missing:
+            raise ValueError(f"Stacks not in {path}: {', '.join(sorted(missing))}")
+        stacks = [stack for stack in stacks if stack.name in names]
+
+    logger.info("Stack spec loaded | %s | stacks=%d", path, len(stacks))
+    return stacks
+
+
+class StackResult:
+    def __init__(self, name: str):
+        self.name = name
+        self.ok = False
+        self.value = None
+        self.error = None
+        self.duration = 0.0
+
+
+def fan_out(regions, func, max_parallel: int, **stack_options) -> dict:
+    """
+    func(stack) her region için ayrı bir thread'de çalışır. Her region kendi
+    client'larını kullanır (AWSSessionManager region bazında cache'ler).
+    Bir region'ın hatası diğerlerini durdurmaz. stack_options her region'ın
+    Stack'ine aynen geçer (örn. worker_count).
+    """
+    regions = list(dict.fromkeys(regions))
+    results = {region: StackResult(region) for region in regions}
+
+    def run(region):
+        result = results[region]
+        start = time.perf_counter()
+        try:
+            result.value = func(stack_for_region(region, **stack_options))
+            result.ok = True
+        except Exception as e:
+            result.error = e
+            logger.error("Region failed | %s | %s", region, e)
+        result.duration = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(regions))), thread_name_prefix="region") as pool:
+        list(pool.map(run, regions))
+
+    return results
+
+
+def stack_outcomes(stacks, runs: dict, outcome) -> dict:
+    """run_graphs sonuçlarını stack başına StackResult'a çevirir; outcome hata fırlatırsa stack failed."""
+    results = {}
+    for stack in stacks:
+        nodes = runs[stack.label]
+        result = results[stack.label] = StackResult(stack.label)
+        # Stack'in ilk node'unun başlangıcından son node'unun bitişine kadar geçen süre
+        started = [r.started for r in nodes.values() if r.started is not None]
+        if started:
+            result.duration = max(r.started + r.duration for r in nodes.values() if r.started is not None) - min(started)
+        try:
+            result.value = outcome(stack, nodes)
+            result.ok = True
+        except Exception as e:
+            result.error = e
+            logger.error("Stack failed | %s | %s", stack.label, e)
+    return results
+
+
+def format_stack_report(results: dict, title: str = "REGION") -> str:
+    width = max([len(name) for name in results] + [len(title)])
+
+    lines = [f"{title.ljust(width)}  {'STATUS':<9}  {'DURATION':>8}  RESULT"]
+    for result in results.values():
+        status = "succeeded" if result.ok else "failed"
+        detail = result.value if result.ok else result.error
+        lines.append(f"{result.name.ljust(width)}  {status:<9}  {result.duration:>7.2f}s  {str(detail)[:80]}")
+
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from utils.logger import get_logger
+
+logger = get_logger("state")
+
+STATE_VERSION = 1
+
+
+def fingerprint(inputs: dict) -> str:
+    """Kaynağı oluşturan girdilerin kanonik JSON'u üzerinden sha256."""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    """
+    Terraform state dosyasına benzer yerel kayıt: kaynak adı -> değer,
+    girdi fingerprint'i ve güncellenme zamanı. Her yazımda dosya atomik
+    olarak (tmp + os.replace) yeniden yazılır, böylece yarıda kesilen bir
+    apply o ana kadar oluşturulan kaynakları kaybetmez.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._resources = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("State | Unreadable state file, ignoring | %s | %s", self.path, e)
+            return {}
+
+        if data.get("version") != STATE_VERSION:
+            logger.warning("State | Unsupported state version, ignoring | %s", data.get('version'))
+            return {}
+
+        return data.get("resources", {})
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": STATE_VERSION, "resources": self._resources}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, name: str):
+        with self._lock:
+            return self._resources.get(name)
+
+    def put(self, name: str, value, fp: str):
+        with self._lock:
+            self._resources[name] = {
+                "value": value,
+                "fingerprint": fp,
+                "updated": int(time.time())
+            }
+            self._save()
+
+    def remove(self, *names):
+        with self._lock:
+            for name in names:
+                self._resources.pop(name, None)
+            self._save()
+
+    def resolve(self, name: str, inputs: dict, create, verify=None, trust: bool = False):
+        """
+        Kayıt aynı fingerprint ile mevcutsa:
+          trust=True   -> hiçbir AWS çağrısı yapmadan kayıtlı değeri döner
+          verify(value) -> tek ucuz existence check; True ise kayıtlı değeri döner
+        Aksi halde create() çalışır ve sonucu kaydedilir.
+        """
+        fp = fingerprint(inputs)
+        record = self.get(name)
+
+        if record and record["fingerprint"] == fp:
+            if trust:
+                logger.info("State | Trusted | %s", name)
+                return record["value"]
+
+            if verify is not None and verify(record["value"]):
+                logger.info("State | Verified, no changes | %s", name)
+                return record["value"]
+
+            logger.info("State | Recorded resource not confirmed, reconciling | %s", name)
+        elif record:
+            logger.info("State | Inputs changed, reconciling | %s", name)
+
+        value = create()
+        self.put(name, value, fp)
+        return value
@@ -1,48 +1,362 @@
-from clients.ec2_client import get_ec2_client
-from clients.dynamodb_client import get_dynamodb_client
-from clients.kms_client import get_kms_client
+import random
+import threading
+import time
+from botocore.exceptions import ClientError
+from config import AWS_REGION, IAM_PROPAGATION_TIMEOUT, EC2_READY_TAG_KEY, EC2_READY_TIMEOUT
+from utils.session import AWSSessionManager
 from utils.logger import get_logger
+from utils.metrics import metrics
 
+# Çok sayıda kaynak/region aynı anda beklerken tekrarlayan satırlar rate limit'e takılır
 logger = get_logger("waiters")
+manager = AWSSessionManager.get_instance()
 
+DEFAULT_TIMEOUT = 600
+DEFAULT_INITIAL_DELAY = 0.5
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_BACKOFF_FACTOR = 1.7
 
-def wait_for_ec2_running(instance_id):
-    ec2 = get_ec2_client()
-    logger.info(f"EC2 | Waiting for instance to be running | {instance_id}")
+# describe_instances "instance-id" filtresi için güvenli batch boyutu
+EC2_FILTER_BATCH = 200
 
-    waiter = ec2.get_waiter("instance_running")
-    waiter.wait(InstanceIds=[instance_id])
+_cancel_all = threading.Event()
 
-    logger.info(f"EC2 | Instance is running | {instance_id}")
 
+class WaiterError(Exception):
+    pass
 
-def wait_for_ec2_terminated(instance_ids):
-    ec2 = get_ec2_client()
-    logger.info(f"EC2 | Waiting for instances termination | {instance_ids}")
 
-    waiter = ec2.get_waiter("instance_terminated")
-    waiter.wait(InstanceIds=instance_ids)
+class WaiterTimeout(WaiterError):
+    pass
+
+
+class WaiterCancelled(WaiterError):
+    pass
+
+
+class WaiterFailed(WaiterError):
+    """Kaynak hedef duruma bir daha ulaşamayacak bir duruma geçti."""
+    pass
 
-    logger.info("EC2 | Instances terminated")
 
+def cancel_all():
+    """Çalışan tüm waiter'ları bir sonraki poll'da durdurur (örn. Ctrl+C)."""
+    _cancel_all.set()
 
-def wait_for_dynamodb_active(table_name):
-    dynamodb = get_dynamodb_client()
-    logger.info(f"DynamoDB | Waiting for table to become ACTIVE | {table_name}")
 
-    waiter = dynamodb.get_waiter("table_exists")
-    waiter.wait(TableName=table_name)
+def reset_cancel():
+    _cancel_all.clear()
 
-    logger.info(f"DynamoDB | Table is ACTIVE | {table_name}")
 
+def backoff_delays(initial=DEFAULT_INITIAL_DELAY, maximum=DEFAULT_MAX_DELAY, factor=DEFAULT_BACKOFF_FACTOR):
+    """
+    Exponential backoff + "equal jitter": her adımda gecikmenin yarısı sabit,
+    yarısı rastgele. İlk poll'lar hızlı, uzun beklemeler seyrek olur.
+    """
+    delay = initial
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(maximum, delay * factor)
+
+
+def _cancelled(cancel_event) -> bool:
+    return _cancel_all.is_set() or (cancel_event is not None and cancel_event.is_set())
 
-def wait_for_kms_enabled(key_id):
-    kms = get_kms_client()
-    logger.info(f"KMS | Waiting for key to be enabled | {key_id}")
 
+def _sleep(delay, cancel_event):
+    end = time.monotonic() + delay
     while True:
-        meta = kms.describe_key(KeyId=key_id)["KeyMetadata"]
-        if meta["KeyState"] == "Enabled":
-            break
+        if _cancelled(cancel_event):
+            raise WaiterCancelled("Waiter cancelled")
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return
+        # İki event'i de dinleyebilmek için kısa dilimlerle bekliyoruz
+        _cancel_all.wait(min(remaining, 0.25))
+
+
+def wait_until(
+    probe,
+    description: str,
+    timeout: float = DEFAULT_TIMEOUT,
+    initial_delay: float = DEFAULT_INITIAL_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    cancel_event: threading.Event = None
+) -> int:
+    """
+    probe() True dönene kadar backoff ile poll eder. Deadline aşılırsa
+    WaiterTimeout, iptal edilirse WaiterCancelled fırlatır.
+    probe() terminal bir hata durumunda WaiterFailed fırlatabilir.
+    Yapılan poll sayısını döner.
+    """
+    deadline = time.monotonic() + timeout
+    delays = backoff_delays(initial_delay, max_delay)
+    polls = 0
+
+    # description'ın ilk kısmı (örn. "DynamoDB ACTIVE") metrik adıdır; kaynak id'leri girmez
+    with metrics.timer("waiter", description.split(" | ")[0]):
+        while True:
+            polls += 1
+            if probe():
+                logger.debug("Waiter | Ready | %s | polls=%d", description, polls)
+                return polls
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WaiterTimeout(f"Timed out after {timeout}s | {description}")
+
+            _sleep(min(next(delays), remaining), cancel_event)
+
+
+def wait_for_all(
+    resource_ids,
+    fetch_states,
+    is_ready,
+    description: str,
+    is_failed=None,
+    on_ready=None,
+    timeout: float = DEFAULT_TIMEOUT,
+    initial_delay: float = DEFAULT_INITIAL_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    cancel_event: threading.Event = None
+) -> dict:
+    """
+    Birden fazla kaynağı tek bir poll döngüsünde bekler.
+    fetch_states(pending_ids) -> {id: state} tek (veya sayfalanmış) bir
+    describe çağrısıyla sadece hâlâ bekleyen kaynakların durumunu döner.
+    Hazır olan kaynaklar bir sonraki poll'dan çıkarılır.
+    on_ready(id, state) her kaynak hazır olduğu anda çağrılır.
+    """
+    pending = list(dict.fromkeys(resource_ids))
+    final = {}
+
+    def probe():
+        states = fetch_states(list(pending))
+        still_pending = []
+
+        for rid in pending:
+            state = states.get(rid)
+            if is_failed is not None and is_failed(state):
+                raise WaiterFailed(f"{description} | {rid} entered state {state}")
+            if is_ready(state):
+                final[rid] = state
+                if on_ready is not None:
+                    on_ready(rid, state)
+            else:
+                still_pending.append(rid)
+
+        pending[:] = still_pending
+        if pending:
+            logger.debug("Waiter | %s | ready=%d | pending=%d", description, len(final), len(pending))
+        return not pending
+
+    if pending:
+        wait_until(probe, description, timeout, initial_delay, max_delay, cancel_event)
+
+    return final
+
+
+# --- EC2 ---
+
+def describe_ec2_instances(instance_ids, region: str = AWS_REGION) -> dict:
+    """Verilen instance'ları batch'ler halinde describe_instances ile çeker: {id: instance}."""
+    ec2 = manager.get_client('ec2', region=region)
+    paginator = ec2.get_paginator("describe_instances")
+    instances = {}
+
+    for i in range(0, len(instance_ids), EC2_FILTER_BATCH):
+        batch = instance_ids[i:i + EC2_FILTER_BATCH]
+        # Filters kullanıyoruz: yeni oluşturulan instance'lar için
+        # InvalidInstanceID.NotFound (eventual consistency) hatası alınmaz.
+        pages = paginator.paginate(Filters=[{"Name": "instance-id", "Values": batch}])
+        for page in pages:
+            for res in page["Reservations"]:
+                for ins in res["Instances"]:
+                    instances[ins["InstanceId"]] = ins
+
+    return instances
+
+
+def fetch_ec2_states(instance_ids, region: str = AWS_REGION) -> dict:
+    """Bütün bekleyen instance'ların durumunu tek (sayfalanmış) describe_instances ile çeker."""
+    return {
+        instance_id: ins["State"]["Name"]
+        for instance_id, ins in describe_ec2_instances(instance_ids, region).items()
+    }
+
+
+def wait_for_ec2_state(instance_ids, target: str, failed_states=(), missing_is_ready=False, region: str = AWS_REGION, **kwargs) -> dict:
+    """
+    missing_is_ready: describe sonucunda hiç görünmeyen instance'ı hazır say
+    (terminate sonrası kaybolan instance'lar için).
+    """
+    if isinstance(instance_ids, str):
+        instance_ids = [instance_ids]
+
+    description = f"EC2 {target} | x{len(instance_ids)}"
+
+    return wait_for_all(
+        instance_ids,
+        lambda ids: fetch_ec2_states(ids, region),
+        is_ready=lambda state: state == target or (missing_is_ready and state is None),
+        is_failed=lambda state: state in failed_states,
+        description=description,
+        **kwargs
+    )
+
+
+def wait_for_ec2_running(instance_ids, region: str = AWS_REGION, **kwargs):
+    logger.info("EC2 | Waiting for instance to be running | %s", instance_ids)
+
+    wait_for_ec2_state(instance_ids, "running", failed_states=("shutting-down", "terminated"), region=region, **kwargs)
+
+    logger.info("EC2 | Instance is running | %s", instance_ids)
+
+
+def wait_for_ec2_ready(instance_ids, region: str = AWS_REGION, timeout: float = EC2_READY_TIMEOUT,
+                       started=(), **kwargs):
+    """
+    "running" worker'ın kullanılabilir olduğunu göstermez; user data kurulumu
+    bittiğinde instance kendini EC2_READY_TAG_KEY ile tag'ler. Durum ve tag
+    aynı describe_instances çağrısından gelir, poll maliyeti running ile aynı.
+
+    started: az önce start_instances ile başlatılan instance'lar. Describe
+    eventually consistent olduğundan bunlar bir süre daha stopped/stopping
+    görünebilir; onlar için bu durumlar hata sayılmaz, beklenmeye devam edilir.
+    """
+    if isinstance(instance_ids, str):
+        instance_ids = [instance_ids]
+    started = set(started)
+
+    logger.info("EC2 | Waiting for workers to finish setup | %s", instance_ids)
+
+    def fetch(ids):
+        return {
+            instance_id: (
+                ins["State"]["Name"],
+                any(t["Key"] == EC2_READY_TAG_KEY for t in ins.get("Tags", [])),
+                instance_id in started
+            )
+            for instance_id, ins in describe_ec2_instances(ids, region).items()
+        }
+
+    def is_failed(state):
+        if state is None:
+            return False
+        name, _, just_started = state
+        return name in ("shutting-down", "terminated") or (not just_started and name in ("stopping", "stopped"))
+
+    wait_for_all(
+        instance_ids,
+        fetch,
+        is_ready=lambda state: state is not None and state[:2] == ("running", True),
+        is_failed=is_failed,
+        description=f"EC2 ready | x{len(instance_ids)}",
+        timeout=timeout,
+        **kwargs
+    )
+
+    logger.info("EC2 | Workers ready | %s", instance_ids)
+
+
+def wait_for_image_available(image_id: str, region: str = AWS_REGION, **kwargs):
+    ec2 = manager.get_client('ec2', region=region)
+    logger.info("EC2 | Waiting for image to be available | %s", image_id)
+
+    def fetch(ids):
+        images = ec2.describe_images(Filters=[{"Name": "image-id", "Values": ids}])["Images"]
+        return {image["ImageId"]: image["State"] for image in images}
+
+    wait_for_all(
+        [image_id],
+        fetch,
+        is_ready=lambda state: state == "available",
+        is_failed=lambda state: state in ("failed", "error", "invalid", "deregistered"),
+        description=f"EC2 image available | {image_id}",
+        **kwargs
+    )
+
+    logger.info("EC2 | Image available | %s", image_id)
+
+
+def wait_for_ec2_stopped(instance_ids, region: str = AWS_REGION, **kwargs):
+    logger.info("EC2 | Waiting for instances to stop | %s", instance_ids)
+
+    wait_for_ec2_state(instance_ids, "stopped", failed_states=("shutting-down", "terminated"), region=region, **kwargs)
+
+    logger.info("EC2 | Instances stopped | %s", instance_ids)
+
+
+def wait_for_ec2_terminated(instance_ids, region: str = AWS_REGION, **kwargs):
+    logger.info("EC2 | Waiting for instances termination | count=%d", len(instance_ids))
+
+    wait_for_ec2_state(instance_ids, "terminated", missing_is_ready=True, region=region, **kwargs)
+
+    logger.info("EC2 | Instances terminated")
+
+
+# --- DynamoDB ---
+
+def wait_for_dynamodb_active(table_name, region: str = AWS_REGION, **kwargs):
+    dynamodb = manager.get_client('dynamodb', region=region)
+    logger.info("DynamoDB | Waiting for table to become ACTIVE | %s", table_name)
+
+    def probe():
+        try:
+            status = dynamodb.describe_table(TableName=table_name)["Table"]["TableStatus"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return False
+            raise
+        return status == "ACTIVE"
+
+    wait_until(probe, f"DynamoDB ACTIVE | {table_name}", **kwargs)
+
+    logger.info("DynamoDB | Table is ACTIVE | %s", table_name)
+
+
+# --- IAM ---
+
+def wait_for_instance_profile(profile_name, role_name, region: str = AWS_REGION,
+                              timeout: float = IAM_PROPAGATION_TIMEOUT, **kwargs) -> float:
+    """
+    Role'ün ve ona bağlı instance profile'ın IAM okumalarında görünür
+    olmasını bekler (create sonrası eventual consistency). Gözlenen
+    propagation süresini döner ve "propagation" metriğine yazar.
+    """
+    iam = manager.get_client('iam', region=region)
+    start = time.monotonic()
+
+    def probe():
+        try:
+            iam.get_role(RoleName=role_name)
+            profile = iam.get_instance_profile(InstanceProfileName=profile_name)["InstanceProfile"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchEntity":
+                return False
+            raise
+        return any(role["RoleName"] == role_name for role in profile["Roles"])
+
+    wait_until(probe, f"IAM InstanceProfile | {profile_name}", timeout=timeout, **kwargs)
+
+    elapsed = time.monotonic() - start
+    metrics.observe("propagation", "iam.instance_profile", elapsed)
+    logger.info("IAM | Instance profile visible | %s | %.2fs", profile_name, elapsed)
+    return elapsed
+
+
+# --- KMS ---
+
+def wait_for_kms_enabled(key_id, region: str = AWS_REGION, **kwargs):
+    kms = manager.get_client('kms', region=region)
+    logger.info("KMS | Waiting for key to be enabled | %s", key_id)
+
+    def probe():
+        state = kms.describe_key(KeyId=key_id)["KeyMetadata"]["KeyState"]
+        if state in ("PendingDeletion", "Unavailable"):
+            raise WaiterFailed(f"KMS key {key_id} is {state}")
+        return state == "Enabled"
+
+    wait_until(probe, f"KMS Enabled | {key_id}", **kwargs)
 
-    logger.info(f"KMS | Key is enabled | {key_id}")
+    logger.info("KMS | Key is enabled | %s", key_id)